@@ -0,0 +1,173 @@
+"""Alertas de stock bajo según un umbral de reorden por producto
+
+Después de cada transacción confirmada la conexión entrega a revisar() solo
+los productos que cambió, con su cantidad nueva: no se recorre el
+Inventario. Cada producto tiene dos estados con histéresis para no repetir
+la misma alerta con cada descuento:
+
+    normal -> bajo       el stock queda en el umbral o por debajo   (alerta "bajo")
+    bajo -> normal       el stock vuelve a superar umbral + margen  (alerta "repuesto")
+
+El margen es una fracción del umbral (al menos una unidad). Las alertas se
+anotan en un registro JSONL (una línea por alerta) y se entregan a las
+funciones suscritas: el menú las imprime y la interfaz gráfica las muestra
+en un aviso sobre la ventana principal. Los umbrales se configuran en
+configuracion.ini:
+
+    [umbrales]
+    vinil = 10
+    papel impresión = 20
+
+    [alertas]
+    margen = 0.2
+    registro = D:\\Tienda\\alertas_stock.jsonl   ; también ARTMARKET_REGISTRO_ALERTAS
+
+Sin registro configurado, alertas_stock.jsonl queda junto al archivo de datos.
+"""
+import json
+import os
+import threading
+from collections import namedtuple
+from datetime import datetime
+
+from ConexiónExcel import ESCRITORIO, normalizar
+
+NOMBRE_REGISTRO_ALERTAS = "alertas_stock.jsonl"
+# obtener_conexion() lo pasa a la carpeta del archivo de datos configurado
+ARCHIVO_ALERTAS = os.path.join(ESCRITORIO, NOMBRE_REGISTRO_ALERTAS)
+
+# Umbrales de los materiales que descuentan los trabajos, cuando configuracion.ini no trae [umbrales]
+UMBRALES_POR_DEFECTO = {
+    "vinil": 10,
+    "playera": 5,
+    "taza": 5,
+    "vidrio": 5,
+    "papel impresión": 20,
+}
+MARGEN_POR_DEFECTO = 0.2
+
+# tipo: "bajo" al entrar en alerta, "repuesto" al salir
+Alerta = namedtuple("Alerta", ["fecha", "tipo", "producto", "cantidad", "umbral"])
+
+
+class MonitorStock:
+    """Estado de alerta de cada producto con umbral, compartido por todos los hilos"""
+
+    def __init__(self, umbrales=None, margen=MARGEN_POR_DEFECTO, archivo=ARCHIVO_ALERTAS):
+        self.umbrales = {}
+        self.margen = margen
+        self.archivo = archivo
+        # producto -> Alerta "bajo" vigente
+        self._en_alerta = {}
+        self._suscriptores = []
+        self._candado = threading.Lock()
+        self.configurar(UMBRALES_POR_DEFECTO if umbrales is None else umbrales)
+
+    def configurar(self, umbrales=None, margen=None, archivo=None):
+        """Cambia los umbrales, el margen o el registro; las alertas de productos sin umbral se olvidan"""
+        with self._candado:
+            if umbrales is not None:
+                self.umbrales = {normalizar(producto): umbral for producto, umbral in umbrales.items()}
+                for producto in [producto for producto in self._en_alerta if producto not in self.umbrales]:
+                    del self._en_alerta[producto]
+            if margen is not None:
+                self.margen = margen
+            if archivo is not None:
+                self.archivo = archivo
+
+    def limite_salida(self, producto):
+        """Stock que tiene que superar un producto en alerta para volver a la normalidad"""
+        umbral = self.umbrales[producto]
+        return umbral + max(umbral * self.margen, 1)
+
+    def suscribir(self, funcion):
+        """funcion(alerta) se llama con cada alerta nueva, en el hilo que hizo el cambio"""
+        self._suscriptores.append(funcion)
+
+    def desuscribir(self, funcion):
+        if funcion in self._suscriptores:
+            self._suscriptores.remove(funcion)
+
+    def revisar(self, cantidades, avisar=True):
+        """Revisa {producto: cantidad} de los productos cambiados y retorna las alertas nuevas
+
+        Con avisar=False solo se actualiza el estado (para el estado inicial al abrir el programa).
+        """
+        nuevas = []
+        with self._candado:
+            for producto, cantidad in cantidades.items():
+                producto = normalizar(producto)
+                umbral = self.umbrales.get(producto)
+                if umbral is None or cantidad is None:
+                    continue
+                if producto not in self._en_alerta:
+                    if cantidad <= umbral:
+                        alerta = Alerta(datetime.now(), "bajo", producto, cantidad, umbral)
+                        self._en_alerta[producto] = alerta
+                        nuevas.append(alerta)
+                elif cantidad > self.limite_salida(producto):
+                    del self._en_alerta[producto]
+                    nuevas.append(Alerta(datetime.now(), "repuesto", producto, cantidad, umbral))
+                else:
+                    # Sigue en alerta: se actualiza la cantidad que muestra el aviso, sin alerta nueva
+                    self._en_alerta[producto] = self._en_alerta[producto]._replace(cantidad=cantidad)
+        if avisar:
+            for alerta in nuevas:
+                self._emitir(alerta)
+        return nuevas
+
+    def revisar_umbrales(self, conexion, avisar=False):
+        """Revisa una sola vez los productos con umbral y retorna las alertas vigentes
+
+        El Inventario se recorre una sola vez (sin cargar el libro si no está en
+        memoria) y todos los umbrales se comparan con esa lectura.
+        """
+        umbrales = set(self.umbrales)
+        cantidades = {}
+        for producto, cantidad in conexion.iterar_inventario():
+            if producto:
+                nombre = normalizar(producto)
+                # Con productos repetidos vale la primera fila, como en obtener_cantidad
+                if nombre in umbrales and nombre not in cantidades:
+                    cantidades[nombre] = cantidad or 0
+        self.revisar(cantidades, avisar)
+        return self.activas()
+
+    def activas(self):
+        """Alertas "bajo" vigentes, ordenadas por producto"""
+        with self._candado:
+            return [self._en_alerta[producto] for producto in sorted(self._en_alerta)]
+
+    def _emitir(self, alerta):
+        self._anotar(alerta)
+        for funcion in list(self._suscriptores):
+            try:
+                funcion(alerta)
+            except Exception as e:
+                # Un aviso que falla nunca debe hacer fallar el cambio de stock
+                print(f"Error al avisar la alerta de {alerta.producto}: {e}")
+
+    def _anotar(self, alerta):
+        linea = json.dumps({
+            "fecha": alerta.fecha.isoformat(timespec="seconds"),
+            "tipo": alerta.tipo,
+            "producto": alerta.producto,
+            "cantidad": alerta.cantidad,
+            "umbral": alerta.umbral,
+            "pid": os.getpid(),
+        }, ensure_ascii=False)
+        try:
+            with self._candado, open(self.archivo, "a", encoding="utf-8") as archivo:
+                archivo.write(linea + "\n")
+        except OSError as e:
+            print(f"No se pudo escribir el registro de alertas: {e}")
+
+
+def formatear_alerta(alerta):
+    """Retorna el texto de una alerta para mostrarla al usuario"""
+    if alerta.tipo == "repuesto":
+        return f"{alerta.producto.capitalize()} repuesto: {alerta.cantidad} en stock"
+    return f"Stock bajo de {alerta.producto}: quedan {alerta.cantidad} (mínimo {alerta.umbral})"
+
+
+ALERTAS = MonitorStock(archivo=os.environ.get("ARTMARKET_REGISTRO_ALERTAS") or ARCHIVO_ALERTAS)
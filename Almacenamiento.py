@@ -0,0 +1,165 @@
+"""Selección del motor de almacenamiento según la configuración
+
+El motor y el archivo de datos se leen de configuracion.ini (junto al
+programa) y se pueden sobrescribir con variables de entorno:
+
+    [almacenamiento]
+    motor = sqlite                      ; excel (por defecto) o sqlite
+    archivo = D:\\Tienda\\base_datos.sqlite3
+
+    ARTMARKET_MOTOR, ARTMARKET_ARCHIVO, ARTMARKET_CONFIG (otra ruta para el .ini)
+
+Sin configuración se usa base_datos.xlsx en el escritorio, como siempre.
+Las secciones [umbrales] y [alertas] configuran las alertas de stock bajo
+(ver Alertas.py).
+"""
+import atexit
+import configparser
+import os
+import threading
+
+from Alertas import ALERTAS, NOMBRE_REGISTRO_ALERTAS
+from ConexiónExcel import (ARCHIVO_EXCEL, ESCRITORIO, HOJA_INVENTARIO, HOJA_TRABAJOS, ConexionExcel,
+                           ConflictoConcurrencia, StockInsuficiente)
+from ConexiónSQLite import ARCHIVO_SQLITE, ConexionSQLite
+from Histórico import ENCABEZADO_TRABAJOS
+from Métricas import ubicar_registro_lentas
+
+__all__ = [
+    "ARCHIVO_CONFIGURACION", "MOTORES", "leer_configuracion", "leer_alertas", "crear_conexion",
+    "obtener_conexion", "ruta_exportacion", "exportar_excel",
+    # Errores comunes a los dos motores: se importan desde aquí para no depender de uno
+    "ConflictoConcurrencia", "StockInsuficiente",
+]
+
+ARCHIVO_CONFIGURACION = os.path.join(os.path.dirname(os.path.abspath(__file__)), "configuracion.ini")
+
+# Motor -> (clase de conexión, archivo por defecto)
+MOTORES = {
+    "excel": (ConexionExcel, ARCHIVO_EXCEL),
+    "sqlite": (ConexionSQLite, ARCHIVO_SQLITE),
+}
+
+
+def _leer_ini():
+    configuracion = configparser.ConfigParser(inline_comment_prefixes=(";", "#"))
+    configuracion.read(os.environ.get("ARTMARKET_CONFIG", ARCHIVO_CONFIGURACION), encoding="utf-8")
+    return configuracion
+
+
+def leer_configuracion():
+    """Retorna (motor, archivo) según configuracion.ini y las variables de entorno"""
+    configuracion = _leer_ini()
+    seccion = configuracion["almacenamiento"] if configuracion.has_section("almacenamiento") else {}
+
+    motor = os.environ.get("ARTMARKET_MOTOR") or seccion.get("motor") or "excel"
+    motor = motor.lower().strip()
+    if motor not in MOTORES:
+        raise ValueError(f"Motor de almacenamiento '{motor}' no válido. Motores permitidos: {', '.join(MOTORES)}")
+
+    archivo = os.environ.get("ARTMARKET_ARCHIVO") or seccion.get("archivo") or MOTORES[motor][1]
+    return motor, os.path.expanduser(archivo)
+
+
+def leer_alertas():
+    """Retorna (umbrales, margen, registro) de configuracion.ini; None en lo que no está configurado"""
+    configuracion = _leer_ini()
+    umbrales = None
+    if configuracion.has_section("umbrales"):
+        umbrales = {}
+        for producto, valor in configuracion["umbrales"].items():
+            try:
+                umbrales[producto] = float(valor) if "." in valor else int(valor)
+            except ValueError:
+                raise ValueError(f"Umbral '{valor}' del producto {producto} no válido: debe ser un número")
+            if umbrales[producto] < 0:
+                raise ValueError(f"Umbral '{valor}' del producto {producto} no válido: no puede ser negativo")
+    seccion = configuracion["alertas"] if configuracion.has_section("alertas") else {}
+    try:
+        margen = float(seccion["margen"]) if seccion.get("margen") else None
+    except ValueError:
+        raise ValueError(f"Margen de alertas '{seccion['margen']}' no válido: debe ser un número")
+    if margen is not None and margen < 0:
+        raise ValueError(f"Margen de alertas '{seccion['margen']}' no válido: no puede ser negativo")
+    registro = os.environ.get("ARTMARKET_REGISTRO_ALERTAS") or seccion.get("registro")
+    return umbrales, margen, os.path.expanduser(registro) if registro else None
+
+
+def crear_conexion(motor=None, archivo=None):
+    """Crea una conexión nueva; sin argumentos usa la configuración"""
+    if motor is None:
+        motor, archivo_configurado = leer_configuracion()
+        archivo = archivo or archivo_configurado
+    clase, archivo_por_defecto = MOTORES[motor]
+    return clase(archivo or archivo_por_defecto)
+
+
+_conexion = None
+_candado_conexion = threading.Lock()
+
+
+def obtener_conexion():
+    """Retorna la conexión compartida por todo el proceso"""
+    global _conexion
+    with _candado_conexion:
+        if _conexion is None:
+            # La configuración de alertas se lee antes de crear la conexión: si no es
+            # válida se avisa y se usan los valores por defecto
+            try:
+                umbrales, margen, registro = leer_alertas()
+            except (ValueError, configparser.Error) as e:
+                print(f"Aviso: configuración de alertas no válida, se usan los valores por defecto ({e})")
+                umbrales = margen = registro = None
+            conexion = crear_conexion()
+            # Los cambios pendientes se guardan siempre al salir
+            atexit.register(conexion.cerrar)
+            # Los registros de operaciones lentas y de alertas van junto al archivo de datos
+            carpeta = os.path.dirname(os.path.abspath(conexion.archivo))
+            ubicar_registro_lentas(carpeta)
+            # Cada transacción pasa los productos que cambió a las alertas de stock bajo
+            ALERTAS.configurar(umbrales, margen, registro or os.path.join(carpeta, NOMBRE_REGISTRO_ALERTAS))
+            conexion.observar_stock(ALERTAS.revisar)
+            _conexion = conexion
+        return _conexion
+
+
+def ruta_exportacion(conexion=None):
+    """Retorna la ruta por defecto del .xlsx exportado"""
+    conexion = conexion or obtener_conexion()
+    ruta = os.path.join(ESCRITORIO, "base_datos.xlsx")
+    if os.path.abspath(ruta) == os.path.abspath(conexion.archivo):
+        # Con el motor Excel no se sobrescribe el archivo de datos en uso
+        ruta = os.path.join(ESCRITORIO, "base_datos_exportado.xlsx")
+    return ruta
+
+
+def exportar_excel(ruta=None, conexion=None):
+    """Exporta el Inventario y los Trabajos a un .xlsx con las hojas del formato original"""
+    from openpyxl import Workbook
+
+    conexion = conexion or obtener_conexion()
+    ruta = ruta or ruta_exportacion(conexion)
+    if os.path.abspath(ruta) == os.path.abspath(conexion.archivo):
+        raise ValueError("La exportación no puede sobrescribir el archivo de datos en uso")
+
+    # Modo de solo escritura: las filas se vuelcan al archivo sin crear celdas en memoria
+    wb = Workbook(write_only=True)
+    ws_inventario = wb.create_sheet(HOJA_INVENTARIO)
+    ws_inventario.append(["Producto", "Cantidad"])
+    for producto, cantidad in conexion.iterar_inventario():
+        ws_inventario.append([producto, cantidad])
+
+    ws_trabajos = wb.create_sheet(HOJA_TRABAJOS)
+    ws_trabajos.append(list(ENCABEZADO_TRABAJOS))
+    # iterar_trabajos incluye los meses archivados
+    for fila in conexion.iterar_trabajos(completas=True):
+        ws_trabajos.append(list(fila))
+
+    temporal = ruta + ".tmp"
+    try:
+        wb.save(temporal)
+        os.replace(temporal, ruta)
+    finally:
+        if os.path.exists(temporal):
+            os.remove(temporal)
+    return ruta
@@ -1,45 +1,40 @@
-from datetime import datetime
-from openpyxl import Workbook, load_workbook
-import os
-
-# Configuración de archivos Excel
-# Obtener la ruta del escritorio del usuario
-ESCRITORIO = os.path.join(os.path.expanduser("~"), "Desktop")
-ARCHIVO_EXCEL = os.path.join(ESCRITORIO, "base_datos.xlsx")
-HOJA_INVENTARIO = "Inventario"
-HOJA_TRABAJOS = "Trabajos"
-
-
-def inicializar_excel():
-    """Crea el archivo Excel y las hojas si no existen"""
-    if not os.path.exists(ARCHIVO_EXCEL):
-        wb = Workbook()
-        
-        # Crear hoja de Inventario
-        ws_inventario = wb.active
-        ws_inventario.title = HOJA_INVENTARIO
-        ws_inventario.append(["Producto", "Cantidad"])
-        
-        # Crear hoja de Trabajos
-        ws_trabajos = wb.create_sheet(HOJA_TRABAJOS)
-        ws_trabajos.append(["Cliente", "Trabajo_Pendiente", "Fecha_Entrega"])
-        
-        wb.save(ARCHIVO_EXCEL)
-        print(f"Archivo creado exitosamente en: {ARCHIVO_EXCEL}")
-    else:
-        print(f"Archivo ya existe en: {ARCHIVO_EXCEL}")
+from datetime import date
+
+from Alertas import ALERTAS, formatear_alerta
+# Almacenamiento de datos (Excel o SQLite según la configuración, compartido con la interfaz gráfica)
+from Almacenamiento import ConflictoConcurrencia, StockInsuficiente, exportar_excel, obtener_conexion, ruta_exportacion
+from Importación import COLUMNAS_REABASTECIMIENTO, importar_reabastecimiento, leer_filas
+from Materiales import LISTA_MATERIALES, MaterialNoEncontrado
+from Métricas import medido, medir, volcar
+from Registro import DatosInvalidos, registrar, validar_cliente, validar_fecha, validar_trabajo
+from Índices import TotalesInventario
+
+
+def inicializar_almacenamiento():
+    """Crea el archivo de datos si no existe"""
+    obtener_conexion().inicializar()
+
+
+def imprimir_alerta(alerta):
+    print(f"\n*** {formatear_alerta(alerta)} ***")
+
+
+def iniciar_alertas():
+    """Muestra los productos que ya están bajo su umbral e imprime las alertas que lleguen después"""
+    for alerta in ALERTAS.revisar_umbrales(obtener_conexion()):
+        imprimir_alerta(alerta)
+    ALERTAS.suscribir(imprimir_alerta)
 
 
 class Trabajo:
-    # Lista de trabajos permitidos
-    TRABAJOS_VALIDOS = ["corte eléctrico en vinil adhesivo", "sublimado"]
+    # Lista de trabajos permitidos (los de la lista de materiales)
+    TRABAJOS_VALIDOS = LISTA_MATERIALES.trabajos
     
     def __init__(self, cliente, trabajo_pendiente, fecha_entrega):
         # Usar los setters para validación inicial
         self.cliente = cliente
         self.trabajo_pendiente = trabajo_pendiente
         self.fecha_entrega = fecha_entrega
-        self.materiales_descontados = False
     
     # Property y setter para cliente (dato textual)
     @property
@@ -49,11 +44,7 @@ class Trabajo:
     @cliente.setter
     def cliente(self, valor):
         try:
-            if not isinstance(valor, str):
-                raise ValueError("El cliente debe ser un texto")
-            if len(valor.strip()) == 0:
-                raise ValueError("El cliente no puede estar vacío")
-            self._cliente = valor
+            self._cliente = validar_cliente(valor)
         except Exception as e:
             print(f"Error al asignar cliente: {e}")
             self._cliente = ""
@@ -66,20 +57,8 @@ class Trabajo:
     @trabajo_pendiente.setter
     def trabajo_pendiente(self, valor):
         try:
-            if not isinstance(valor, str):
-                raise ValueError("El trabajo pendiente debe ser un texto")
-            
-            # Convertir a minúsculas
-            valor_minuscula = valor.lower().strip()
-            
-            if len(valor_minuscula) == 0:
-                raise ValueError("El trabajo pendiente no puede estar vacío")
-            
-            # Validar que esté en la lista de trabajos válidos
-            if valor_minuscula not in self.TRABAJOS_VALIDOS:
-                raise ValueError(f"El trabajo '{valor}' no es válido. Trabajos permitidos: {', '.join(self.TRABAJOS_VALIDOS)}")
-            
-            self._trabajo_pendiente = valor_minuscula
+            # Se guarda en minúsculas y debe estar en la lista de trabajos válidos
+            self._trabajo_pendiente = validar_trabajo(valor)
         except Exception as e:
             print(f"Error al asignar trabajo pendiente: {e}")
             self._trabajo_pendiente = ""
@@ -92,22 +71,8 @@ class Trabajo:
     @fecha_entrega.setter
     def fecha_entrega(self, valor):
         try:
-            # Validar que sea un string
-            if not isinstance(valor, str):
-                raise ValueError("La fecha debe ser un texto")
-            
-            # Validar el formato con guiones
-            if valor.count('-') != 2:
-                raise ValueError("La fecha debe tener el formato dd-mm-yyyy")
-            
-            # Separar día, mes y año
-            partes = valor.split('-')
-            if len(partes[0]) != 2 or len(partes[1]) != 2 or len(partes[2]) != 4:
-                raise ValueError("El formato debe ser dd-mm-yyyy (ejemplo: 25-12-2024)")
-            
-            # Intentar convertir el string a fecha con formato dd-mm-yyyy
-            fecha_obj = datetime.strptime(valor, "%d-%m-%Y")
-            self._fecha_entrega = fecha_obj
+            # Texto con formato dd-mm-yyyy convertido a fecha
+            self._fecha_entrega = validar_fecha(valor)
             
         except ValueError as e:
             print(f"Error al asignar fecha de entrega: {e}")
@@ -116,184 +81,13 @@ class Trabajo:
             print(f"Error inesperado al asignar fecha: {e}")
             self._fecha_entrega = None
     
-    def descontar_materiales(self):
-        """Descuenta materiales del inventario según el tipo de trabajo"""
-        if not self._trabajo_pendiente:
-            print("No se puede descontar materiales: trabajo no válido")
-            return False
-        
-        if self._trabajo_pendiente == "corte eléctrico en vinil adhesivo":
-            return self._descontar_vinil()
-        elif self._trabajo_pendiente == "sublimado":
-            return self._descontar_sublimado()
-        
-        return False
-    
-    def _descontar_vinil(self):
-        """Descuenta vinil del inventario"""
-        try:
-            cantidad_hojas = input("\nIngrese la cantidad de hojas de vinil a usar: ")
-            
-            try:
-                cantidad_hojas = float(cantidad_hojas)
-            except ValueError:
-                print("La cantidad debe ser un número válido")
-                return False
-            
-            if cantidad_hojas < 0:
-                print("No se permiten valores negativos")
-                return False
-            
-            if cantidad_hojas == 0:
-                print("La cantidad debe ser mayor a cero")
-                return False
-            
-            # Verificar disponibilidad en Excel
-            wb = load_workbook(ARCHIVO_EXCEL)
-            ws = wb[HOJA_INVENTARIO]
-            
-            vinil_disponible = 0
-            fila_vinil = None
-            
-            for row in range(2, ws.max_row + 1):
-                producto = ws.cell(row, 1).value
-                if producto and producto.lower() == "vinil":
-                    vinil_disponible = ws.cell(row, 2).value or 0
-                    fila_vinil = row
-                    break
-            
-            if fila_vinil is None:
-                print("El producto vinil no se encuentra en el inventario")
-                return False
-            
-            if vinil_disponible < cantidad_hojas:
-                print(f"La cantidad ingresada excede los materiales disponibles")
-                print(f"Vinil disponible: {vinil_disponible}, solicitado: {cantidad_hojas}")
-                return False
-            
-            # Descontar del inventario
-            nueva_cantidad = vinil_disponible - cantidad_hojas
-            ws.cell(fila_vinil, 2, nueva_cantidad)
-            wb.save(ARCHIVO_EXCEL)
-            
-            print(f"Materiales descontados exitosamente")
-            print(f"Vinil: {cantidad_hojas} hojas descontadas")
-            print(f"Vinil restante: {nueva_cantidad}")
-            
-            self.materiales_descontados = True
-            return True
-            
-        except Exception as e:
-            print(f"Error al descontar vinil: {e}")
-            return False
-    
-    def _descontar_sublimado(self):
-        """Descuenta materiales para sublimado del inventario"""
-        try:
-            print("\nProductos disponibles para sublimado:")
-            print("1. Playera")
-            print("2. Taza")
-            print("3. Vidrio")
-            
-            opcion = input("\nSeleccione el producto (1-3): ").strip()
-            
-            productos_sublimado = {
-                "1": "playera",
-                "2": "taza",
-                "3": "vidrio"
-            }
-            
-            if opcion not in productos_sublimado:
-                print("Opción inválida")
-                return False
-            
-            producto_elegido = productos_sublimado[opcion]
-            
-            cantidad = input(f"\nIngrese la cantidad de {producto_elegido}s: ")
-            
-            try:
-                cantidad = float(cantidad)
-            except ValueError:
-                print("La cantidad debe ser un número válido")
-                return False
-            
-            if cantidad < 0:
-                print("No se permiten valores negativos")
-                return False
-            
-            if cantidad == 0:
-                print("La cantidad debe ser mayor a cero")
-                return False
-            
-            # Verificar disponibilidad en Excel
-            wb = load_workbook(ARCHIVO_EXCEL)
-            ws = wb[HOJA_INVENTARIO]
-            
-            producto_disponible = 0
-            papel_disponible = 0
-            fila_producto = None
-            fila_papel = None
-            
-            for row in range(2, ws.max_row + 1):
-                producto = ws.cell(row, 1).value
-                if producto:
-                    if producto.lower() == producto_elegido:
-                        producto_disponible = ws.cell(row, 2).value or 0
-                        fila_producto = row
-                    elif producto.lower() == "papel impresión":
-                        papel_disponible = ws.cell(row, 2).value or 0
-                        fila_papel = row
-            
-            if fila_producto is None:
-                print(f"El producto {producto_elegido} no se encuentra en el inventario")
-                return False
-            
-            if fila_papel is None:
-                print("El papel impresión no se encuentra en el inventario")
-                return False
-            
-            if producto_disponible < cantidad:
-                print(f"La cantidad ingresada excede los materiales disponibles")
-                print(f"{producto_elegido.capitalize()} disponible: {producto_disponible}, solicitado: {cantidad}")
-                return False
-            
-            if papel_disponible < cantidad:
-                print(f"La cantidad ingresada excede los materiales disponibles")
-                print(f"Papel impresión disponible: {papel_disponible}, solicitado: {cantidad}")
-                return False
-            
-            # Descontar del inventario
-            nueva_cantidad_producto = producto_disponible - cantidad
-            nueva_cantidad_papel = papel_disponible - cantidad
-            
-            ws.cell(fila_producto, 2, nueva_cantidad_producto)
-            ws.cell(fila_papel, 2, nueva_cantidad_papel)
-            wb.save(ARCHIVO_EXCEL)
-            
-            print(f"Materiales descontados exitosamente")
-            print(f"{producto_elegido.capitalize()}: {cantidad} unidades descontadas")
-            print(f"{producto_elegido.capitalize()} restante: {nueva_cantidad_producto}")
-            print(f"Papel impresión: {cantidad} hojas descontadas")
-            print(f"Papel impresión restante: {nueva_cantidad_papel}")
-            
-            self.materiales_descontados = True
-            return True
-            
-        except Exception as e:
-            print(f"Error al descontar materiales de sublimado: {e}")
-            return False
-    
     def guardar_en_excel(self):
         """Guarda el trabajo en Excel"""
         try:
             if self._cliente and self._trabajo_pendiente and self._fecha_entrega:
-                wb = load_workbook(ARCHIVO_EXCEL)
-                ws = wb[HOJA_TRABAJOS]
-                
                 fecha_str = self._fecha_entrega.strftime("%d-%m-%Y")
-                ws.append([self._cliente, self._trabajo_pendiente, fecha_str])
+                obtener_conexion().agregar_trabajo(self._cliente, self._trabajo_pendiente, fecha_str)
                 
-                wb.save(ARCHIVO_EXCEL)
                 print(f"Trabajo guardado en Excel exitosamente")
                 return True
             else:
@@ -387,30 +181,20 @@ class Inventario:
             print(f"Error al asignar cantidad: {e}")
             self._cantidad_producto = 0
     
+    @medido("agregar")
     def _guardar_en_excel(self):
         """Método privado para guardar el producto y cantidad en Excel"""
         try:
             if self._producto_valido and self._cantidad_producto > 0:
-                wb = load_workbook(ARCHIVO_EXCEL)
-                ws = wb[HOJA_INVENTARIO]
-                
-                # Buscar si el producto ya existe
-                producto_encontrado = False
-                for row in range(2, ws.max_row + 1):
-                    if ws.cell(row, 1).value and ws.cell(row, 1).value.lower() == self._producto:
-                        # Sumar la cantidad al producto existente
-                        cantidad_actual = ws.cell(row, 2).value or 0
-                        ws.cell(row, 2, cantidad_actual + self._cantidad_producto)
-                        producto_encontrado = True
-                        print(f"Producto {self._producto} actualizado en Excel. Nueva cantidad: {cantidad_actual + self._cantidad_producto}")
-                        break
-                
-                # Si no existe, agregarlo
-                if not producto_encontrado:
-                    ws.append([self._producto, self._cantidad_producto])
-                    print(f"Producto {self._producto} agregado a Excel con cantidad: {self._cantidad_producto}")
+                conexion = obtener_conexion()
                 
-                wb.save(ARCHIVO_EXCEL)
+                # Sumar la cantidad al producto existente, o agregarlo si no existe
+                existia = conexion.obtener_cantidad(self._producto) is not None
+                nueva_cantidad = conexion.sumar_cantidad(self._producto, self._cantidad_producto)
+                if existia:
+                    print(f"Producto {self._producto} actualizado en Excel. Nueva cantidad: {nueva_cantidad}")
+                else:
+                    print(f"Producto {self._producto} agregado a Excel con cantidad: {nueva_cantidad}")
         except Exception as e:
             print(f"Error al guardar en Excel: {e}")
     
@@ -427,33 +211,32 @@ class Mostrar_almacen:
     def __init__(self):
         self.mostrar()
     
+    @medido("mostrar")
     def mostrar(self):
         """Muestra todo el inventario almacenado en Excel"""
         try:
-            wb = load_workbook(ARCHIVO_EXCEL)
-            ws = wb[HOJA_INVENTARIO]
-            
             print("\nINVENTARIO ALMACENADO")
             
-            # Contar productos (excluyendo encabezado)
-            total_productos = ws.max_row - 1
+            # Las filas se muestran a medida que se leen del archivo y los
+            # totales se suman en el mismo recorrido, sin cargar el libro
+            conexion = obtener_conexion()
+            
+            def filas_mostradas():
+                for producto, cantidad in conexion.iterar_inventario():
+                    if producto:
+                        print(f"{producto.capitalize()}: {cantidad or 0} unidades")
+                    yield producto, cantidad
+            
+            print("\nProductos en stock:")
+            totales = TotalesInventario(filas_mostradas()).resumen()
             
-            if total_productos == 0:
+            if totales["productos"] == 0:
                 print("El almacén está vacío")
             else:
-                print(f"\nTotal de productos diferentes: {total_productos}")
-                print("\nProductos en stock:")
-                
-                total_unidades = 0
-                for row in range(2, ws.max_row + 1):
-                    producto = ws.cell(row, 1).value
-                    cantidad = ws.cell(row, 2).value or 0
-                    
-                    if producto:
-                        print(f"{producto.capitalize()}: {cantidad} unidades")
-                        total_unidades += cantidad
-                
-                print(f"\nTOTAL DE UNIDADES: {total_unidades}")
+                print(f"\nTotal de productos diferentes: {totales['productos']}")
+                for categoria, datos in totales["categorias"].items():
+                    print(f"  {categoria.capitalize()}: {datos['productos']} productos, {datos['unidades']} unidades")
+                print(f"TOTAL DE UNIDADES: {totales['unidades']}")
             
             print("")
             
@@ -468,11 +251,11 @@ class Buscar_en_almacen:
         self.producto_buscar = producto_buscar
         self.buscar()
     
+    @medido("buscar")
     def buscar(self):
-        """Busca un producto en el almacén de Excel usando Hashing"""
+        """Busca un producto en el almacén usando Hashing y, si no está, sugiere los nombres parecidos"""
         try:
-            wb = load_workbook(ARCHIVO_EXCEL)
-            ws = wb[HOJA_INVENTARIO]
+            conexion = obtener_conexion()
             
             print("\nBUSQUEDA EN ALMACEN")
             
@@ -481,19 +264,17 @@ class Buscar_en_almacen:
             
             print(f"\nBuscando: {self.producto_buscar}")
             print(f"Producto normalizado: {producto_normalizado}")
-            print(f"Usando Hashing (búsqueda en Excel)...")
+            print(f"Usando Hashing (índice de productos)...")
+            
+            # HASHING: Acceso directo O(1) con el índice de productos de la conexión
+            cantidad = conexion.obtener_cantidad(producto_normalizado)
+            parecidos = [] if cantidad is not None else conexion.buscar_parecidos(producto_normalizado)
             
-            # Crear diccionario (hash table) temporal desde Excel
-            inventario_hash = {}
-            for row in range(2, ws.max_row + 1):
-                producto = ws.cell(row, 1).value
-                cantidad = ws.cell(row, 2).value
-                if producto:
-                    inventario_hash[producto.lower()] = cantidad
+            # Un nombre que solo difiere en acentos o espacios cuenta como encontrado
+            if parecidos and parecidos[0][2] == 1:
+                producto_normalizado, cantidad, _ = parecidos[0]
             
-            # HASHING: Acceso directo O(1)
-            if producto_normalizado in inventario_hash:
-                cantidad = inventario_hash[producto_normalizado]
+            if cantidad is not None:
                 print(f"\nPRODUCTO ENCONTRADO")
                 print(f"Producto: {producto_normalizado.capitalize()}")
                 print(f"Cantidad en stock: {cantidad} unidades")
@@ -501,11 +282,11 @@ class Buscar_en_almacen:
                 print(f"\nPRODUCTO NO ENCONTRADO")
                 print(f"El producto {self.producto_buscar} no está en el almacén")
                 
-                # Sugerencias de productos disponibles
-                if inventario_hash:
-                    print(f"\nProductos disponibles en almacén:")
-                    for prod in inventario_hash.keys():
-                        print(f"{prod.capitalize()}")
+                # Sugerencias: solo los productos con nombre parecido, del más al menos parecido
+                if parecidos:
+                    print(f"\n¿Quiso decir?")
+                    for nombre, cantidad_parecido, _ in parecidos:
+                        print(f"{nombre.capitalize()}: {cantidad_parecido} unidades")
             
             print("")
             
@@ -515,28 +296,49 @@ class Buscar_en_almacen:
     def obtener_cantidad(self):
         """Retorna la cantidad del producto buscado (si existe)"""
         try:
-            wb = load_workbook(ARCHIVO_EXCEL)
-            ws = wb[HOJA_INVENTARIO]
-            
-            producto_normalizado = self.producto_buscar.lower().strip()
-            
-            for row in range(2, ws.max_row + 1):
-                producto = ws.cell(row, 1).value
-                if producto and producto.lower() == producto_normalizado:
-                    return ws.cell(row, 2).value or 0
-            
-            return 0
+            cantidad = obtener_conexion().obtener_cantidad(self.producto_buscar)
+            return cantidad if cantidad is not None else 0
         except Exception as e:
             print(f"Error al obtener cantidad: {e}")
             return 0
 
 
+# Importación masiva de trabajos
+COLUMNAS_IMPORTACION_TRABAJOS = ["cliente", "trabajo", "fecha", "producto", "cantidad"]
+
+
+def importar_trabajos(ruta):
+    """Registra los trabajos de un archivo CSV/JSONL en una sola transacción
+    
+    Retorna el reporte (línea, aceptado, detalle) de cada fila del archivo.
+    Cada fila se registra con registrar(): si una fila no se puede registrar
+    solo se deshace esa fila, y las siguientes ven el stock ya descontado.
+    """
+    reporte = []
+    conexion = obtener_conexion()
+    with conexion.transaccion():
+        for linea, fila in leer_filas(ruta, COLUMNAS_IMPORTACION_TRABAJOS):
+            if fila is None:
+                reporte.append((linea, False, "La línea no tiene un formato válido"))
+                continue
+            try:
+                resultado = registrar(str(fila["cliente"]), str(fila["trabajo"]), str(fila["fecha"]),
+                                      fila["cantidad"], str(fila["producto"]) or None, conexion)
+            except ValueError as e:
+                reporte.append((linea, False, str(e)))
+                continue
+            detalle = ", ".join(f"{material}: {cantidad}" for material, cantidad in resultado.consumos.items())
+            reporte.append((linea, True, f"Registrado ({detalle})"))
+    return reporte
+
+
 # Menú principal del sistema
 def menu_principal():
     """Menú interactivo para usar todas las clases del sistema"""
     
-    # Inicializar archivo Excel al inicio
-    inicializar_excel()
+    # Inicializar archivo de datos al inicio
+    inicializar_almacenamiento()
+    iniciar_alertas()
     
     while True:
         print("\nSISTEMA DE GESTION")
@@ -546,10 +348,15 @@ def menu_principal():
         print("3. Mostrar almacén completo")
         print("4. Buscar producto en almacén")
         print("5. Ver trabajos registrados")
-        print("6. Salir del programa")
+        print("6. Exportar datos a Excel")
+        print("7. Importar trabajos desde archivo (CSV/JSONL)")
+        print("8. Importar reabastecimiento desde archivo (CSV/JSONL)")
+        print("9. Consultar entregas (vencidas, próximas o entre fechas)")
+        print("10. Ver métricas de rendimiento")
+        print("11. Salir del programa")
         
         try:
-            opcion = input("\nIngrese su opción (1-6): ").strip()
+            opcion = input("\nIngrese su opción (1-11): ").strip()
             
             if opcion == "1":
                 registrar_trabajo()
@@ -562,10 +369,21 @@ def menu_principal():
             elif opcion == "5":
                 ver_trabajos()
             elif opcion == "6":
+                exportar_datos()
+            elif opcion == "7":
+                importar_trabajos_archivo()
+            elif opcion == "8":
+                importar_reabastecimiento_archivo()
+            elif opcion == "9":
+                consultar_entregas()
+            elif opcion == "10":
+                ver_metricas()
+            elif opcion == "11":
+                obtener_conexion().cerrar()
                 print("\nHasta luego\n")
                 break
             else:
-                print("\nOpción inválida. Por favor ingrese un número del 1 al 6.")
+                print("\nOpción inválida. Por favor ingrese un número del 1 al 11.")
                 input("\nPresione ENTER para continuar...")
         
         except KeyboardInterrupt:
@@ -576,6 +394,49 @@ def menu_principal():
             input("\nPresione ENTER para continuar...")
 
 
+def pedir_pieza_y_cantidad(trabajo_pendiente):
+    """Pregunta el producto (si el trabajo lo requiere) y la cantidad; retorna (pieza, cantidad) o None"""
+    regla = LISTA_MATERIALES.regla(trabajo_pendiente)
+    
+    # Si el trabajo se hace sobre un producto a elegir, se pregunta cuál
+    pieza = None
+    if regla.piezas:
+        print(f"\nProductos disponibles para {trabajo_pendiente}:")
+        for i, producto in enumerate(regla.piezas, 1):
+            print(f"{i}. {producto.capitalize()}")
+        
+        opcion = input(f"\nSeleccione el producto (1-{len(regla.piezas)}): ").strip()
+        if not opcion.isdigit() or not 1 <= int(opcion) <= len(regla.piezas):
+            print("Opción inválida")
+            return None
+        pieza = regla.piezas[int(opcion) - 1]
+    
+    cantidad = input(f"\nIngrese la cantidad de {pieza + 's' if pieza else regla.unidad} a usar: ")
+    
+    try:
+        cantidad = float(cantidad)
+    except ValueError:
+        print("La cantidad debe ser un número válido")
+        return None
+    
+    if cantidad < 0:
+        print("No se permiten valores negativos")
+        return None
+    
+    if cantidad == 0:
+        print("La cantidad debe ser mayor a cero")
+        return None
+    
+    return pieza, cantidad
+
+
+def imprimir_descuento(consumos, restantes):
+    """Muestra los materiales descontados y lo que queda de cada uno"""
+    print(f"Materiales descontados exitosamente")
+    for material, cantidad in consumos.items():
+        print(f"{material.capitalize()}: {cantidad} descontados, restante: {restantes[material]}")
+
+
 def registrar_trabajo():
     """Función para registrar un nuevo trabajo"""
     print("\nREGISTRAR TRABAJO")
@@ -600,14 +461,26 @@ def registrar_trabajo():
         print(f"{trabajo}")
         trabajo.imprimir_fecha()
         
-        # Descontar materiales
+        # Descontar materiales y guardar el trabajo en una sola transacción:
+        # el descuento y la fila del trabajo se guardan juntos o no se guarda ninguno
         print("\nProcediendo a descontar materiales del inventario...")
-        if trabajo.descontar_materiales():
-            # Solo guardar en Excel si se descontaron los materiales exitosamente
-            trabajo.guardar_en_excel()
-        else:
+        pedido = pedir_pieza_y_cantidad(trabajo.trabajo_pendiente)
+        if pedido is None:
             print("\nEl trabajo no se guardará porque no se pudieron descontar los materiales")
+        else:
+            pieza, cantidad = pedido
+            resultado = registrar(cliente, trabajo_pendiente, fecha_entrega, cantidad, pieza)
+            imprimir_descuento(resultado.consumos, resultado.restantes)
+            print(f"Trabajo guardado en Excel exitosamente")
         
+    except (MaterialNoEncontrado, StockInsuficiente) as e:
+        print(f"\n{e}")
+        print("\nEl trabajo no se guardará porque no se pudieron descontar los materiales")
+    except ConflictoConcurrencia as e:
+        # Otra estación cambió el inventario mientras se registraba el trabajo
+        print(f"\nOtra estación modificó el inventario; el trabajo no se guardó: {e}")
+    except DatosInvalidos as e:
+        print(f"\nNo se puede guardar: {e}")
     except Exception as e:
         print(f"\nError al registrar trabajo: {e}")
     
@@ -661,32 +534,216 @@ def buscar_producto():
 
 
 def ver_trabajos():
-    """Función para ver todos los trabajos registrados"""
+    """Función para ver los trabajos registrados, todos o los de un cliente"""
     print("\nTRABAJOS REGISTRADOS")
     
     try:
-        wb = load_workbook(ARCHIVO_EXCEL)
-        ws = wb[HOJA_TRABAJOS]
+        cliente_buscado = input("\nCliente (ENTER para ver todos): ").strip()
+        if cliente_buscado:
+            ver_trabajos_cliente(cliente_buscado)
+            input("\nPresione ENTER para volver al menú...")
+            return
         
-        total_trabajos = ws.max_row - 1
+        # Los trabajos se muestran a medida que se leen del archivo
+        total_trabajos = 0
+        with medir("ver_trabajos") as medicion:
+            for cliente, trabajo, fecha in obtener_conexion().iterar_trabajos():
+                if total_trabajos == 0:
+                    print("")
+                total_trabajos += 1
+                print(f"{total_trabajos}. Cliente: {cliente}")
+                print(f"   Trabajo: {trabajo}")
+                print(f"   Fecha: {fecha}\n")
+            medicion.sumar(filas=total_trabajos)
         
         if total_trabajos == 0:
             print("\nNo hay trabajos registrados")
         else:
-            print(f"\nTotal de trabajos: {total_trabajos}\n")
-            
-            for row in range(2, ws.max_row + 1):
-                cliente = ws.cell(row, 1).value
-                trabajo = ws.cell(row, 2).value
-                fecha = ws.cell(row, 3).value
-                
-                print(f"{row-1}. Cliente: {cliente}")
-                print(f"   Trabajo: {trabajo}")
-                print(f"   Fecha: {fecha}\n")
+            print(f"Total de trabajos: {total_trabajos}")
         
     except Exception as e:
         print(f"\nError al mostrar trabajos: {e}")
     
     input("\nPresione ENTER para volver al menú...")
 
-menu_principal()
\ No newline at end of file
+
+def ver_trabajos_cliente(cliente):
+    """Muestra los trabajos de un cliente usando el índice de clientes, sin recorrer la hoja"""
+    conexion = obtener_conexion()
+    with medir("trabajos_de_cliente") as medicion:
+        trabajos = conexion.trabajos_de_cliente(cliente)
+        medicion.sumar(filas=len(trabajos))
+    
+    if trabajos:
+        print(f"\nTrabajos de {trabajos[-1][0]}:\n")
+        imprimir_trabajos(trabajos)
+        print(f"Total de trabajos: {len(trabajos)}")
+        return
+    
+    print(f"\nEl cliente {cliente} no tiene trabajos registrados")
+    sugerencias = conexion.sugerir_clientes(cliente)
+    if sugerencias:
+        print("\nClientes que empiezan así:")
+        for nombre in sugerencias:
+            print(nombre)
+
+
+def exportar_datos():
+    """Función para exportar el inventario y los trabajos a un archivo Excel"""
+    print("\nEXPORTAR DATOS A EXCEL")
+    
+    try:
+        ruta = input(f"\nRuta del archivo (ENTER para {ruta_exportacion()}): ").strip()
+        ruta = exportar_excel(ruta or None)
+        print(f"\nDatos exportados exitosamente en: {ruta}")
+    except Exception as e:
+        print(f"\nError al exportar datos: {e}")
+    
+    input("\nPresione ENTER para volver al menú...")
+
+
+def importar_trabajos_archivo():
+    """Función para registrar varios trabajos desde un archivo CSV o JSONL"""
+    print("\nIMPORTAR TRABAJOS")
+    print(f"\nEl archivo debe tener las columnas: {', '.join(COLUMNAS_IMPORTACION_TRABAJOS)}")
+    
+    try:
+        ruta = input("\nRuta del archivo: ").strip().strip('"')
+        reporte = importar_trabajos(ruta)
+        
+        aceptadas = 0
+        print("")
+        for linea, aceptado, detalle in reporte:
+            aceptadas += aceptado
+            print(f"Línea {linea}: {'ACEPTADO' if aceptado else 'RECHAZADO'} - {detalle}")
+        
+        print(f"\nTrabajos registrados: {aceptadas}")
+        print(f"Filas rechazadas: {len(reporte) - aceptadas}")
+        
+    except (StockInsuficiente, ConflictoConcurrencia) as e:
+        print(f"\nOtra estación modificó el inventario; no se registró ningún trabajo: {e}")
+    except Exception as e:
+        print(f"\nError al importar trabajos: {e}")
+    
+    input("\nPresione ENTER para volver al menú...")
+
+
+def importar_reabastecimiento_archivo():
+    """Función para agregar al inventario la entrega de un proveedor desde un archivo CSV o JSONL"""
+    print("\nIMPORTAR REABASTECIMIENTO")
+    print(f"\nEl archivo debe tener las columnas: {', '.join(COLUMNAS_REABASTECIMIENTO)}")
+    
+    try:
+        ruta = input("\nRuta del archivo: ").strip().strip('"')
+        reporte, cantidades = importar_reabastecimiento(ruta, Inventario.PRODUCTOS_VALIDOS)
+        
+        print("")
+        for linea, aceptado, detalle in reporte:
+            if not aceptado:
+                print(f"Línea {linea}: RECHAZADO - {detalle}")
+        
+        print(f"\nLíneas aplicadas: {sum(aceptado for _, aceptado, _ in reporte)} de {len(reporte)}")
+        for producto, cantidad in cantidades.items():
+            print(f"{producto.capitalize()}: nueva cantidad {cantidad}")
+        
+    except Exception as e:
+        print(f"\nError al importar reabastecimiento: {e}")
+    
+    input("\nPresione ENTER para volver al menú...")
+
+
+def imprimir_trabajos(trabajos):
+    """Imprime una lista de trabajos (cliente, trabajo, fecha) numerada"""
+    for numero, (cliente, trabajo, fecha) in enumerate(trabajos, 1):
+        print(f"{numero}. Cliente: {cliente}")
+        print(f"   Trabajo: {trabajo}")
+        print(f"   Fecha: {fecha}\n")
+
+
+def consultar_entregas():
+    """Función para ver los trabajos vencidos, las próximas entregas o las de un rango de fechas"""
+    print("\nCONSULTAR ENTREGAS")
+    print("\n1. Trabajos con entrega vencida")
+    print("2. Próximas entregas")
+    print("3. Entregas entre dos fechas")
+    print("4. Pronóstico de materiales")
+    
+    try:
+        opcion = input("\nIngrese su opción (1-4): ").strip()
+        conexion = obtener_conexion()
+        hoy = date.today()
+        consulta = None
+        
+        if opcion == "1":
+            consulta = lambda: conexion.trabajos_vencidos(hoy)
+            titulo = "Trabajos con entrega anterior a hoy"
+        elif opcion == "2":
+            texto = input("Cantidad de entregas a mostrar (ENTER para 10): ").strip()
+            if texto and not texto.isdigit():
+                raise ValueError("La cantidad debe ser un número entero")
+            cantidad = int(texto) if texto else 10
+            if cantidad <= 0:
+                raise ValueError("La cantidad debe ser mayor a cero")
+            consulta = lambda: conexion.proximas_entregas(hoy, cantidad)
+            titulo = f"Próximas entregas desde hoy ({hoy.strftime('%d-%m-%Y')})"
+        elif opcion == "3":
+            desde = validar_fecha(input("Desde (dd-mm-yyyy): ").strip())
+            hasta = validar_fecha(input("Hasta (dd-mm-yyyy): ").strip())
+            if hasta < desde:
+                raise ValueError("La fecha final no puede ser anterior a la inicial")
+            consulta = lambda: conexion.trabajos_entre(desde, hasta)
+            titulo = f"Entregas entre {desde.strftime('%d-%m-%Y')} y {hasta.strftime('%d-%m-%Y')}"
+        elif opcion == "4":
+            ver_pronostico()
+        else:
+            raise ValueError("Opción inválida")
+        
+        if consulta is not None:
+            with medir("consultar_entregas") as medicion:
+                trabajos = consulta()
+                medicion.sumar(filas=len(trabajos))
+            
+            print(f"\n{titulo}\n")
+            if trabajos:
+                imprimir_trabajos(trabajos)
+                print(f"Total de trabajos: {len(trabajos)}")
+            else:
+                print("No hay trabajos en ese rango")
+    
+    except DatosInvalidos as e:
+        print(f"\nFecha no válida: {e}")
+    except ValueError as e:
+        print(f"\nNo se puede consultar: {e}")
+    except Exception as e:
+        print(f"\nError al consultar entregas: {e}")
+    
+    input("\nPresione ENTER para volver al menú...")
+
+
+def ver_pronostico():
+    """Función para ver hasta cuándo alcanza el stock de cada material"""
+    from Pronóstico import SEMANAS_HISTORIAL, pronosticar
+
+    with medir("ver_pronostico"):
+        pronostico = pronosticar()
+    print(f"\nPRONÓSTICO DE MATERIALES (consumo de las últimas {SEMANAS_HISTORIAL} semanas; "
+          f"lo ya registrado está descontado del stock)\n")
+    print(f"{'Material':<18}{'Stock':>8}{'Por semana':>12}{'Registrado':>12}{'En 7 días':>11}{'En 28 días':>12}  Se agota")
+    for producto, stock in pronostico.stock.items():
+        proyectado = pronostico.proyectado[producto]
+        agotamiento = pronostico.agotamiento[producto]
+        cuando = agotamiento.strftime("%d-%m-%Y") if agotamiento else f"alcanza más de {pronostico.dias} días"
+        print(f"{producto.capitalize():<18}{stock:>8}{pronostico.demanda_semanal[producto]:>12}"
+              f"{pronostico.registrado[producto]:>12}{proyectado[6]:>11.1f}{proyectado[27]:>12.1f}  {cuando}")
+    print("")
+
+
+def ver_metricas():
+    """Función para ver los tiempos de las operaciones medidos en esta sesión"""
+    print("\nMETRICAS DE RENDIMIENTO\n")
+    volcar()
+    input("\nPresione ENTER para volver al menú...")
+
+
+if __name__ == "__main__":
+    menu_principal()
@@ -0,0 +1,175 @@
+"""Trabajos guardados en columnas compactas mientras el libro está en memoria
+
+Cada trabajo ocupa unos pocos bytes en arreglos (array) en lugar de tres
+celdas de openpyxl: el cliente y el tipo de trabajo son códigos de una tabla
+con cada valor distinto guardado una sola vez, y la fecha de entrega es el
+número de día (date.toordinal). Las fechas que no se pueden rehacer a partir
+de ese número (otro formato, fechas de Excel, textos no válidos) se guardan
+aparte tal como estaban en la hoja.
+"""
+from array import array
+from datetime import date
+from functools import lru_cache
+
+from Índices import FORMATO_FECHA, SIN_FECHA, ordinal_fecha
+
+# Tipos de array por ancho: los códigos empiezan en un byte y se agrandan al hacer falta
+TIPOS_CODIGO = ("B", "H", "I", "L")
+
+# Columnas de Trabajos que viven en ColumnasTrabajos: cliente, trabajo, fecha, cantidad y pieza
+COLUMNAS_TRABAJOS = 5
+
+
+@lru_cache(maxsize=4096)
+def texto_fecha(ordinal):
+    """Retorna la fecha dd-mm-yyyy de un número de día"""
+    return date.fromordinal(ordinal).strftime(FORMATO_FECHA)
+
+
+class ColumnaCodificada:
+    """Columna con valores repetidos: cada fila guarda el código de su valor en una tabla de valores distintos"""
+
+    def __init__(self):
+        self.valores = []
+        # (tipo, valor) -> código; el tipo evita que 1, 1.0 y True compartan código
+        self._codigos = {}
+        self.codigos = array(TIPOS_CODIGO[0])
+
+    def __len__(self):
+        return len(self.codigos)
+
+    def __getitem__(self, posicion):
+        return self.valores[self.codigos[posicion]]
+
+    def codigo(self, valor):
+        """Retorna el código de un valor, agregándolo a la tabla si es nuevo"""
+        clave = (type(valor), valor)
+        codigo = self._codigos.get(clave)
+        if codigo is None:
+            codigo = self._codigos[clave] = len(self.valores)
+            self.valores.append(valor)
+            if codigo >= 1 << (8 * self.codigos.itemsize):
+                tipo = TIPOS_CODIGO[TIPOS_CODIGO.index(self.codigos.typecode) + 1]
+                self.codigos = array(tipo, self.codigos)
+        return codigo
+
+    def agregar(self, valor):
+        # El código se pide antes: puede cambiar self.codigos por un array más ancho
+        codigo = self.codigo(valor)
+        self.codigos.append(codigo)
+
+    def fijar(self, posicion, valor):
+        codigo = self.codigo(valor)
+        self.codigos[posicion] = codigo
+
+    def truncar(self, largo):
+        del self.codigos[largo:]
+
+
+class ColumnasTrabajos:
+    """Filas (cliente, trabajo, fecha, cantidad, pieza) de la hoja de Trabajos guardadas por columnas
+
+    Las posiciones empiezan en 0 para la primera fila de datos (fila 2 de la
+    hoja). fila() retorna solo (cliente, trabajo, fecha); la cantidad y la
+    pieza (None en los trabajos registrados antes de guardarlas) se leen con
+    consumo() o fila_completa().
+    """
+
+    def __init__(self, filas=()):
+        self.clientes = ColumnaCodificada()
+        self.trabajos = ColumnaCodificada()
+        self.cantidades = ColumnaCodificada()
+        self.piezas = ColumnaCodificada()
+        # Día de la fecha de entrega de cada trabajo (SIN_FECHA si no es válida)
+        self.ordinales = array("i")
+        # posición -> fecha tal como estaba, para las que el día no alcanza a reconstruir
+        self._fechas_originales = {}
+        for fila in filas:
+            self.agregar(fila)
+
+    def __len__(self):
+        return len(self.ordinales)
+
+    def agregar(self, fila):
+        """Agrega una fila al final y retorna su posición"""
+        cliente, trabajo, fecha, cantidad, pieza = (tuple(fila) + (None,) * COLUMNAS_TRABAJOS)[:COLUMNAS_TRABAJOS]
+        self.clientes.agregar(cliente)
+        self.trabajos.agregar(trabajo)
+        self.cantidades.agregar(cantidad)
+        self.piezas.agregar(pieza)
+        self.ordinales.append(SIN_FECHA)
+        posicion = len(self.ordinales) - 1
+        self._fijar_fecha(posicion, fecha)
+        return posicion
+
+    def _fijar_fecha(self, posicion, fecha):
+        ordinal = ordinal_fecha(fecha)
+        self.ordinales[posicion] = SIN_FECHA if ordinal is None else ordinal
+        if ordinal is not None and fecha == texto_fecha(ordinal):
+            self._fechas_originales.pop(posicion, None)
+        else:
+            self._fechas_originales[posicion] = fecha
+
+    def fecha(self, posicion):
+        if posicion in self._fechas_originales:
+            return self._fechas_originales[posicion]
+        return texto_fecha(self.ordinales[posicion])
+
+    def leer(self, posicion, columna):
+        """Retorna el valor de la columna (0 cliente, 1 trabajo, 2 fecha, 3 cantidad, 4 pieza) de una fila"""
+        if columna == 0:
+            return self.clientes[posicion]
+        if columna == 1:
+            return self.trabajos[posicion]
+        if columna == 3:
+            return self.cantidades[posicion]
+        if columna == 4:
+            return self.piezas[posicion]
+        return self.fecha(posicion)
+
+    def fijar(self, posicion, columna, valor):
+        """Cambia el valor de una columna de una fila, agregando filas vacías si la posición no existe"""
+        while len(self) <= posicion:
+            self.agregar(())
+        if columna == 0:
+            self.clientes.fijar(posicion, valor)
+        elif columna == 1:
+            self.trabajos.fijar(posicion, valor)
+        elif columna == 3:
+            self.cantidades.fijar(posicion, valor)
+        elif columna == 4:
+            self.piezas.fijar(posicion, valor)
+        else:
+            self._fijar_fecha(posicion, valor)
+
+    def fila(self, posicion):
+        return self.clientes[posicion], self.trabajos[posicion], self.fecha(posicion)
+
+    def consumo(self, posicion):
+        """Retorna (trabajo, fecha, cantidad, pieza) de una fila"""
+        return self.trabajos[posicion], self.fecha(posicion), self.cantidades[posicion], self.piezas[posicion]
+
+    def fila_completa(self, posicion):
+        return self.fila(posicion) + (self.cantidades[posicion], self.piezas[posicion])
+
+    def iterar(self, inicio=0, fin=None, completas=False):
+        """Genera las filas (cliente, trabajo, fecha) desde inicio hasta fin (sin incluir)
+
+        Con completas=True las filas llevan también la cantidad y la pieza.
+        """
+        fila = self.fila_completa if completas else self.fila
+        for posicion in range(*slice(inicio, fin).indices(len(self))):
+            yield fila(posicion)
+
+    def filas(self, inicio=0, fin=None):
+        return tuple(self.iterar(inicio, fin))
+
+    def truncar(self, largo):
+        """Quita las filas desde la posición largo en adelante"""
+        self.clientes.truncar(largo)
+        self.trabajos.truncar(largo)
+        self.cantidades.truncar(largo)
+        self.piezas.truncar(largo)
+        del self.ordinales[largo:]
+        for posicion in [posicion for posicion in self._fechas_originales if posicion >= largo]:
+            del self._fechas_originales[posicion]
@@ -0,0 +1,1179 @@
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager
+from datetime import date
+from itertools import chain
+
+from Columnas import COLUMNAS_TRABAJOS, ColumnasTrabajos
+from Histórico import (ENCABEZADO_TRABAJOS, EXTENSION_HISTORICO, MESES_VIVOS, HistoricoTrabajos, mes_de,
+                       primer_dia_vivo, rango_mes)
+from Métricas import contar, medir
+from Índices import SIN_FECHA, IndiceClientes, IndiceFechas, IndiceNgramas, TotalesInventario, ordinal_fecha
+
+try:
+    import fcntl
+except ImportError:
+    # Windows: el bloqueo entre procesos se hace con msvcrt
+    fcntl = None
+    import msvcrt
+
+# Configuración de archivos Excel
+# Obtener la ruta del escritorio del usuario
+ESCRITORIO = os.path.join(os.path.expanduser("~"), "Desktop")
+ARCHIVO_EXCEL = os.path.join(ESCRITORIO, "base_datos.xlsx")
+HOJA_INVENTARIO = "Inventario"
+HOJA_TRABAJOS = "Trabajos"
+
+# Hoja oculta donde se anota la última transacción del diario ya compactada
+# y el último mes que se pasó al archivo histórico
+HOJA_CONTROL = "_Control"
+FILA_SECUENCIA = 1
+FILA_ARCHIVADO = 2
+# El diario de transacciones vive junto al archivo Excel (base_datos.diario)
+EXTENSION_DIARIO = ".diario"
+# Archivo de bloqueo compartido por todas las estaciones (base_datos.bloqueo)
+EXTENSION_BLOQUEO = ".bloqueo"
+ESPERA_BLOQUEO = 15.0         # segundos máximos esperando a que otra estación libere el archivo
+
+# Escritura diferida: los cambios se acumulan en el diario y se compactan juntos
+RETARDO_GUARDADO = 2.0        # segundos sin cambios antes de compactar
+ESPERA_MAXIMA = 10.0          # segundos máximos que un cambio puede esperar en el diario
+MAX_CAMBIOS_PENDIENTES = 200  # cambios en el diario que fuerzan una compactación inmediata
+
+
+def normalizar(nombre):
+    """Normaliza un nombre de producto para compararlo (minúsculas y sin espacios extremos)"""
+    return str(nombre).lower().strip()
+
+
+# Las celdas de una hoja se manejan con detalles internos de openpyxl (probados con la
+# versión de requirements.txt) para no recorrer toda la hoja. Si una versión los cambia,
+# las funciones siguientes usan la API pública: más lento, con el mismo resultado.
+
+def _celdas_internas(ws):
+    """Retorna el diccionario {(fila, columna): celda} de la hoja, o None si openpyxl no lo tiene"""
+    celdas = getattr(ws, "_cells", None)
+    return celdas if isinstance(celdas, dict) else None
+
+
+def _quitar_celdas(ws, desde_fila, hasta_columna):
+    """Quita las celdas de la hoja desde desde_fila en las columnas 1 a hasta_columna"""
+    celdas = _celdas_internas(ws)
+    if celdas is None:
+        for fila in ws.iter_rows(min_row=desde_fila, max_col=hasta_columna):
+            for celda in fila:
+                celda.value = None
+        return
+    # Un diccionario no se achica al borrar claves: se arma uno nuevo
+    ws._cells = {clave: celda for clave, celda in celdas.items()
+                 if clave[0] < desde_fila or clave[1] > hasta_columna}
+
+
+def _ultima_fila_agregada(ws):
+    """Retorna la fila que escribió el último ws.append()"""
+    # append() deja en _current_row la fila que escribió; ws.max_row recorre
+    # todas las celdas y haría cuadrático agregar muchas filas seguidas
+    fila = getattr(ws, "_current_row", None)
+    return fila if isinstance(fila, int) else ws.max_row
+
+
+def _ultima_columna(ws, desde_fila):
+    """Retorna la última columna con celdas desde desde_fila (0 si no hay)"""
+    celdas = _celdas_internas(ws)
+    if celdas is None:
+        return ws.max_column
+    return max((columna for fila, columna in celdas if fila >= desde_fila), default=0)
+
+
+def _reordenar_filas(ws, nueva_fila, desde_fila):
+    """Pasa cada fila desde desde_fila a nueva_fila[fila] y quita las que no están en nueva_fila
+
+    nueva_fila debe conservar el orden y numerar las filas que quedan seguidas desde desde_fila.
+    """
+    celdas = _celdas_internas(ws)
+    if celdas is None:
+        # delete_rows sube las filas siguientes: se borra de abajo hacia arriba
+        for fila in range(ws.max_row, desde_fila - 1, -1):
+            if fila not in nueva_fila:
+                ws.delete_rows(fila)
+        return
+    nuevas = {}
+    for (fila, columna), celda in celdas.items():
+        if fila >= desde_fila:
+            if fila not in nueva_fila:
+                continue
+            celda.row = fila = nueva_fila[fila]
+        nuevas[(fila, columna)] = celda
+    ws._cells = nuevas
+
+
+class StockInsuficiente(ValueError):
+    """No hay stock suficiente de un producto para descontar la cantidad pedida"""
+
+    def __init__(self, producto, disponible, solicitado):
+        super().__init__(f"Materiales insuficientes de {producto}: disponible {disponible}, solicitado {solicitado}")
+        self.producto = producto
+        self.disponible = disponible
+        self.solicitado = solicitado
+
+
+class ConflictoConcurrencia(RuntimeError):
+    """Otra estación modificó los datos y el cambio no se pudo volver a aplicar"""
+
+
+class BloqueoArchivo:
+    """Bloqueo exclusivo entre procesos sobre un archivo auxiliar (reentrante dentro del proceso)"""
+
+    def __init__(self, ruta, espera=ESPERA_BLOQUEO):
+        self.ruta = ruta
+        self.espera = espera
+        self._archivo = None
+        self._nivel = 0
+
+    def __enter__(self):
+        if self._nivel == 0:
+            archivo = open(self.ruta, "a+b")
+            limite = time.monotonic() + self.espera
+            while True:
+                try:
+                    self._tomar(archivo)
+                    break
+                except OSError:
+                    if time.monotonic() >= limite:
+                        archivo.close()
+                        raise TimeoutError("El archivo de datos está ocupado por otra estación, intente de nuevo")
+                    time.sleep(0.05)
+            self._archivo = archivo
+        self._nivel += 1
+        return self
+
+    def __exit__(self, *excepcion):
+        self._nivel -= 1
+        if self._nivel == 0:
+            try:
+                self._soltar(self._archivo)
+            finally:
+                self._archivo.close()
+                self._archivo = None
+
+    @staticmethod
+    def _tomar(archivo):
+        if fcntl:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_EX | fcntl.LOCK_NB)
+        else:
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_NBLCK, 1)
+
+    @staticmethod
+    def _soltar(archivo):
+        if fcntl:
+            fcntl.flock(archivo.fileno(), fcntl.LOCK_UN)
+        else:
+            archivo.seek(0)
+            msvcrt.locking(archivo.fileno(), msvcrt.LK_UNLCK, 1)
+
+
+class ConexionExcel:
+    """Capa de acceso a datos que mantiene el libro de Excel en memoria
+
+    Cada transacción confirmada se agrega primero al diario (base_datos.diario)
+    y se sincroniza a disco; la compactación vuelca el diario en el archivo
+    Excel en segundo plano o al llamar a flush(). Al cargar el libro se
+    reproducen las transacciones del diario que el Excel todavía no contiene.
+
+    Varias estaciones pueden usar el mismo archivo: las lecturas no bloquean,
+    y al confirmar una transacción se toma base_datos.bloqueo y se compara la
+    versión en disco (Excel + diario) con la que se leyó. Si otra estación
+    escribió entretanto, las operaciones de la transacción se vuelven a
+    aplicar sobre los datos actualizados, validando de nuevo el stock.
+    """
+
+    def __init__(self, archivo=ARCHIVO_EXCEL, retardo=RETARDO_GUARDADO,
+                 espera_maxima=ESPERA_MAXIMA, max_cambios=MAX_CAMBIOS_PENDIENTES):
+        self.archivo = archivo
+        self.diario = os.path.splitext(archivo)[0] + EXTENSION_DIARIO
+        self._bloqueo = BloqueoArchivo(os.path.splitext(archivo)[0] + EXTENSION_BLOQUEO)
+        # Meses de Trabajos ya cerrados, fuera del libro (base_datos_historico)
+        self.historico = HistoricoTrabajos(os.path.splitext(archivo)[0] + EXTENSION_HISTORICO)
+        self.retardo = retardo
+        self.espera_maxima = espera_maxima
+        self.max_cambios = max_cambios
+        self._candado = threading.RLock()
+        self._wb = None
+        self._firma = None
+        # Copia ya leída del Inventario (None = pendiente de leer)
+        self._inventario = None
+        # Filas de datos de Trabajos: mientras el libro está en memoria viven en
+        # columnas compactas y no como celdas de la hoja (ver _separar_trabajos)
+        self._columnas = None
+        # Índice del Inventario: producto normalizado -> [fila, cantidad]
+        self._indice = None
+        self._duplicados = {}
+        # Totales del Inventario, calculados junto con el índice y actualizados con cada cambio
+        self._totales = None
+        # Nombres de productos por n-gramas para la búsqueda aproximada
+        self._ngramas = None
+        # Índices de Trabajos (se mantienen al agregar trabajos)
+        self._fechas = None
+        self._clientes = None
+        # Diario: última transacción aplicada y bytes del diario ya leídos
+        self._secuencia = 0
+        self._posicion_diario = 0
+        self._reproduciendo = False
+        # Estado de la escritura diferida
+        self._cambios_pendientes = 0
+        self._primer_cambio = None
+        self._temporizador = None
+        # Transacción en curso: profundidad, registro para deshacer y operaciones del diario
+        self._profundidad = 0
+        self._deshacer = []
+        self._operaciones = []
+        # Funciones que reciben {producto: cantidad} de los productos cambiados (ver observar_stock)
+        self._observadores_stock = []
+
+    def _leer_firma(self):
+        """Retorna (mtime, tamaño) del archivo Excel y el tamaño del diario"""
+        try:
+            estado = os.stat(self.archivo)
+            firma_excel = (estado.st_mtime_ns, estado.st_size)
+        except FileNotFoundError:
+            firma_excel = (None, None)
+        try:
+            tamano_diario = os.path.getsize(self.diario)
+        except FileNotFoundError:
+            tamano_diario = 0
+        return firma_excel + (tamano_diario,)
+
+    def _olvidar_lecturas(self, hoja=None):
+        """Descarta las filas leídas de una hoja (o de todas)"""
+        if hoja in (None, HOJA_INVENTARIO):
+            self._inventario = None
+
+    def _olvidar_indice(self):
+        """Descarta el índice de productos para reconstruirlo en la siguiente búsqueda"""
+        self._indice = None
+        self._duplicados = {}
+        self._totales = None
+        self._ngramas = None
+
+    def _olvidar_indices_trabajos(self):
+        """Descarta los índices de Trabajos para reconstruirlos en la siguiente consulta"""
+        self._fechas = None
+        self._clientes = None
+
+    @property
+    def hay_cambios_pendientes(self):
+        return self._cambios_pendientes > 0
+
+    def inicializar(self):
+        """Crea el archivo Excel y las hojas si no existen"""
+        with self._bloqueo:
+            self._inicializar()
+
+    def _inicializar(self):
+        if not os.path.exists(self.archivo):
+            from openpyxl import Workbook
+
+            wb = Workbook()
+            
+            # Crear hoja de Inventario
+            ws_inventario = wb.active
+            ws_inventario.title = HOJA_INVENTARIO
+            ws_inventario.append(["Producto", "Cantidad"])
+            
+            # Crear hoja de Trabajos
+            ws_trabajos = wb.create_sheet(HOJA_TRABAJOS)
+            ws_trabajos.append(ENCABEZADO_TRABAJOS)
+            
+            wb.save(self.archivo)
+            print(f"Archivo creado exitosamente en: {self.archivo}")
+        else:
+            print(f"Archivo ya existe en: {self.archivo}")
+
+    def libro(self):
+        """Retorna el libro en memoria, recargándolo solo si el archivo o el diario cambiaron en disco"""
+        with self._candado:
+            # Durante una transacción el libro no se recarga
+            if self._wb is None or (self._profundidad == 0 and self._leer_firma() != self._firma):
+                # Otra estación pudo estar compactando o agregando al diario
+                with self._bloqueo:
+                    self._actualizar()
+            return self._wb
+
+    def _actualizar(self):
+        """Pone la copia en memoria al día con el Excel y el diario en disco"""
+        firma = self._leer_firma()
+        if self._wb is None or firma[:2] != self._firma[:2]:
+            # El archivo Excel pudo editarse fuera del programa o compactarse en otra estación
+            # openpyxl se importa al primer uso: importar el módulo no lo carga
+            from openpyxl import load_workbook
+
+            with medir("excel.cargar_libro") as medicion:
+                self._wb = load_workbook(self.archivo)
+                medicion.sumar(filas=sum(ws.max_row for ws in self._wb.worksheets))
+                self._separar_trabajos()
+            self._firma = firma
+            self._olvidar_lecturas()
+            self._olvidar_indice()
+            self._olvidar_indices_trabajos()
+            self._secuencia = self._leer_secuencia_control()
+            self._posicion_diario = 0
+            self._cambios_pendientes = 0
+            self._primer_cambio = None
+            self._reproducir_diario()
+        elif firma[2] != self._firma[2]:
+            # Solo creció el diario: se aplican las transacciones nuevas
+            self._firma = firma
+            self._reproducir_diario()
+
+    def _separar_trabajos(self):
+        """Pasa las filas de datos de Trabajos a columnas y quita sus celdas de la hoja
+
+        Cada celda de openpyxl ocupa cientos de bytes; en columnas un trabajo
+        ocupa unos pocos. Las celdas se vuelven a crear solo mientras se
+        guarda el libro (_trabajos_en_hoja). Las columnas después de
+        COLUMNAS_TRABAJOS y el encabezado quedan en la hoja.
+        """
+        ws = self._wb[HOJA_TRABAJOS]
+        self._columnas = ColumnasTrabajos(ws.iter_rows(min_row=2, max_col=COLUMNAS_TRABAJOS, values_only=True))
+        self._quitar_celdas_trabajos(ws)
+        # Los libros anteriores no tienen el encabezado de la cantidad y la pieza
+        for columna, titulo in enumerate(ENCABEZADO_TRABAJOS, 1):
+            if ws.cell(1, columna).value is None:
+                ws.cell(1, columna).value = titulo
+
+    def _quitar_celdas_trabajos(self, ws):
+        _quitar_celdas(ws, 2, COLUMNAS_TRABAJOS)
+
+    @contextmanager
+    def _trabajos_en_hoja(self):
+        """Devuelve los Trabajos a la hoja mientras dura el with (para guardar el libro)"""
+        ws = self._wb[HOJA_TRABAJOS]
+        for posicion, fila in enumerate(self._columnas.iterar(completas=True)):
+            for columna, valor in enumerate(fila, 1):
+                if valor is not None:
+                    ws.cell(posicion + 2, columna, valor)
+        try:
+            yield
+        finally:
+            self._quitar_celdas_trabajos(ws)
+
+    def invalidar(self):
+        """Descarta la copia en memoria para forzar una recarga (el diario conserva lo confirmado)"""
+        with self._candado:
+            self._cancelar_temporizador()
+            self._wb = None
+            self._columnas = None
+            self._firma = None
+            self._olvidar_lecturas()
+            self._olvidar_indice()
+            self._olvidar_indices_trabajos()
+            self._cambios_pendientes = 0
+            self._primer_cambio = None
+
+    # Diario de transacciones
+
+    def _leer_control(self, fila):
+        if HOJA_CONTROL not in self._wb.sheetnames:
+            return None
+        return self._wb[HOJA_CONTROL].cell(fila, 2).value
+
+    def _fijar_control(self, fila, titulo, valor):
+        if HOJA_CONTROL in self._wb.sheetnames:
+            ws = self._wb[HOJA_CONTROL]
+        else:
+            ws = self._wb.create_sheet(HOJA_CONTROL)
+            ws.sheet_state = "hidden"
+        ws.cell(fila, 1).value = titulo
+        ws.cell(fila, 2).value = valor
+
+    def _leer_secuencia_control(self):
+        """Retorna la última transacción del diario que ya está dentro del archivo Excel"""
+        return self._leer_control(FILA_SECUENCIA) or 0
+
+    def _fijar_secuencia_control(self, secuencia):
+        self._fijar_control(FILA_SECUENCIA, "Secuencia del diario", secuencia)
+
+    def _escribir_diario(self, operaciones):
+        """Agrega una transacción al diario y espera a que llegue al disco"""
+        secuencia = self._secuencia + 1
+        linea = json.dumps({"sec": secuencia, "ops": operaciones}, ensure_ascii=False).encode("utf-8") + b"\n"
+        with medir("excel.escribir_diario") as medicion, open(self.diario, "ab") as archivo:
+            if archivo.tell() > self._posicion_diario:
+                # Resto de una escritura que quedó a medias: nunca se confirmó
+                archivo.truncate(self._posicion_diario)
+            archivo.write(linea)
+            archivo.flush()
+            os.fsync(archivo.fileno())
+            self._posicion_diario = archivo.tell()
+            medicion.sumar(bytes_escritos=len(linea))
+        self._secuencia = secuencia
+        self._firma = self._firma[:2] + (self._posicion_diario,)
+
+    def _reproducir_diario(self):
+        """Aplica al libro en memoria las transacciones del diario que todavía no contiene"""
+        try:
+            with open(self.diario, "rb") as archivo:
+                archivo.seek(self._posicion_diario)
+                datos = archivo.read()
+        except FileNotFoundError:
+            return
+
+        aplicadas = 0
+        self._reproduciendo = True
+        try:
+            aplicadas = self._reproducir_lineas(datos)
+        finally:
+            self._reproduciendo = False
+
+        if aplicadas:
+            # Lo reproducido aún no está en el Excel: queda pendiente de compactar
+            self._cambios_pendientes += aplicadas
+            if self._primer_cambio is None:
+                self._primer_cambio = time.monotonic()
+            self._programar_guardado(self.retardo)
+
+    def _reproducir_lineas(self, datos):
+        aplicadas = 0
+        for linea in datos.splitlines(keepends=True):
+            if not linea.endswith(b"\n"):
+                # Escritura incompleta: se descarta en la siguiente transacción
+                break
+            self._posicion_diario += len(linea)
+            try:
+                entrada = json.loads(linea)
+            except ValueError:
+                print("Aviso: se ignora una línea dañada del diario")
+                continue
+            if entrada["sec"] <= self._secuencia:
+                continue
+            for operacion in entrada["ops"]:
+                self._aplicar(operacion)
+            aplicadas += len(entrada["ops"])
+            self._secuencia = entrada["sec"]
+        return aplicadas
+
+    def _aplicar(self, operacion, validar=False):
+        """Aplica una operación del diario al libro en memoria
+
+        Con validar=True (transacciones propias) un descuento que deja el stock
+        en negativo o un producto inexistente se rechazan en vez de aplicarse.
+        """
+        tipo = operacion[0]
+        if tipo == "stock":
+            _, producto, delta = operacion
+            entrada = self._indice_productos().get(normalizar(producto))
+            if validar and entrada is None and delta < 0:
+                raise ValueError(f"El producto {producto} no se encuentra en el inventario")
+            if validar and entrada is not None and delta < 0 and (entrada[1] or 0) + delta < 0:
+                raise StockInsuficiente(producto, entrada[1] or 0, -delta)
+            if entrada is None:
+                if not validar:
+                    print(f"Aviso: el producto {producto} ya no está en el inventario; se vuelve a agregar")
+                self._agregar_a_indice(producto, delta)
+            else:
+                entrada[1] = (entrada[1] or 0) + delta
+                self._totales.sumar(normalizar(producto), delta)
+                self._escribir_celda(HOJA_INVENTARIO, entrada[0], 2, entrada[1])
+        elif tipo == "producto":
+            _, producto, cantidad = operacion
+            entrada = self._indice_productos().get(normalizar(producto))
+            if entrada is None:
+                self._agregar_a_indice(producto, cantidad)
+            else:
+                entrada[1] = (entrada[1] or 0) + cantidad
+                self._totales.sumar(normalizar(producto), cantidad)
+                self._escribir_celda(HOJA_INVENTARIO, entrada[0], 2, entrada[1])
+        elif tipo == "fila":
+            _, hoja, valores = operacion
+            self._agregar_fila(hoja, valores)
+            if hoja == HOJA_INVENTARIO:
+                self._olvidar_indice()
+        elif tipo == "celda":
+            _, hoja, fila, columna, valor = operacion
+            self._escribir_celda(hoja, fila, columna, valor)
+            if hoja == HOJA_INVENTARIO:
+                self._olvidar_indice()
+
+    # Escrituras
+
+    @contextmanager
+    def transaccion(self):
+        """Agrupa varios cambios para que se guarden juntos o no se guarde ninguno"""
+        with self._candado:
+            if self._profundidad == 0:
+                # Se parte del estado más reciente en disco (Excel + diario)
+                self.libro()
+            # Punto de retorno: una transacción anidada que falla solo deshace lo suyo
+            punto = (len(self._deshacer), len(self._operaciones))
+            self._profundidad += 1
+            try:
+                yield self
+                if self._profundidad == 1 and self._operaciones:
+                    # La transacción queda confirmada cuando está en el diario
+                    self._confirmar_en_disco()
+            except BaseException:
+                self._profundidad -= 1
+                self._revertir(*punto)
+                raise
+            self._profundidad -= 1
+            if self._profundidad != 0:
+                return
+            cambios = len(self._operaciones)
+            tocados = self._productos_tocados()
+            self._deshacer = []
+            self._operaciones = []
+            self._confirmar(cambios)
+            # Todavía con el candado: los observadores reciben los cambios en el orden en que se confirmaron
+            if tocados:
+                self._avisar_stock(tocados)
+
+    def observar_stock(self, funcion):
+        """funcion({producto: cantidad}) se llama después de cada transacción que cambia el stock
+
+        Solo recibe los productos que cambió la transacción, con la cantidad confirmada.
+        """
+        self._observadores_stock.append(funcion)
+
+    def _productos_tocados(self):
+        """Retorna {producto: cantidad} de los productos que cambian las operaciones de la transacción"""
+        if not self._observadores_stock:
+            return {}
+        indice = self._indice_productos()
+        tocados = {}
+        for operacion in self._operaciones:
+            if operacion[0] in ("stock", "producto"):
+                entrada = indice.get(normalizar(operacion[1]))
+                if entrada is not None:
+                    tocados[normalizar(operacion[1])] = entrada[1]
+        return tocados
+
+    def _avisar_stock(self, tocados):
+        for funcion in list(self._observadores_stock):
+            try:
+                funcion(tocados)
+            except Exception as e:
+                print(f"Error al revisar el stock: {e}")
+
+    def _confirmar_en_disco(self):
+        """Escribe la transacción en el diario comprobando antes la versión en disco"""
+        with self._bloqueo:
+            if self._leer_firma() != self._firma:
+                # Otra estación escribió desde que se leyeron los datos
+                self._rebasar()
+            self._escribir_diario(self._operaciones)
+
+    def _rebasar(self):
+        """Vuelve a aplicar las operaciones de la transacción sobre los datos actuales en disco"""
+        operaciones = list(self._operaciones)
+        if any(operacion[0] == "celda" for operacion in operaciones):
+            # Una celda escrita por posición no se puede trasladar con seguridad
+            raise ConflictoConcurrencia("Otra estación modificó el archivo al mismo tiempo, intente de nuevo")
+        self._revertir()
+        self._actualizar()
+        for operacion in operaciones:
+            self._aplicar(operacion, validar=True)
+            self._operaciones.append(operacion)
+
+    def _revertir(self, punto_deshacer=0, punto_operaciones=0):
+        """Deshace en memoria los cambios hechos después del punto de retorno"""
+        del self._operaciones[punto_operaciones:]
+        wb = self._wb
+        while len(self._deshacer) > punto_deshacer:
+            accion = self._deshacer.pop()
+            if accion[0] == "celda":
+                _, hoja, fila, columna, anterior = accion
+                self._poner_valor(hoja, fila, columna, anterior)
+            else:
+                _, hoja, fila = accion
+                if hoja == HOJA_TRABAJOS:
+                    # Se deshace en orden inverso: la fila es siempre la última
+                    self._columnas.truncar(fila - 2)
+                wb[hoja].delete_rows(fila)
+            self._olvidar_lecturas(accion[1])
+            if accion[1] == HOJA_INVENTARIO:
+                self._olvidar_indice()
+            else:
+                self._olvidar_indices_trabajos()
+
+    def escribir(self, hoja, fila, columna, valor):
+        """Cambia el valor de una celda dentro de la copia en memoria"""
+        with self.transaccion():
+            self._escribir_celda(hoja, fila, columna, valor)
+            self._operaciones.append(["celda", hoja, fila, columna, valor])
+            if hoja == HOJA_INVENTARIO:
+                self._olvidar_indice()
+
+    def agregar_fila(self, hoja, valores):
+        """Agrega una fila al final de una hoja dentro de la copia en memoria"""
+        with self.transaccion():
+            self._agregar_fila(hoja, valores)
+            self._operaciones.append(["fila", hoja, list(valores)])
+            if hoja == HOJA_INVENTARIO:
+                self._olvidar_indice()
+
+    def _en_columnas(self, hoja, fila, columna):
+        return hoja == HOJA_TRABAJOS and fila >= 2 and columna <= COLUMNAS_TRABAJOS
+
+    def _leer_valor(self, hoja, fila, columna):
+        if self._en_columnas(hoja, fila, columna):
+            return self._columnas.leer(fila - 2, columna - 1) if fila - 2 < len(self._columnas) else None
+        return self._wb[hoja].cell(fila, columna).value
+
+    def _poner_valor(self, hoja, fila, columna, valor):
+        if self._en_columnas(hoja, fila, columna):
+            self._columnas.fijar(fila - 2, columna - 1, valor)
+        else:
+            self._wb[hoja].cell(fila, columna).value = valor
+
+    def _escribir_celda(self, hoja, fila, columna, valor):
+        self.libro()
+        if self._profundidad > 0 and not self._reproduciendo:
+            self._deshacer.append(("celda", hoja, fila, columna, self._leer_valor(hoja, fila, columna)))
+        self._poner_valor(hoja, fila, columna, valor)
+        self._olvidar_lecturas(hoja)
+        if hoja == HOJA_TRABAJOS:
+            self._olvidar_indices_trabajos()
+
+    def _agregar_fila(self, hoja, valores):
+        ws = self.libro()[hoja]
+        if hoja == HOJA_TRABAJOS:
+            posicion = self._columnas.agregar(valores)
+            fila = posicion + 2
+            # Lo que pase de las columnas de Trabajos se guarda en la hoja
+            for columna, valor in enumerate(valores[COLUMNAS_TRABAJOS:], COLUMNAS_TRABAJOS + 1):
+                ws.cell(fila, columna, valor)
+        else:
+            ws.append(valores)
+            fila = _ultima_fila_agregada(ws)
+        if self._profundidad > 0 and not self._reproduciendo:
+            self._deshacer.append(("fila", hoja, fila))
+        self._olvidar_lecturas(hoja)
+        if hoja == HOJA_TRABAJOS:
+            if self._fechas is not None:
+                self._fechas.agregar(posicion)
+            if self._clientes is not None:
+                self._clientes.agregar(posicion)
+        return fila
+
+    def _agregar_a_indice(self, producto, cantidad):
+        # El índice se obtiene antes de agregar la fila para no contarla dos veces
+        indice = self._indice_productos()
+        fila = self._agregar_fila(HOJA_INVENTARIO, [producto, cantidad])
+        indice[normalizar(producto)] = [fila, cantidad]
+        self._totales.agregar_producto(normalizar(producto), cantidad)
+        if self._ngramas is not None:
+            self._ngramas.agregar(normalizar(producto))
+
+    def fijar_cantidad(self, producto, cantidad):
+        """Cambia la cantidad en stock de un producto que ya está en el Inventario"""
+        with self.transaccion():
+            nombre = normalizar(producto)
+            entrada = self._indice_productos().get(nombre)
+            if entrada is None:
+                raise ValueError(f"El producto {nombre} no se encuentra en el inventario")
+            # En el diario se anota la diferencia, no el valor final
+            self._operaciones.append(["stock", nombre, cantidad - (entrada[1] or 0)])
+            self._escribir_celda(HOJA_INVENTARIO, entrada[0], 2, cantidad)
+            self._totales.sumar(nombre, cantidad - (entrada[1] or 0))
+            entrada[1] = cantidad
+
+    def sumar_cantidad(self, producto, delta):
+        """Suma delta (negativo para descontar) al stock de un producto y retorna la nueva cantidad
+
+        Un producto que no está en el Inventario se agrega si delta es positivo;
+        un descuento que dejaría el stock en negativo lanza StockInsuficiente.
+        """
+        with self.transaccion():
+            nombre = normalizar(producto)
+            if nombre not in self._indice_productos() and delta > 0:
+                self.agregar_producto(producto, delta)
+                return delta
+            operacion = ["stock", nombre, delta]
+            self._aplicar(operacion, validar=True)
+            self._operaciones.append(operacion)
+            return self._indice[nombre][1]
+
+    def agregar_producto(self, producto, cantidad):
+        """Agrega un producto nuevo al final del Inventario"""
+        with self.transaccion():
+            nombre = normalizar(producto)
+            if nombre in self._indice_productos():
+                raise ValueError(f"El producto {nombre} ya está en el inventario")
+            self._operaciones.append(["producto", producto, cantidad])
+            self._agregar_a_indice(producto, cantidad)
+
+    def agregar_trabajo(self, cliente, trabajo, fecha, cantidad=None, pieza=None):
+        """Agrega un trabajo al final de la hoja de Trabajos con la cantidad y la pieza que consume"""
+        valores = [cliente, trabajo, fecha]
+        if cantidad is not None or pieza is not None:
+            valores += [cantidad, pieza]
+        self.agregar_fila(HOJA_TRABAJOS, valores)
+
+    def _confirmar(self, cambios):
+        """Registra cambios confirmados y programa la compactación diferida"""
+        if cambios == 0:
+            return
+        self._cambios_pendientes += cambios
+        if self._primer_cambio is None:
+            self._primer_cambio = time.monotonic()
+
+        espera = time.monotonic() - self._primer_cambio
+        if self._cambios_pendientes >= self.max_cambios or espera >= self.espera_maxima:
+            self._intentar_guardar()
+        else:
+            self._programar_guardado(min(self.retardo, self.espera_maxima - espera))
+
+    def _programar_guardado(self, segundos):
+        """Reinicia el temporizador de la compactación diferida (debounce)"""
+        self._cancelar_temporizador()
+        self._temporizador = threading.Timer(segundos, self._intentar_guardar)
+        self._temporizador.daemon = True
+        self._temporizador.start()
+
+    def _cancelar_temporizador(self):
+        if self._temporizador is not None:
+            self._temporizador.cancel()
+            self._temporizador = None
+
+    def _intentar_guardar(self):
+        """Compacta los cambios pendientes; si falla siguen en el diario y se reintenta más tarde"""
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error al guardar en Excel: {e}")
+            with self._candado:
+                if self._temporizador is None and self.hay_cambios_pendientes:
+                    self._programar_guardado(self.retardo)
+
+    def flush(self):
+        """Compacta de inmediato el diario dentro del archivo Excel"""
+        with self._candado:
+            if self._profundidad > 0:
+                # Nunca se compacta una transacción a medias
+                return
+            self._cancelar_temporizador()
+            if not self.hay_cambios_pendientes:
+                return
+            with self._bloqueo:
+                # Se incluyen las transacciones que otras estaciones agregaron al diario
+                self._actualizar()
+                if not self.hay_cambios_pendientes:
+                    return
+                self._guardar_compactado()
+
+    compactar = flush
+
+    def _guardar_compactado(self):
+        """Guarda el libro en memoria con todo el diario y vacía el diario (con el archivo bloqueado)"""
+        # El Excel anota hasta qué transacción contiene: si el programa se
+        # cierra antes de vaciar el diario, esas transacciones no se repiten
+        self._fijar_secuencia_control(self._secuencia)
+        self._guardar_atomico()
+        with open(self.diario, "wb") as archivo:
+            os.fsync(archivo.fileno())
+        self._posicion_diario = 0
+        self._firma = self._leer_firma()
+        self._cancelar_temporizador()
+        self._cambios_pendientes = 0
+        self._primer_cambio = None
+
+    def _guardar_atomico(self):
+        """Escribe el libro en un archivo temporal y lo reemplaza de una sola vez"""
+        temporal = self.archivo + ".tmp"
+        try:
+            with medir("excel.guardar_libro") as medicion, self._trabajos_en_hoja():
+                self._wb.save(temporal)
+                with open(temporal, "rb+") as archivo:
+                    os.fsync(archivo.fileno())
+                medicion.sumar(bytes_escritos=os.path.getsize(temporal))
+            os.replace(temporal, self.archivo)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    def cerrar(self):
+        """Compacta los cambios pendientes antes de terminar"""
+        try:
+            self.flush()
+        except Exception as e:
+            print(f"Error al guardar en Excel: {e}")
+
+    # Lecturas
+
+    def leer_inventario(self):
+        """Retorna las filas (producto, cantidad) de la hoja de Inventario"""
+        with self._candado:
+            wb = self.libro()
+            if self._inventario is None:
+                ws = wb[HOJA_INVENTARIO]
+                with medir("excel.leer_hoja") as medicion:
+                    self._inventario = tuple(
+                        (producto, cantidad)
+                        for producto, cantidad in ws.iter_rows(min_row=2, max_col=2, values_only=True)
+                    )
+                    medicion.sumar(filas=len(self._inventario))
+            return self._inventario
+
+    def leer_trabajos(self, inicio=0, fin=None, completas=False):
+        """Retorna las filas (cliente, trabajo, fecha) de la hoja de Trabajos, desde inicio hasta fin
+
+        Con completas=True las filas llevan también la cantidad y la pieza.
+        """
+        with self._candado:
+            self.libro()
+            # Las filas se arman desde las columnas; no se guarda una copia
+            return tuple(self._columnas.iterar(inicio, fin, completas))
+
+    def _en_memoria(self):
+        """Indica si las lecturas deben usar el libro en memoria en lugar del archivo"""
+        with self._candado:
+            if self._wb is not None and self._profundidad > 0:
+                # Dentro de una transacción se lee siempre la copia en memoria
+                return True
+            firma = self._leer_firma()
+            if self._wb is not None and firma == self._firma:
+                return True
+            if firma[2] > 0:
+                # Hay transacciones sin compactar: se combinan en memoria con el Excel
+                self.libro()
+                return True
+            return False
+
+    def _filas_en_memoria(self, hoja, columnas, inicio, fin):
+        if hoja == HOJA_INVENTARIO:
+            return self.leer_inventario()[inicio:fin]
+        return self.leer_trabajos(inicio, fin, completas=columnas > 3)
+
+    def _iterar_hoja(self, hoja, columnas, inicio=0, cantidad=None):
+        """Recorre las filas de datos de una hoja una por una sin cargar el libro completo"""
+        with self._candado:
+            en_memoria = self._en_memoria()
+            if en_memoria:
+                # El libro ya está en memoria: se recorre la copia leída
+                filas = self._filas_en_memoria(hoja, columnas, inicio, None if cantidad is None else inicio + cantidad)
+        if en_memoria:
+            contar("excel.filas_en_memoria", len(filas))
+            yield from filas
+            return
+
+        # Modo de solo lectura: openpyxl lee el XML de la hoja a medida que avanza.
+        # La duración incluye el tiempo de quien consume las filas
+        from openpyxl import load_workbook
+
+        with medir("excel.recorrer_hoja") as medicion:
+            wb = load_workbook(self.archivo, read_only=True)
+            leidas = 0
+            try:
+                ultima = None if cantidad is None else inicio + cantidad + 1
+                for fila in wb[hoja].iter_rows(min_row=inicio + 2, max_row=ultima, max_col=columnas, values_only=True):
+                    leidas += 1
+                    if len(fila) < columnas:
+                        fila = tuple(fila) + (None,) * (columnas - len(fila))
+                    yield fila
+            finally:
+                wb.close()
+                medicion.sumar(filas=leidas)
+
+    def _contar_filas(self, hoja):
+        """Cuenta las filas de datos de una hoja con la dimensión guardada en el archivo"""
+        with self._candado:
+            if self._en_memoria():
+                if hoja == HOJA_TRABAJOS:
+                    self.libro()
+                    return len(self._columnas)
+                return max(self.libro()[hoja].max_row - 1, 0)
+
+        from openpyxl import load_workbook
+
+        with medir("excel.contar_filas"):
+            wb = load_workbook(self.archivo, read_only=True)
+            try:
+                ws = wb[hoja]
+                # En modo de solo lectura max_row sale de la etiqueta <dimension> de la hoja
+                ultima = ws.max_row
+                if ultima is None:
+                    ultima = sum(1 for _ in ws.iter_rows(values_only=True))
+                return max(ultima - 1, 0)
+            finally:
+                wb.close()
+
+    def iterar_inventario(self):
+        """Genera las filas (producto, cantidad) del Inventario con memoria acotada"""
+        return self._iterar_hoja(HOJA_INVENTARIO, 2)
+
+    def iterar_trabajos(self, completas=False):
+        """Genera las filas (cliente, trabajo, fecha) de los Trabajos con memoria acotada
+
+        Los meses archivados van primero: son los trabajos más antiguos. Con
+        completas=True las filas llevan también la cantidad y la pieza.
+        """
+        columnas = COLUMNAS_TRABAJOS if completas else 3
+        return chain(self.historico.iterar(completas), self._iterar_hoja(HOJA_TRABAJOS, columnas))
+
+    def contar_inventario(self):
+        """Retorna la cantidad de filas del Inventario sin leerlas"""
+        return self._contar_filas(HOJA_INVENTARIO)
+
+    def contar_trabajos(self):
+        """Retorna la cantidad de filas de Trabajos sin leerlas, incluidos los meses archivados"""
+        with self._candado:
+            return self.historico.contar() + self._contar_filas(HOJA_TRABAJOS)
+
+    def leer_pagina_inventario(self, inicio, cantidad):
+        """Retorna hasta cantidad filas (producto, cantidad) del Inventario desde la fila inicio"""
+        return tuple(self._iterar_hoja(HOJA_INVENTARIO, 2, inicio, cantidad))
+
+    def leer_pagina_trabajos(self, inicio, cantidad):
+        """Retorna hasta cantidad filas (cliente, trabajo, fecha) de Trabajos desde la fila inicio
+
+        Las posiciones cuentan primero los meses archivados, como iterar_trabajos.
+        """
+        with self._candado:
+            archivados = self.historico.contar()
+            filas = tuple(self.historico.leer_pagina(inicio, cantidad)) if inicio < archivados else ()
+            if len(filas) < cantidad:
+                filas += tuple(self._iterar_hoja(HOJA_TRABAJOS, 3, max(inicio - archivados, 0), cantidad - len(filas)))
+            return filas
+
+    def _indice_productos(self):
+        """Retorna el índice producto -> [fila, cantidad], construyéndolo si hace falta"""
+        with self._candado:
+            ws = self.libro()[HOJA_INVENTARIO]
+            if self._indice is None:
+                indice = {}
+                duplicados = {}
+                # Los totales se calculan en el mismo recorrido que el índice
+                totales = TotalesInventario()
+                with medir("excel.indice_productos") as medicion:
+                    for fila, (producto, cantidad) in enumerate(
+                            ws.iter_rows(min_row=2, max_col=2, values_only=True), 2):
+                        if not producto:
+                            continue
+                        nombre = normalizar(producto)
+                        if nombre in indice:
+                            # Se conserva la primera fila, como hacía la búsqueda lineal
+                            duplicados.setdefault(nombre, [indice[nombre][0]]).append(fila)
+                            totales.sumar(nombre, cantidad or 0)
+                        else:
+                            indice[nombre] = [fila, cantidad or 0]
+                            totales.agregar_producto(nombre, cantidad or 0)
+                    medicion.sumar(filas=ws.max_row - 1)
+                for nombre, filas in duplicados.items():
+                    print(f"Aviso: el producto {nombre} está repetido en las filas "
+                          f"{', '.join(str(f) for f in filas)} del inventario; se usa la fila {filas[0]}")
+                self._indice = indice
+                self._duplicados = duplicados
+                self._totales = totales
+            return self._indice
+
+    def buscar_producto(self, producto):
+        """Retorna (fila, cantidad) del producto en el Inventario, o None si no existe"""
+        with self._candado:
+            entrada = self._indice_productos().get(normalizar(producto))
+            return tuple(entrada) if entrada else None
+
+    def obtener_cantidad(self, producto):
+        """Retorna la cantidad en stock de un producto, o None si no está en el inventario"""
+        with self._candado:
+            if not self._en_memoria():
+                # Consulta suelta: basta con recorrer la hoja de Inventario en modo de
+                # solo lectura, sin cargar el libro completo con todos los Trabajos
+                nombre = normalizar(producto)
+                for actual, cantidad in self._iterar_hoja(HOJA_INVENTARIO, 2):
+                    if actual and normalizar(actual) == nombre:
+                        return cantidad or 0
+                return None
+        encontrado = self.buscar_producto(producto)
+        return encontrado[1] if encontrado else None
+
+    def _indice_fechas(self):
+        """Retorna el índice de Trabajos por fecha de entrega, construyéndolo si hace falta"""
+        with self._candado:
+            self.libro()
+            if self._fechas is None:
+                with medir("excel.indice_fechas") as medicion:
+                    self._fechas = IndiceFechas(self._columnas)
+                    medicion.sumar(filas=len(self._columnas))
+            return self._fechas
+
+    def trabajos_entre(self, desde, hasta):
+        """Retorna los trabajos (cliente, trabajo, fecha) con entrega entre desde y hasta, ordenados por fecha
+
+        Incluye los meses archivados del rango.
+        """
+        with self._candado:
+            vivos = self._indice_fechas().entre(desde, hasta)
+            archivados = self.historico.trabajos_entre(desde, hasta)
+        return self._con_archivados(archivados, vivos)
+
+    @staticmethod
+    def _con_archivados(archivados, vivos):
+        """Une filas archivadas y vivas, ya ordenadas por fecha cada una"""
+        if not archivados:
+            return vivos
+        # sorted es estable: a igual fecha los archivados, que son anteriores, van primero
+        return tuple(sorted(archivados + list(vivos), key=lambda fila: ordinal_fecha(fila[2])))
+
+    def consumos_entre(self, desde, hasta):
+        """Retorna (trabajo, fecha, cantidad, pieza) de los trabajos con entrega entre desde y hasta
+
+        Incluye los meses archivados del rango; la cantidad y la pieza son None
+        en los trabajos registrados antes de guardarlas.
+        """
+        with self._candado:
+            vivos = self._indice_fechas().consumos_entre(desde, hasta)
+            archivados = self.historico.consumos_entre(desde, hasta)
+        return tuple(archivados) + vivos
+
+    def trabajos_vencidos(self, hoy):
+        """Retorna los trabajos con entrega anterior a hoy, ordenados por fecha
+
+        Incluye los meses archivados: no hay estado de entregado, así que un
+        trabajo archivado sigue vencido. Los meses archivados no se abren en la
+        consulta sino mientras se recorre el resultado (ver FilasConArchivados).
+        """
+        with self._candado:
+            vivos = self._indice_fechas().antes_de(hoy)
+            return self.historico.con_vivos(date.min, date.fromordinal(ordinal_fecha(hoy) - 1), vivos)
+
+    def proximas_entregas(self, desde, cantidad):
+        """Retorna los primeros cantidad trabajos con entrega a partir de desde"""
+        with self._candado:
+            return self._indice_fechas().proximos(desde, cantidad)
+
+    def totales_inventario(self):
+        """Retorna los productos distintos y las unidades del Inventario, en total y por categoría"""
+        with self._candado:
+            self._indice_productos()
+            return self._totales.resumen()
+
+    def verificar_totales(self):
+        """Recuenta el Inventario y lo compara con los totales mantenidos
+
+        Retorna (coinciden, mantenidos, recontados); si no coinciden, los
+        totales pasan a ser los del recuento.
+        """
+        with self._candado:
+            mantenidos = self.totales_inventario()
+            ws = self.libro()[HOJA_INVENTARIO]
+            recuento = TotalesInventario(ws.iter_rows(min_row=2, max_col=2, values_only=True))
+            recontados = recuento.resumen()
+            if recontados != mantenidos:
+                self._totales = recuento
+            return recontados == mantenidos, mantenidos, recontados
+
+    def buscar_parecidos(self, producto, cantidad=5):
+        """Retorna hasta cantidad tuplas (producto, stock, similitud) con los nombres más parecidos"""
+        with self._candado:
+            indice = self._indice_productos()
+            if self._ngramas is None:
+                with medir("excel.indice_ngramas") as medicion:
+                    self._ngramas = IndiceNgramas(indice)
+                    medicion.sumar(filas=len(indice))
+            return [(nombre, indice[nombre][1], similitud)
+                    for nombre, similitud in self._ngramas.buscar(producto, cantidad)]
+
+    def _indice_clientes(self):
+        """Retorna el índice de Trabajos por cliente, construyéndolo si hace falta"""
+        with self._candado:
+            self.libro()
+            if self._clientes is None:
+                with medir("excel.indice_clientes") as medicion:
+                    self._clientes = IndiceClientes(self._columnas)
+                    medicion.sumar(filas=len(self._columnas))
+            return self._clientes
+
+    def sugerir_clientes(self, prefijo, cantidad=10):
+        """Retorna hasta cantidad nombres de clientes registrados que empiezan con el prefijo"""
+        with self._candado:
+            return self._indice_clientes().sugerir(prefijo, cantidad)
+
+    def trabajos_de_cliente(self, cliente):
+        """Retorna los trabajos (cliente, trabajo, fecha) de un cliente, con los de meses archivados primero"""
+        with self._candado:
+            vivos = self._indice_clientes().trabajos_de(cliente)
+            return tuple(self.historico.trabajos_de_cliente(cliente)) + vivos
+
+    def iterar_trabajos_archivados(self):
+        """Genera las filas (cliente, trabajo, fecha) de los meses archivados, del más antiguo al más reciente"""
+        return self.historico.iterar()
+
+    # Archivo histórico
+
+    def archivar_trabajos(self, meses_vivos=MESES_VIVOS, hoy=None):
+        """Pasa al archivo histórico los trabajos con entrega en meses cerrados
+
+        Quedan en el libro los meses_vivos meses más recientes (contando el
+        actual) y los trabajos sin fecha válida. Se archiva un mes por vez con
+        el archivo bloqueado, como en una compactación: entre un mes y otro las
+        demás estaciones siguen trabajando. Si se corta, volver a llamarla
+        termina lo que quedó pendiente. Retorna [(mes, trabajos archivados)].
+        """
+        corte = primer_dia_vivo(hoy, meses_vivos)
+        archivados = []
+        while True:
+            with self._candado:
+                if self._profundidad > 0:
+                    raise ValueError("No se puede archivar durante una transacción")
+                with self._bloqueo:
+                    self._actualizar()
+                    self._reanudar_archivado()
+                    anterior = min((ordinal for ordinal in self._columnas.ordinales if ordinal != SIN_FECHA),
+                                   default=corte)
+                    if anterior >= corte:
+                        return archivados
+                    mes = mes_de(anterior)
+                    archivados.append((mes, self._archivar_mes(mes)))
+
+    def _reanudar_archivado(self):
+        """Termina o descarta el archivado de un mes que quedó a medias"""
+        plan = self.historico.en_curso()
+        if plan is None:
+            return
+        if self._leer_control(FILA_ARCHIVADO) == plan["id"]:
+            # El libro ya se guardó sin esas filas: solo falta anotarlas en el manifiesto
+            self.historico.confirmar(plan)
+        else:
+            # El libro todavía las tiene: el mes se vuelve a archivar desde el principio
+            self.historico.descartar(plan)
+
+    def _archivar_mes(self, mes):
+        """Mueve los trabajos de un mes al histórico y guarda el libro sin ellos"""
+        inicio, fin = rango_mes(mes)
+        ws = self._wb[HOJA_TRABAJOS]
+        columnas = self._columnas
+        ultima_columna = max(_ultima_columna(ws, 2), COLUMNAS_TRABAJOS)
+        movidas = []
+        quedan = []
+        for posicion, ordinal in enumerate(columnas.ordinales):
+            (movidas if inicio <= ordinal < fin else quedan).append(posicion)
+
+        # Las columnas después de las de Trabajos viajan con su fila
+        filas = [columnas.fila_completa(posicion) + tuple(ws.cell(posicion + 2, columna).value
+                                                          for columna in range(COLUMNAS_TRABAJOS + 1, ultima_columna + 1))
+                 for posicion in movidas]
+        identificador = f"{mes}/{time.time_ns()}"
+        plan = self.historico.preparar(identificador, mes, filas)
+        try:
+            _reordenar_filas(ws, {posicion + 2: nueva + 2 for nueva, posicion in enumerate(quedan)}, 2)
+            self._columnas = ColumnasTrabajos(columnas.fila_completa(posicion) for posicion in quedan)
+            self._olvidar_indices_trabajos()
+            # El libro anota qué archivado contiene, en el mismo guardado que quita las filas
+            self._fijar_control(FILA_ARCHIVADO, "Último archivado", identificador)
+            self._guardar_compactado()
+        except BaseException:
+            # La copia en memoria quedó a medias: se vuelve a leer del disco
+            self.invalidar()
+            raise
+        self.historico.confirmar(plan)
+        return len(filas)
+
+    def productos_duplicados(self):
+        """Retorna {producto: [filas]} de los productos que aparecen más de una vez"""
+        with self._candado:
+            self._indice_productos()
+            return {nombre: list(filas) for nombre, filas in self._duplicados.items()}
+
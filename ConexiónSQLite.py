@@ -0,0 +1,492 @@
+import os
+import sqlite3
+import threading
+from contextlib import contextmanager
+
+from ConexiónExcel import ESCRITORIO, StockInsuficiente, normalizar
+from Índices import (CATEGORIA_OTROS, CATEGORIAS_PRODUCTOS, IndiceNgramas, ordinal_fecha, plegar,
+                     resumir_totales)
+
+ARCHIVO_SQLITE = os.path.join(ESCRITORIO, "base_datos.sqlite3")
+
+# Filas que se leen de la base por cada bloque al recorrer una tabla
+FILAS_POR_BLOQUE = 500
+
+ESQUEMA = """
+CREATE TABLE IF NOT EXISTS Inventario (
+    id INTEGER PRIMARY KEY,
+    producto TEXT NOT NULL,
+    cantidad NUMERIC NOT NULL DEFAULT 0
+);
+CREATE UNIQUE INDEX IF NOT EXISTS idx_inventario_producto ON Inventario(producto);
+
+CREATE TABLE IF NOT EXISTS Trabajos (
+    id INTEGER PRIMARY KEY,
+    cliente TEXT NOT NULL,
+    trabajo TEXT NOT NULL,
+    fecha_entrega TEXT NOT NULL,
+    fecha_ordinal INTEGER,
+    cliente_clave TEXT,
+    cantidad NUMERIC,
+    pieza TEXT
+);
+CREATE INDEX IF NOT EXISTS idx_trabajos_cliente ON Trabajos(cliente);
+CREATE INDEX IF NOT EXISTS idx_trabajos_fecha_entrega ON Trabajos(fecha_entrega);
+"""
+
+# Columnas de Trabajos calculadas a partir de otra al guardar cada trabajo:
+# nombre -> (tipo, columna de origen, función, índice). fecha_ordinal (día de
+# date.toordinal) permite filtrar por fecha de entrega y cliente_clave (nombre
+# plegado) buscar clientes por prefijo. Los índices se crean aparte porque las
+# bases anteriores no tienen las columnas.
+COLUMNAS_DERIVADAS = {
+    "fecha_ordinal": ("INTEGER", "fecha_entrega", ordinal_fecha,
+                      "CREATE INDEX IF NOT EXISTS idx_trabajos_fecha_ordinal ON Trabajos(fecha_ordinal, id)"),
+    "cliente_clave": ("TEXT", "cliente", plegar,
+                      "CREATE INDEX IF NOT EXISTS idx_trabajos_cliente_clave ON Trabajos(cliente_clave, id)"),
+}
+
+# Cantidad y pieza que consumió cada trabajo (NULL en los trabajos anteriores a guardarlas)
+COLUMNAS_CONSUMO = {"cantidad": "NUMERIC", "pieza": "TEXT"}
+
+# Totales del Inventario por categoría, mantenidos por triggers con la
+# diferencia de cada cambio: mostrar el almacén no recorre la tabla. Los
+# productos que no están en Categorias van a la categoría "otros".
+CATEGORIA_DE = f"COALESCE((SELECT categoria FROM Categorias WHERE producto = {{fila}}.producto), '{CATEGORIA_OTROS}')"
+ESQUEMA_TOTALES = (
+    """CREATE TABLE Categorias (
+    producto TEXT PRIMARY KEY,
+    categoria TEXT NOT NULL
+)""",
+    """CREATE TABLE Totales (
+    categoria TEXT PRIMARY KEY,
+    productos INTEGER NOT NULL DEFAULT 0,
+    unidades NUMERIC NOT NULL DEFAULT 0
+)""",
+    f"""CREATE TRIGGER totales_agregar AFTER INSERT ON Inventario BEGIN
+    INSERT OR IGNORE INTO Totales (categoria) VALUES ({CATEGORIA_DE.format(fila="NEW")});
+    UPDATE Totales SET productos = productos + 1, unidades = unidades + NEW.cantidad
+        WHERE categoria = {CATEGORIA_DE.format(fila="NEW")};
+END""",
+    f"""CREATE TRIGGER totales_cambiar AFTER UPDATE OF producto, cantidad ON Inventario BEGIN
+    UPDATE Totales SET productos = productos - 1, unidades = unidades - OLD.cantidad
+        WHERE categoria = {CATEGORIA_DE.format(fila="OLD")};
+    INSERT OR IGNORE INTO Totales (categoria) VALUES ({CATEGORIA_DE.format(fila="NEW")});
+    UPDATE Totales SET productos = productos + 1, unidades = unidades + NEW.cantidad
+        WHERE categoria = {CATEGORIA_DE.format(fila="NEW")};
+END""",
+    f"""CREATE TRIGGER totales_borrar AFTER DELETE ON Inventario BEGIN
+    UPDATE Totales SET productos = productos - 1, unidades = unidades - OLD.cantidad
+        WHERE categoria = {CATEGORIA_DE.format(fila="OLD")};
+END""",
+)
+
+RECUENTO_TOTALES = f"""
+SELECT COALESCE(Categorias.categoria, '{CATEGORIA_OTROS}'), COUNT(*), SUM(Inventario.cantidad)
+FROM Inventario LEFT JOIN Categorias ON Categorias.producto = Inventario.producto
+GROUP BY 1
+"""
+
+
+class ConexionSQLite:
+    """Almacenamiento en SQLite con la misma interfaz que ConexionExcel"""
+
+    def __init__(self, archivo=ARCHIVO_SQLITE):
+        self.archivo = archivo
+        self._candado = threading.RLock()
+        self._bd = None
+        self._profundidad = 0
+        # Productos cambiados por la transacción en curso y quién recibe sus cantidades al confirmarla
+        self._tocados = set()
+        self._observadores_stock = []
+        # Índice de n-gramas de los productos y el último id de Inventario que contiene
+        self._ngramas = None
+        self._ultimo_producto = None
+
+    def _base(self):
+        """Retorna la conexión a la base, abriéndola y creando las tablas la primera vez"""
+        with self._candado:
+            if self._bd is None:
+                # isolation_level=None: las transacciones se controlan a mano con BEGIN/SAVEPOINT
+                self._bd = sqlite3.connect(self.archivo, isolation_level=None,
+                                           check_same_thread=False, timeout=30)
+                self._bd.execute("PRAGMA journal_mode=WAL")
+                self._bd.executescript(ESQUEMA)
+                self._migrar_columnas_derivadas()
+                self._agregar_columnas_consumo()
+                self._crear_totales()
+            return self._bd
+
+    def _columnas_trabajos(self):
+        return {fila[1] for fila in self._bd.execute("PRAGMA table_info(Trabajos)")}
+
+    def _columnas_faltantes(self):
+        columnas = self._columnas_trabajos()
+        return [nombre for nombre in COLUMNAS_DERIVADAS if nombre not in columnas]
+
+    def _migrar_columnas_derivadas(self):
+        """Agrega a una base anterior las columnas derivadas de Trabajos, calculándolas una sola vez"""
+        if self._columnas_faltantes():
+            self._bd.execute("BEGIN IMMEDIATE")
+            try:
+                # Otra estación pudo migrar la base mientras se esperaba el bloqueo
+                for nombre in self._columnas_faltantes():
+                    tipo, origen, funcion, _ = COLUMNAS_DERIVADAS[nombre]
+                    self._bd.execute(f"ALTER TABLE Trabajos ADD COLUMN {nombre} {tipo}")
+                    filas = self._bd.execute(f"SELECT id, {origen} FROM Trabajos").fetchall()
+                    self._bd.executemany(f"UPDATE Trabajos SET {nombre} = ? WHERE id = ?",
+                                         [(funcion(valor), id_) for id_, valor in filas])
+                self._bd.execute("COMMIT")
+            except BaseException:
+                self._bd.execute("ROLLBACK")
+                raise
+        for _, _, _, indice in COLUMNAS_DERIVADAS.values():
+            self._bd.execute(indice)
+
+    def _agregar_columnas_consumo(self):
+        """Agrega a una base anterior las columnas de cantidad y pieza de Trabajos"""
+        if set(COLUMNAS_CONSUMO) <= self._columnas_trabajos():
+            return
+        self._bd.execute("BEGIN IMMEDIATE")
+        try:
+            # Otra estación pudo agregarlas mientras se esperaba el bloqueo
+            for nombre, tipo in COLUMNAS_CONSUMO.items():
+                if nombre not in self._columnas_trabajos():
+                    self._bd.execute(f"ALTER TABLE Trabajos ADD COLUMN {nombre} {tipo}")
+            self._bd.execute("COMMIT")
+        except BaseException:
+            self._bd.execute("ROLLBACK")
+            raise
+
+    def _hay_totales(self):
+        return self._bd.execute(
+            "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'Totales'").fetchone() is not None
+
+    def _crear_totales(self):
+        """Crea las tablas y triggers de los totales del Inventario y los calcula una sola vez"""
+        if self._hay_totales():
+            return
+        self._bd.execute("BEGIN IMMEDIATE")
+        try:
+            # Otra estación pudo crearlos mientras se esperaba el bloqueo
+            if not self._hay_totales():
+                # Sentencia por sentencia: executescript confirmaría la transacción
+                for sentencia in ESQUEMA_TOTALES:
+                    self._bd.execute(sentencia)
+                self._bd.executemany("INSERT INTO Categorias (producto, categoria) VALUES (?, ?)",
+                                     CATEGORIAS_PRODUCTOS.items())
+                self._bd.execute(f"INSERT INTO Totales (categoria, productos, unidades) {RECUENTO_TOTALES}")
+            self._bd.execute("COMMIT")
+        except BaseException:
+            self._bd.execute("ROLLBACK")
+            raise
+
+    @property
+    def hay_cambios_pendientes(self):
+        # Cada transacción confirmada ya está en disco
+        return False
+
+    def inicializar(self):
+        """Crea la base de datos y las tablas si no existen"""
+        existia = os.path.exists(self.archivo)
+        self._base()
+        if existia:
+            print(f"Base de datos ya existe en: {self.archivo}")
+        else:
+            print(f"Base de datos creada exitosamente en: {self.archivo}")
+
+    # Escrituras
+
+    @contextmanager
+    def transaccion(self):
+        """Agrupa varios cambios para que se guarden juntos o no se guarde ninguno"""
+        with self._candado:
+            bd = self._base()
+            if self._profundidad == 0:
+                # IMMEDIATE reserva la escritura desde el inicio: las lecturas
+                # de la transacción ven el stock que luego se descuenta
+                bd.execute("BEGIN IMMEDIATE")
+                punto = None
+            else:
+                punto = f"punto_{self._profundidad}"
+                bd.execute(f"SAVEPOINT {punto}")
+            self._profundidad += 1
+            try:
+                yield self
+            except BaseException:
+                self._profundidad -= 1
+                if punto:
+                    bd.execute(f"ROLLBACK TO {punto}")
+                    bd.execute(f"RELEASE {punto}")
+                else:
+                    bd.execute("ROLLBACK")
+                    self._tocados = set()
+                raise
+            self._profundidad -= 1
+            bd.execute(f"RELEASE {punto}" if punto else "COMMIT")
+            if not punto and self._tocados:
+                tocados, self._tocados = self._tocados, set()
+                self._avisar_stock(tocados)
+
+    def observar_stock(self, funcion):
+        """funcion({producto: cantidad}) se llama después de cada transacción que cambia el stock"""
+        self._observadores_stock.append(funcion)
+
+    def _tocar(self, nombre):
+        if self._observadores_stock:
+            self._tocados.add(nombre)
+
+    def _avisar_stock(self, tocados):
+        # Se leen las cantidades confirmadas: un SAVEPOINT deshecho pudo devolver alguna a su valor anterior
+        marcas = ", ".join("?" * len(tocados))
+        cantidades = dict(self._bd.execute(
+            f"SELECT producto, cantidad FROM Inventario WHERE producto IN ({marcas})", tuple(tocados)))
+        for funcion in list(self._observadores_stock):
+            try:
+                funcion(cantidades)
+            except Exception as e:
+                print(f"Error al revisar el stock: {e}")
+
+    def fijar_cantidad(self, producto, cantidad):
+        """Cambia la cantidad en stock de un producto que ya está en el Inventario"""
+        with self.transaccion():
+            nombre = normalizar(producto)
+            cursor = self._bd.execute(
+                "UPDATE Inventario SET cantidad = ? WHERE producto = ?", (cantidad, nombre))
+            if cursor.rowcount == 0:
+                raise ValueError(f"El producto {nombre} no se encuentra en el inventario")
+            self._tocar(nombre)
+
+    def sumar_cantidad(self, producto, delta):
+        """Suma delta (negativo para descontar) al stock de un producto y retorna la nueva cantidad"""
+        with self.transaccion():
+            nombre = normalizar(producto)
+            # La lectura y la escritura quedan dentro de BEGIN IMMEDIATE: otra
+            # estación no puede descontar el mismo stock entre medio
+            fila = self._bd.execute("SELECT cantidad FROM Inventario WHERE producto = ?", (nombre,)).fetchone()
+            if fila is None:
+                if delta < 0:
+                    raise ValueError(f"El producto {nombre} no se encuentra en el inventario")
+                self.agregar_producto(nombre, delta)
+                return delta
+            if delta < 0 and fila[0] + delta < 0:
+                raise StockInsuficiente(nombre, fila[0], -delta)
+            self._bd.execute("UPDATE Inventario SET cantidad = ? WHERE producto = ?", (fila[0] + delta, nombre))
+            self._tocar(nombre)
+            return fila[0] + delta
+
+    def agregar_producto(self, producto, cantidad):
+        """Agrega un producto nuevo al Inventario"""
+        with self.transaccion():
+            nombre = normalizar(producto)
+            try:
+                self._bd.execute(
+                    "INSERT INTO Inventario (producto, cantidad) VALUES (?, ?)", (nombre, cantidad))
+            except sqlite3.IntegrityError:
+                raise ValueError(f"El producto {nombre} ya está en el inventario")
+            self._tocar(nombre)
+
+    def agregar_trabajo(self, cliente, trabajo, fecha, cantidad=None, pieza=None):
+        """Agrega un trabajo a la tabla de Trabajos con la cantidad y la pieza que consume"""
+        with self.transaccion():
+            self._bd.execute(
+                "INSERT INTO Trabajos (cliente, trabajo, fecha_entrega, fecha_ordinal, cliente_clave, cantidad, pieza) "
+                "VALUES (?, ?, ?, ?, ?, ?, ?)",
+                (cliente, trabajo, fecha, ordinal_fecha(fecha), plegar(cliente), cantidad, pieza))
+
+    def flush(self):
+        """Vuelca el registro WAL de SQLite en el archivo principal de la base"""
+        with self._candado:
+            if self._bd is not None and self._profundidad == 0:
+                self._bd.execute("PRAGMA wal_checkpoint(PASSIVE)")
+
+    compactar = flush
+
+    def invalidar(self):
+        """Cierra la base y olvida lo leído: la próxima consulta la vuelve a abrir"""
+        with self._candado:
+            if self._bd is not None and self._profundidad == 0:
+                self._bd.close()
+                self._bd = None
+                self._ngramas = None
+                self._ultimo_producto = None
+
+    def cerrar(self):
+        """Cierra la base de datos"""
+        with self._candado:
+            if self._bd is not None and self._profundidad == 0:
+                try:
+                    self.flush()
+                    self._bd.close()
+                except Exception as e:
+                    print(f"Error al cerrar la base de datos: {e}")
+                self._bd = None
+
+    # Lecturas
+
+    def buscar_producto(self, producto):
+        """Retorna (id, cantidad) del producto en el Inventario, o None si no existe"""
+        with self._candado:
+            return self._base().execute(
+                "SELECT id, cantidad FROM Inventario WHERE producto = ?",
+                (normalizar(producto),)).fetchone()
+
+    def obtener_cantidad(self, producto):
+        """Retorna la cantidad en stock de un producto, o None si no está en el inventario"""
+        encontrado = self.buscar_producto(producto)
+        return encontrado[1] if encontrado else None
+
+    def buscar_parecidos(self, producto, cantidad=5):
+        """Retorna hasta cantidad tuplas (producto, stock, similitud) con los nombres más parecidos"""
+        with self._candado:
+            bd = self._base()
+            # Los productos nunca se borran: si el último id no cambió, el índice está al día
+            ultimo = bd.execute("SELECT MAX(id) FROM Inventario").fetchone()[0]
+            if self._ngramas is None or ultimo != self._ultimo_producto:
+                nombres = [fila[0] for fila in bd.execute("SELECT producto FROM Inventario ORDER BY id")]
+                self._ngramas = IndiceNgramas(nombres)
+                self._ultimo_producto = ultimo
+            parecidos = self._ngramas.buscar(producto, cantidad)
+            stock = dict(bd.execute(
+                f"SELECT producto, cantidad FROM Inventario WHERE producto IN ({', '.join('?' * len(parecidos))})",
+                [nombre for nombre, _ in parecidos]).fetchall()) if parecidos else {}
+            return [(nombre, stock.get(nombre), similitud) for nombre, similitud in parecidos]
+
+    def totales_inventario(self):
+        """Retorna los productos distintos y las unidades del Inventario, en total y por categoría"""
+        with self._candado:
+            return resumir_totales({categoria: (productos, unidades) for categoria, productos, unidades
+                                    in self._base().execute("SELECT * FROM Totales")})
+
+    def verificar_totales(self):
+        """Recuenta el Inventario y lo compara con los totales mantenidos
+
+        Retorna (coinciden, mantenidos, recontados); si no coinciden, los
+        totales pasan a ser los del recuento.
+        """
+        with self.transaccion():
+            mantenidos = self.totales_inventario()
+            recuento = self._bd.execute(RECUENTO_TOTALES).fetchall()
+            recontados = resumir_totales({categoria: (productos, unidades)
+                                          for categoria, productos, unidades in recuento})
+            if recontados != mantenidos:
+                self._bd.execute("DELETE FROM Totales")
+                self._bd.executemany("INSERT INTO Totales (categoria, productos, unidades) VALUES (?, ?, ?)",
+                                     recuento)
+            return recontados == mantenidos, mantenidos, recontados
+
+    def iterar_trabajos_archivados(self):
+        """SQLite no archiva trabajos: no hay filas archivadas"""
+        return iter(())
+
+    def archivar_trabajos(self, meses_vivos=None, hoy=None):
+        """SQLite lee solo las filas que consulta: la tabla no necesita partirse por mes"""
+        return []
+
+    def productos_duplicados(self):
+        """El índice único sobre Inventario(producto) impide productos repetidos"""
+        return {}
+
+    def leer_inventario(self):
+        """Retorna las filas (producto, cantidad) del Inventario"""
+        return tuple(self.iterar_inventario())
+
+    def leer_trabajos(self):
+        """Retorna las filas (cliente, trabajo, fecha) de los Trabajos"""
+        return tuple(self.iterar_trabajos())
+
+    def _iterar_consulta(self, consulta):
+        """Recorre el resultado de una consulta por bloques, sin retener la conexión entre bloques"""
+        ultimo_id = 0
+        while True:
+            with self._candado:
+                filas = self._base().execute(consulta, (ultimo_id, FILAS_POR_BLOQUE)).fetchall()
+            if not filas:
+                return
+            for fila in filas:
+                yield fila[1:]
+            ultimo_id = filas[-1][0]
+
+    def iterar_inventario(self):
+        """Genera las filas (producto, cantidad) del Inventario con memoria acotada"""
+        return self._iterar_consulta(
+            "SELECT id, producto, cantidad FROM Inventario WHERE id > ? ORDER BY id LIMIT ?")
+
+    def iterar_trabajos(self, completas=False):
+        """Genera las filas (cliente, trabajo, fecha) de los Trabajos con memoria acotada
+
+        Con completas=True las filas llevan también la cantidad y la pieza.
+        """
+        columnas = "cliente, trabajo, fecha_entrega" + (", cantidad, pieza" if completas else "")
+        return self._iterar_consulta(
+            f"SELECT id, {columnas} FROM Trabajos WHERE id > ? ORDER BY id LIMIT ?")
+
+    def contar_inventario(self):
+        """Retorna la cantidad de filas del Inventario sin leerlas"""
+        with self._candado:
+            return self._base().execute("SELECT COUNT(*) FROM Inventario").fetchone()[0]
+
+    def contar_trabajos(self):
+        """Retorna la cantidad de filas de Trabajos sin leerlas"""
+        with self._candado:
+            return self._base().execute("SELECT COUNT(*) FROM Trabajos").fetchone()[0]
+
+    def leer_pagina_inventario(self, inicio, cantidad):
+        """Retorna hasta cantidad filas (producto, cantidad) del Inventario desde la fila inicio"""
+        with self._candado:
+            return tuple(self._base().execute(
+                "SELECT producto, cantidad FROM Inventario ORDER BY id LIMIT ? OFFSET ?",
+                (cantidad, inicio)).fetchall())
+
+    def leer_pagina_trabajos(self, inicio, cantidad):
+        """Retorna hasta cantidad filas (cliente, trabajo, fecha) de Trabajos desde la fila inicio"""
+        with self._candado:
+            return tuple(self._base().execute(
+                "SELECT cliente, trabajo, fecha_entrega FROM Trabajos ORDER BY id LIMIT ? OFFSET ?",
+                (cantidad, inicio)).fetchall())
+
+    def _consultar_trabajos(self, condicion, parametros):
+        with self._candado:
+            return tuple(self._base().execute(
+                "SELECT cliente, trabajo, fecha_entrega FROM Trabajos WHERE " + condicion,
+                parametros).fetchall())
+
+    def trabajos_entre(self, desde, hasta):
+        """Retorna los trabajos (cliente, trabajo, fecha) con entrega entre desde y hasta, ordenados por fecha"""
+        return self._consultar_trabajos(
+            "fecha_ordinal BETWEEN ? AND ? ORDER BY fecha_ordinal, id",
+            (ordinal_fecha(desde), ordinal_fecha(hasta)))
+
+    def consumos_entre(self, desde, hasta):
+        """Retorna (trabajo, fecha, cantidad, pieza) de los trabajos con entrega entre desde y hasta"""
+        with self._candado:
+            return tuple(self._base().execute(
+                "SELECT trabajo, fecha_entrega, cantidad, pieza FROM Trabajos "
+                "WHERE fecha_ordinal BETWEEN ? AND ? ORDER BY fecha_ordinal, id",
+                (ordinal_fecha(desde), ordinal_fecha(hasta))).fetchall())
+
+    def trabajos_vencidos(self, hoy):
+        """Retorna los trabajos con entrega anterior a hoy, ordenados por fecha"""
+        return self._consultar_trabajos("fecha_ordinal < ? ORDER BY fecha_ordinal, id", (ordinal_fecha(hoy),))
+
+    def proximas_entregas(self, desde, cantidad):
+        """Retorna los primeros cantidad trabajos con entrega a partir de desde"""
+        return self._consultar_trabajos(
+            "fecha_ordinal >= ? ORDER BY fecha_ordinal, id LIMIT ?", (ordinal_fecha(desde), cantidad))
+
+    def sugerir_clientes(self, prefijo, cantidad=10):
+        """Retorna hasta cantidad nombres de clientes registrados que empiezan con el prefijo"""
+        prefijo = plegar(prefijo)
+        with self._candado:
+            # El nombre que se muestra es el del último trabajo de cada cliente
+            filas = self._base().execute(
+                "SELECT cliente_clave, MAX(id) FROM Trabajos "
+                "WHERE cliente_clave >= ? AND cliente_clave < ? AND cliente_clave <> '' "
+                "GROUP BY cliente_clave ORDER BY cliente_clave LIMIT ?",
+                (prefijo, prefijo + "\U0010ffff", cantidad)).fetchall()
+            return [self._bd.execute("SELECT TRIM(cliente) FROM Trabajos WHERE id = ?", (id_,)).fetchone()[0]
+                    for _, id_ in filas]
+
+    def trabajos_de_cliente(self, cliente):
+        """Retorna los trabajos (cliente, trabajo, fecha) de un cliente"""
+        return self._consultar_trabajos("cliente_clave = ? ORDER BY id", (plegar(cliente),))
@@ -0,0 +1,325 @@
+"""Archivo histórico de Trabajos, un archivo .xlsx por mes de entrega
+
+Los trabajos con entrega en meses ya cerrados salen del libro en uso y pasan
+a la carpeta base_datos_historico, junto al archivo de datos:
+
+    base_datos_historico/
+        manifiesto.json             meses archivados, cantidad de trabajos y clientes de cada uno
+        trabajos_2025-01.xlsx       una hoja Trabajos con el mismo formato que el libro
+
+Las consultas del historial miran primero el manifiesto y solo abren los
+meses que necesitan. El manifiesto también anota el mes que se está
+archivando: si el programa se corta a medias, la siguiente vez se termina
+o se rehace ese mes sin perder ni repetir trabajos (ver
+ConexionExcel.archivar_trabajos). Para archivar desde la consola:
+
+    python Histórico.py [--meses-vivos 3]
+"""
+import argparse
+import heapq
+import json
+import os
+from datetime import date
+
+from Índices import SIN_FECHA, ordinal_fecha, plegar
+
+EXTENSION_HISTORICO = "_historico"
+MANIFIESTO = "manifiesto.json"
+ENCABEZADO_TRABAJOS = ["Cliente", "Trabajo_Pendiente", "Fecha_Entrega", "Cantidad", "Pieza"]
+
+# Meses que quedan en el libro en uso: el actual y los anteriores hasta completar esta cantidad
+MESES_VIVOS = 3
+
+
+def mes_de(ordinal):
+    """Retorna el mes "yyyy-mm" de un número de día"""
+    dia = date.fromordinal(ordinal)
+    return f"{dia.year:04d}-{dia.month:02d}"
+
+
+def rango_mes(mes):
+    """Retorna (primer día, primer día del mes siguiente) de un mes "yyyy-mm" como números de día"""
+    anio, numero = (int(parte) for parte in mes.split("-"))
+    siguiente = date(anio + numero // 12, numero % 12 + 1, 1)
+    return date(anio, numero, 1).toordinal(), siguiente.toordinal()
+
+
+def primer_dia_vivo(hoy=None, meses_vivos=MESES_VIVOS):
+    """Retorna el número de día desde el que los trabajos se quedan en el libro en uso"""
+    hoy = hoy or date.today()
+    indice_mes = hoy.year * 12 + hoy.month - 1 - (max(meses_vivos, 1) - 1)
+    return date(indice_mes // 12, indice_mes % 12 + 1, 1).toordinal()
+
+
+def _escribir_json(ruta, datos):
+    """Reemplaza un archivo JSON de una sola vez, esperando a que llegue al disco"""
+    temporal = ruta + ".tmp"
+    with open(temporal, "w", encoding="utf-8") as archivo:
+        json.dump(datos, archivo, ensure_ascii=False, indent=1)
+        archivo.flush()
+        os.fsync(archivo.fileno())
+    os.replace(temporal, ruta)
+
+
+class HistoricoTrabajos:
+    """Carpeta de meses archivados con su manifiesto"""
+
+    def __init__(self, carpeta):
+        self.carpeta = carpeta
+        self._manifiesto = None
+        self._firma = None
+
+    def _ruta(self, nombre):
+        return os.path.join(self.carpeta, nombre)
+
+    def manifiesto(self):
+        """Retorna el manifiesto, releyéndolo solo si cambió en disco"""
+        ruta = self._ruta(MANIFIESTO)
+        try:
+            estado = os.stat(ruta)
+            firma = (estado.st_mtime_ns, estado.st_size)
+        except FileNotFoundError:
+            firma = None
+        if self._manifiesto is None or firma != self._firma:
+            if firma is None:
+                self._manifiesto = {"particiones": {}, "en_curso": None}
+            else:
+                with open(ruta, encoding="utf-8") as archivo:
+                    self._manifiesto = json.load(archivo)
+            self._firma = firma
+        return self._manifiesto
+
+    def _guardar_manifiesto(self, manifiesto):
+        os.makedirs(self.carpeta, exist_ok=True)
+        _escribir_json(self._ruta(MANIFIESTO), manifiesto)
+        self._manifiesto = None
+
+    def meses(self):
+        """Retorna los meses archivados en orden"""
+        return sorted(self.manifiesto()["particiones"])
+
+    def en_curso(self):
+        """Retorna el archivado que quedó a medias, o None"""
+        return self.manifiesto()["en_curso"]
+
+    def contar(self):
+        """Retorna la cantidad de trabajos archivados"""
+        return sum(particion["trabajos"] for particion in self.manifiesto()["particiones"].values())
+
+    # Lectura
+
+    def leer_mes(self, mes):
+        """Genera las filas archivadas de un mes con el libro en modo de solo lectura"""
+        particion = self.manifiesto()["particiones"].get(mes)
+        if not particion:
+            return
+        yield from self._leer_archivo(particion["archivo"], particion["trabajos"])
+
+    def _leer_archivo(self, nombre, cantidad, inicio=0, maximo=None):
+        # Se leen solo las filas anotadas en el manifiesto: si un archivado se
+        # cortó, el archivo puede tener filas de más que todavía están en el libro
+        ultima = cantidad if maximo is None else min(cantidad, inicio + maximo)
+        if ultima <= inicio:
+            return
+        from openpyxl import load_workbook
+
+        wb = load_workbook(self._ruta(nombre), read_only=True)
+        try:
+            for fila in wb["Trabajos"].iter_rows(min_row=inicio + 2, max_row=ultima + 1, values_only=True):
+                yield tuple(fila) + (None,) * (len(ENCABEZADO_TRABAJOS) - len(fila))
+        finally:
+            wb.close()
+
+    def leer_pagina(self, inicio, cantidad):
+        """Retorna hasta cantidad filas archivadas desde la posición inicio (contando desde el mes más antiguo)
+
+        Con las cantidades del manifiesto solo se abren los meses que tocan la página.
+        """
+        filas = []
+        desde = 0
+        for mes in self.meses():
+            particion = self.manifiesto()["particiones"][mes]
+            if len(filas) < cantidad and inicio < desde + particion["trabajos"]:
+                filas.extend(fila[:3] for fila in self._leer_archivo(
+                    particion["archivo"], particion["trabajos"], max(inicio - desde, 0), cantidad - len(filas)))
+            desde += particion["trabajos"]
+        return filas
+
+    def iterar(self, completas=False):
+        """Genera todas las filas archivadas, del mes más antiguo al más reciente
+
+        Con completas=True las filas llevan también la cantidad y la pieza.
+        """
+        columnas = len(ENCABEZADO_TRABAJOS) if completas else 3
+        for mes in self.meses():
+            for fila in self.leer_mes(mes):
+                yield fila[:columnas]
+
+    def _filas_entre(self, desde, hasta):
+        inicio, fin = ordinal_fecha(desde), ordinal_fecha(hasta)
+        for mes in self.meses():
+            if mes_de(inicio) <= mes <= mes_de(fin):
+                for fila in self.leer_mes(mes):
+                    if inicio <= (ordinal_fecha(fila[2]) or SIN_FECHA) <= fin:
+                        yield fila
+
+    def trabajos_entre(self, desde, hasta):
+        """Trabajos archivados con entrega entre desde y hasta (inclusive); solo abre los meses del rango"""
+        return [fila[:3] for fila in self._filas_entre(desde, hasta)]
+
+    def consumos_entre(self, desde, hasta):
+        """(trabajo, fecha, cantidad, pieza) de los trabajos archivados con entrega entre desde y hasta"""
+        return [fila[1:5] for fila in self._filas_entre(desde, hasta)]
+
+    def contar_entre(self, desde, hasta):
+        """Cuenta los trabajos archivados con entrega entre desde y hasta
+
+        Los meses completos dentro del rango se cuentan con el manifiesto; solo
+        se abren los meses del borde.
+        """
+        inicio, fin = ordinal_fecha(desde), ordinal_fecha(hasta)
+        total = 0
+        for mes in self.meses():
+            primero, siguiente = rango_mes(mes)
+            if siguiente <= inicio or primero > fin:
+                continue
+            if inicio <= primero and siguiente - 1 <= fin:
+                total += self.manifiesto()["particiones"][mes]["trabajos"]
+            else:
+                total += sum(1 for fila in self.leer_mes(mes) if inicio <= (ordinal_fecha(fila[2]) or SIN_FECHA) <= fin)
+        return total
+
+    def iterar_entre(self, desde, hasta):
+        """Genera los trabajos archivados con entrega entre desde y hasta, ordenados por fecha, abriendo un mes a la vez"""
+        mes_actual = None
+        filas = []
+        for fila in self._filas_entre(desde, hasta):
+            mes = mes_de(ordinal_fecha(fila[2]))
+            if mes != mes_actual:
+                yield from sorted(filas, key=lambda fila: ordinal_fecha(fila[2]))
+                mes_actual, filas = mes, []
+            filas.append(fila[:3])
+        yield from sorted(filas, key=lambda fila: ordinal_fecha(fila[2]))
+
+    def trabajos_de_cliente(self, cliente):
+        """Trabajos archivados de un cliente; solo abre los meses donde el manifiesto lo anota"""
+        clave = plegar(cliente)
+        filas = []
+        for mes in self.meses():
+            if clave in self.manifiesto()["particiones"][mes]["clientes"]:
+                filas.extend(fila[:3] for fila in self.leer_mes(mes)
+                             if fila[0] and plegar(fila[0]) == clave)
+        return filas
+
+    def con_vivos(self, desde, hasta, vivos):
+        """Une los trabajos archivados entre desde y hasta con vivos (ya ordenados); ver FilasConArchivados"""
+        if not any(mes_de(ordinal_fecha(desde)) <= mes <= mes_de(ordinal_fecha(hasta)) for mes in self.meses()):
+            return vivos
+        return FilasConArchivados(self, desde, hasta, vivos)
+
+    # Archivado de un mes
+
+    def preparar(self, identificador, mes, filas):
+        """Primer paso del archivado: anota el mes en curso y escribe su archivo con las filas nuevas
+
+        El archivo queda con las filas ya archivadas del mes más las nuevas;
+        mientras el manifiesto no se confirme, las lecturas ignoran las nuevas.
+        """
+        manifiesto = self.manifiesto()
+        anterior = manifiesto["particiones"].get(mes)
+        nombre = f"trabajos_{mes}.xlsx"
+        base = anterior["trabajos"] if anterior else 0
+        plan = {
+            "id": identificador,
+            "mes": mes,
+            "archivo": nombre,
+            "base": base,
+            "movidos": len(filas),
+            "clientes": sorted(set(anterior["clientes"] if anterior else ())
+                               | {plegar(fila[0]) for fila in filas if fila[0] and str(fila[0]).strip()}),
+        }
+        self._guardar_manifiesto(dict(manifiesto, en_curso=plan))
+        self._escribir_archivo(nombre, base, filas)
+        return plan
+
+    def _escribir_archivo(self, nombre, base, filas):
+        from openpyxl import Workbook
+
+        anteriores = list(self._leer_archivo(nombre, base)) if base else []
+        # Modo de solo escritura: las filas se vuelcan sin crear celdas en memoria
+        wb = Workbook(write_only=True)
+        ws = wb.create_sheet("Trabajos")
+        ws.append(ENCABEZADO_TRABAJOS)
+        for fila in anteriores:
+            ws.append(list(fila))
+        for fila in filas:
+            ws.append(list(fila))
+        ruta = self._ruta(nombre)
+        temporal = ruta + ".tmp"
+        try:
+            wb.save(temporal)
+            with open(temporal, "rb+") as archivo:
+                os.fsync(archivo.fileno())
+            os.replace(temporal, ruta)
+        finally:
+            if os.path.exists(temporal):
+                os.remove(temporal)
+
+    def confirmar(self, plan):
+        """Último paso del archivado: el mes pasa a tener también las filas nuevas"""
+        manifiesto = self.manifiesto()
+        particiones = dict(manifiesto["particiones"])
+        particiones[plan["mes"]] = {
+            "archivo": plan["archivo"],
+            "trabajos": plan["base"] + plan["movidos"],
+            "clientes": plan["clientes"],
+        }
+        self._guardar_manifiesto({"particiones": particiones, "en_curso": None})
+
+    def descartar(self, plan):
+        """Olvida un archivado que no llegó a quitar las filas del libro (se vuelve a hacer desde cero)"""
+        self._guardar_manifiesto(dict(self.manifiesto(), en_curso=None))
+
+
+class FilasConArchivados:
+    """Trabajos de un rango de fechas, archivados y del libro en uso, ordenados por fecha
+
+    La consulta no abre ningún mes archivado: len() sale del manifiesto y los
+    meses se leen de a uno mientras se recorren las filas. A igual fecha van
+    primero los archivados, que se registraron antes.
+    """
+
+    def __init__(self, historico, desde, hasta, vivos):
+        self._historico = historico
+        self._desde = desde
+        self._hasta = hasta
+        self._vivos = vivos
+        self._archivados = None
+
+    def __len__(self):
+        if self._archivados is None:
+            self._archivados = self._historico.contar_entre(self._desde, self._hasta)
+        return self._archivados + len(self._vivos)
+
+    def __iter__(self):
+        return heapq.merge(self._historico.iterar_entre(self._desde, self._hasta), self._vivos,
+                           key=lambda fila: ordinal_fecha(fila[2]))
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Pasa los trabajos de meses cerrados al archivo histórico")
+    parser.add_argument("--meses-vivos", type=int, default=MESES_VIVOS,
+                        help="meses que quedan en el archivo de datos, contando el actual")
+    argumentos = parser.parse_args()
+
+    from Almacenamiento import obtener_conexion
+
+    archivados = obtener_conexion().archivar_trabajos(argumentos.meses_vivos)
+    if not archivados:
+        print("No hay trabajos de meses cerrados para archivar")
+    for mes, cantidad in archivados:
+        print(f"{mes}: {cantidad} trabajos archivados")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,108 @@
+import csv
+import json
+import os
+
+from Almacenamiento import obtener_conexion
+
+COLUMNAS_REABASTECIMIENTO = ["producto", "cantidad"]
+
+# Separadores que se aceptan en los CSV (las hojas de cálculo en español suelen exportar con ";")
+SEPARADORES_CSV = ",;\t"
+
+
+def leer_filas(ruta, columnas):
+    """Genera (número de línea, fila) de un archivo CSV o JSONL
+
+    Cada fila es un diccionario con las columnas pedidas (en minúsculas); las
+    columnas que falten (o que en JSONL valgan null) quedan vacías. Una línea JSONL que no se puede leer
+    se entrega como (número de línea, None) para reportarla como rechazada.
+    """
+    extension = os.path.splitext(ruta)[1].lower()
+    if extension in (".jsonl", ".json"):
+        yield from _leer_jsonl(ruta, columnas)
+    elif extension in (".csv", ".txt"):
+        yield from _leer_csv(ruta, columnas)
+    else:
+        raise ValueError(f"Formato de archivo no soportado: {extension or ruta}. Use un archivo .csv o .jsonl")
+
+
+def _leer_csv(ruta, columnas):
+    # utf-8-sig: Excel agrega una marca BOM al guardar CSV en UTF-8
+    with open(ruta, newline="", encoding="utf-8-sig") as archivo:
+        muestra = archivo.read(4096)
+        archivo.seek(0)
+        try:
+            dialecto = csv.Sniffer().sniff(muestra, delimiters=SEPARADORES_CSV)
+        except csv.Error:
+            dialecto = csv.excel
+        lector = csv.reader(archivo, dialecto)
+
+        encabezado = next(lector, None)
+        if encabezado is None:
+            return
+        encabezado = [str(columna).lower().strip() for columna in encabezado]
+        faltantes = [columna for columna in columnas if columna not in encabezado]
+        if faltantes:
+            raise ValueError(f"Al archivo le faltan las columnas: {', '.join(faltantes)}")
+        posiciones = {columna: encabezado.index(columna) for columna in columnas}
+
+        for valores in lector:
+            if not any(valor.strip() for valor in valores):
+                continue
+            fila = {columna: (valores[i].strip() if i < len(valores) else "") for columna, i in posiciones.items()}
+            yield lector.line_num, fila
+
+
+def _leer_jsonl(ruta, columnas):
+    with open(ruta, encoding="utf-8-sig") as archivo:
+        for numero, linea in enumerate(archivo, 1):
+            if not linea.strip():
+                continue
+            try:
+                objeto = json.loads(linea)
+            except ValueError:
+                yield numero, None
+                continue
+            if not isinstance(objeto, dict):
+                yield numero, None
+                continue
+            objeto = {str(clave).lower().strip(): valor for clave, valor in objeto.items()}
+            # null es una columna sin valor, como una celda vacía del CSV (no el texto "None")
+            yield numero, {columna: "" if objeto.get(columna) is None else objeto[columna] for columna in columnas}
+
+
+def importar_reabastecimiento(ruta, productos_validos, conexion=None):
+    """Suma al Inventario las cantidades de un archivo de entrega de proveedor
+
+    Las líneas se agrupan por producto y se aplican en una sola transacción.
+    Retorna (reporte, cantidades): el reporte (línea, aceptado, detalle) de
+    cada fila y la nueva cantidad en stock de cada producto reabastecido.
+    """
+    reporte = []
+    totales = {}
+    for linea, fila in leer_filas(ruta, COLUMNAS_REABASTECIMIENTO):
+        if fila is None:
+            reporte.append((linea, False, "La línea no tiene un formato válido"))
+            continue
+        producto = str(fila["producto"]).lower().strip()
+        if producto not in productos_validos:
+            reporte.append((linea, False, f"El producto '{fila['producto']}' no es válido. Productos permitidos: {', '.join(productos_validos)}"))
+            continue
+        try:
+            cantidad = float(fila["cantidad"])
+        except (TypeError, ValueError):
+            reporte.append((linea, False, f"La cantidad '{fila['cantidad']}' debe ser un número válido"))
+            continue
+        if cantidad <= 0:
+            reporte.append((linea, False, "La cantidad debe ser mayor a cero"))
+            continue
+        totales[producto] = totales.get(producto, 0) + cantidad
+        reporte.append((linea, True, f"{producto}: +{cantidad}"))
+
+    # Un solo cambio por producto, todos en la misma transacción
+    conexion = conexion or obtener_conexion()
+    cantidades = {}
+    with conexion.transaccion():
+        for producto, cantidad in totales.items():
+            cantidades[producto] = conexion.sumar_cantidad(producto, cantidad)
+    return reporte, cantidades
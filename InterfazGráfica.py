@@ -1,43 +1,272 @@
 import tkinter as tk
-from tkinter import messagebox, ttk
-from datetime import datetime
-from openpyxl import load_workbook
+from tkinter import filedialog, messagebox, ttk
+from datetime import datetime, timedelta
 import os
+import queue
+import threading
 
-# Importar las clases del programa original
-# IMPORTANTE: Asegúrate de que este archivo esté en la misma carpeta que tu programa original
-# y que tu programa original se llame exactamente como lo importas aquí
+from Alertas import ALERTAS
+# Almacenamiento de datos (Excel o SQLite según la configuración, compartido con el programa original)
+from Almacenamiento import ConflictoConcurrencia, StockInsuficiente, exportar_excel, obtener_conexion, ruta_exportacion
+from Importación import importar_reabastecimiento
 
-# Configuración de archivos Excel (debe coincidir con tu programa original)
-ESCRITORIO = os.path.join(os.path.expanduser("~"), "Desktop")
-ARCHIVO_EXCEL = os.path.join(ESCRITORIO, "base_datos.xlsx")
-HOJA_INVENTARIO = "Inventario"
-HOJA_TRABAJOS = "Trabajos"
+# Las listas de productos y trabajos válidos son las de las clases del sistema
+from Clases import Inventario, Trabajo
+from Histórico import MESES_VIVOS
+from Materiales import LISTA_MATERIALES
+from Métricas import METRICAS, formatear_resumen, medido
+from Registro import DatosInvalidos, registrar, validar_cliente, validar_fecha, validar_trabajo
 
-# Lista de productos y trabajos válidos
-PRODUCTOS_VALIDOS = ["playera", "taza", "papel sublimado", "vidrio", "papel impresión", "vinil"]
-TRABAJOS_VALIDOS = ["corte eléctrico en vinil adhesivo", "sublimado"]
+PRODUCTOS_VALIDOS = Inventario.PRODUCTOS_VALIDOS
+TRABAJOS_VALIDOS = Trabajo.TRABAJOS_VALIDOS
+
+# Filas que se piden de más antes y después de la página visible de una tabla
+MARGEN_PRECARGA = 100
+
+# Milisegundos entre cada revisión de las respuestas del hilo de almacenamiento
+INTERVALO_RESPUESTAS = 30
+
+# Milisegundos entre cada revisión de las alertas de stock bajo que llegan del hilo de almacenamiento
+INTERVALO_ALERTAS = 500
+ALTO_VENTANA = 595
+ALTO_AVISO = 30
+
+
+class TrabajadorAlmacenamiento:
+    """Hilo que ejecuta en orden las operaciones sobre el archivo de datos
+
+    Tk no es seguro entre hilos: el hilo solo llama a la función encolada y
+    deja el resultado en una cola, que el mainloop revisa con root.after para
+    llamar a al_terminar o al_fallar. Así la ventana nunca se congela mientras
+    se lee o se guarda el archivo, y se pueden encolar varias operaciones.
+    """
+    
+    def __init__(self, root, al_cambiar_estado=None):
+        self.root = root
+        self.al_cambiar_estado = al_cambiar_estado
+        self._pedidos = queue.Queue()
+        self._respuestas = queue.Queue()
+        # Operaciones encoladas que todavía no entregaron respuesta (solo se usa desde Tk)
+        self.pendientes = 0
+        self._hilo = threading.Thread(target=self._trabajar, name="almacenamiento", daemon=True)
+        self._hilo.start()
+        self.root.after(INTERVALO_RESPUESTAS, self._revisar_respuestas)
+    
+    @property
+    def ocupado(self):
+        return self.pendientes > 0
+    
+    def encolar(self, funcion, al_terminar=None, al_fallar=None):
+        """Ejecuta funcion() en el hilo de almacenamiento y entrega el resultado en el hilo de Tk"""
+        self.pendientes += 1
+        self._notificar()
+        self._pedidos.put((funcion, al_terminar, al_fallar))
+    
+    def detener(self):
+        """Termina el hilo después de las operaciones ya encoladas"""
+        self._pedidos.put(None)
+        self._hilo.join()
+    
+    def _trabajar(self):
+        while True:
+            pedido = self._pedidos.get()
+            if pedido is None:
+                return
+            funcion, al_terminar, al_fallar = pedido
+            try:
+                self._respuestas.put((al_terminar, funcion()))
+            except Exception as e:
+                self._respuestas.put((al_fallar or self._informar_error, e))
+    
+    def _revisar_respuestas(self):
+        try:
+            while True:
+                funcion, resultado = self._respuestas.get_nowait()
+                self.pendientes -= 1
+                try:
+                    if funcion:
+                        funcion(resultado)
+                except tk.TclError:
+                    # La ventana que esperaba la respuesta ya se cerró
+                    pass
+                except Exception as e:
+                    self._informar_error(e)
+        except queue.Empty:
+            pass
+        self._notificar()
+        self.root.after(INTERVALO_RESPUESTAS, self._revisar_respuestas)
+    
+    def _notificar(self):
+        if self.al_cambiar_estado:
+            self.al_cambiar_estado(self.pendientes)
+    
+    @staticmethod
+    def _informar_error(e):
+        messagebox.showerror("Error", f"Error en el archivo de datos: {str(e)}")
+
+
+class TablaVirtual:
+    """Treeview que solo contiene las filas visibles de una tabla grande
+
+    La barra de desplazamiento representa el total de filas. Al desplazarse
+    se piden al hilo de almacenamiento las filas de la página visible más un
+    margen de precarga, y solo esas filas se insertan en el Treeview.
+    """
+    
+    def __init__(self, padre, trabajador, columnas, leer_pagina, formatear, filas_visibles=12):
+        self.trabajador = trabajador
+        self.leer_pagina = leer_pagina
+        self.formatear = formatear
+        self.filas_visibles = filas_visibles
+        self.total = 0
+        self.primera = 0
+        # Bloque de filas leído: cubre las posiciones [_bloque_inicio, _bloque_fin)
+        self._bloque = ()
+        self._bloque_inicio = 0
+        self._bloque_fin = 0
+        self._pidiendo = False
+        
+        frame = tk.Frame(padre)
+        frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
+        
+        self.scrollbar = tk.Scrollbar(frame, command=self.desplazar)
+        self.scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        
+        self.tree = ttk.Treeview(
+            frame,
+            columns=[columna for columna, _, _, _ in columnas],
+            show="headings",
+            height=filas_visibles
+        )
+        for columna, texto, ancho, alineacion in columnas:
+            self.tree.heading(columna, text=texto)
+            self.tree.column(columna, width=ancho, anchor=alineacion)
+        self.tree.pack(fill=tk.BOTH, expand=True)
+        
+        # Rueda del ratón: <MouseWheel> en Windows y macOS, botones 4 y 5 en Linux
+        self.tree.bind("<MouseWheel>", lambda evento: self.desplazar("scroll", -3 if evento.delta > 0 else 3, "units"))
+        self.tree.bind("<Button-4>", lambda evento: self.desplazar("scroll", -3, "units"))
+        self.tree.bind("<Button-5>", lambda evento: self.desplazar("scroll", 3, "units"))
+    
+    def fijar_total(self, total):
+        """Indica cuántas filas tiene la tabla y muestra la página actual"""
+        self.total = total
+        self.mostrar()
+    
+    def desplazar(self, accion, cantidad, unidad=None):
+        """Atiende la barra de desplazamiento (moveto / scroll) y la rueda del ratón"""
+        if accion == "moveto":
+            primera = int(float(cantidad) * self.total)
+        elif unidad == "pages":
+            primera = self.primera + int(cantidad) * self.filas_visibles
+        else:
+            primera = self.primera + int(cantidad)
+        self.primera = max(0, min(primera, self.total - self.filas_visibles))
+        self.mostrar()
+        return "break"
+    
+    def mostrar(self):
+        """Dibuja la página visible, pidiendo las filas que falten"""
+        if self.total:
+            self.scrollbar.set(self.primera / self.total, min((self.primera + self.filas_visibles) / self.total, 1.0))
+        else:
+            self.scrollbar.set(0.0, 1.0)
+        
+        ultima = min(self.primera + self.filas_visibles, self.total)
+        if self._bloque_inicio <= self.primera and ultima <= self._bloque_fin:
+            self._dibujar(ultima)
+        elif not self._pidiendo:
+            # Al llegar el bloque se vuelve a llamar a mostrar con la posición de ese momento
+            inicio = max(self.primera - MARGEN_PRECARGA, 0)
+            cantidad = self.filas_visibles + 2 * MARGEN_PRECARGA
+            self._pidiendo = True
+            self.trabajador.encolar(
+                lambda: self.leer_pagina(inicio, cantidad),
+                lambda filas: self._recibir(inicio, cantidad, filas),
+                self._fallar
+            )
+    
+    def _recibir(self, inicio, cantidad, filas):
+        self._pidiendo = False
+        self._bloque = filas
+        self._bloque_inicio = inicio
+        self._bloque_fin = inicio + cantidad
+        if self.tree.winfo_exists():
+            self.mostrar()
+    
+    def _fallar(self, e):
+        self._pidiendo = False
+        if self.tree.winfo_exists():
+            messagebox.showerror("Error", f"Error al leer la tabla: {str(e)}")
+    
+    def _dibujar(self, ultima):
+        self.tree.delete(*self.tree.get_children())
+        for posicion in range(self.primera, ultima):
+            indice = posicion - self._bloque_inicio
+            if indice < len(self._bloque):
+                self.tree.insert("", tk.END, values=self.formatear(self._bloque[indice]))
 
 
 class InterfazGrafica:
     def __init__(self, root):
         self.root = root
         self.root.title("Sistema de Gestión - Inventario y Trabajos")
-        self.root.geometry("600x500")
+        self.root.geometry(f"600x{ALTO_VENTANA}")
         self.root.resizable(False, False)
         
         # Configurar estilo
         self.configurar_estilo()
         
         # Crear la interfaz principal
+        self.crear_menu()
         self.crear_ventana_principal()
+        
+        # Las lecturas y escrituras del archivo se hacen fuera del mainloop
+        self.trabajador = TrabajadorAlmacenamiento(self.root, self.mostrar_estado)
+        self.iniciar_alertas()
     
     def configurar_estilo(self):
         """Configura los estilos de la interfaz"""
         self.root.configure(bg="#f0f0f0")
     
+    def crear_menu(self):
+        """Crea la barra de menú con las acciones sobre el archivo de datos"""
+        barra = tk.Menu(self.root)
+        menu_archivo = tk.Menu(barra, tearoff=0)
+        menu_archivo.add_command(label="Importar reabastecimiento...", command=self.importar_reabastecimiento)
+        menu_archivo.add_command(label="Exportar a Excel...", command=self.exportar_excel)
+        menu_archivo.add_command(label="Archivar trabajos de meses cerrados...", command=self.archivar_trabajos)
+        menu_archivo.add_separator()
+        menu_archivo.add_command(label="Verificar totales del inventario", command=self.verificar_totales)
+        menu_archivo.add_command(label="Métricas de rendimiento...", command=self.ventana_metricas)
+        barra.add_cascade(label="Archivo", menu=menu_archivo)
+        self.root.config(menu=barra)
+    
     def crear_ventana_principal(self):
         """Crea la ventana principal con los botones del menú"""
+        # Indicador de operaciones en curso sobre el archivo de datos
+        self.etiqueta_estado = tk.Label(
+            self.root,
+            text="Listo",
+            font=("Arial", 9),
+            bg="#e0e0e0",
+            fg="#333333",
+            anchor="w",
+            padx=10
+        )
+        self.etiqueta_estado.pack(side=tk.BOTTOM, fill=tk.X)
+        
+        # Aviso de stock bajo: solo se muestra mientras haya productos bajo su umbral
+        self.aviso_alertas = tk.Label(
+            self.root,
+            font=("Arial", 10, "bold"),
+            bg="#f44336",
+            fg="white",
+            anchor="w",
+            padx=10,
+            pady=5
+        )
+        
         # Título
         titulo = tk.Label(
             self.root,
@@ -47,6 +276,7 @@ class InterfazGrafica:
             fg="#333333"
         )
         titulo.pack(pady=30)
+        self.titulo = titulo
         
         subtitulo = tk.Label(
             self.root,
@@ -68,6 +298,7 @@ class InterfazGrafica:
             ("Mostrar Almacén", self.ventana_mostrar_almacen),
             ("Buscar Producto", self.ventana_buscar_producto),
             ("Ver Trabajos Registrados", self.ventana_ver_trabajos),
+            ("Entregas Vencidas y Próximas", self.ventana_entregas),
             ("Salir", self.salir)
         ]
         
@@ -87,11 +318,77 @@ class InterfazGrafica:
             )
             btn.pack(pady=8)
     
+    def iniciar_alertas(self):
+        """Muestra el aviso con los productos que ya están bajo su umbral y espera las alertas nuevas"""
+        # Las alertas llegan en el hilo de almacenamiento; Tk solo se toca desde el mainloop
+        self._alertas = queue.Queue()
+        ALERTAS.suscribir(self._alertas.put)
+        self.ejecutar(lambda: ALERTAS.revisar_umbrales(obtener_conexion()), self.mostrar_alertas)
+        self.root.after(INTERVALO_ALERTAS, self._revisar_alertas)
+    
+    def _revisar_alertas(self):
+        nuevas = []
+        try:
+            while True:
+                nuevas.append(self._alertas.get_nowait())
+        except queue.Empty:
+            pass
+        if nuevas:
+            self.mostrar_alertas(ALERTAS.activas())
+        self.root.after(INTERVALO_ALERTAS, self._revisar_alertas)
+    
+    def mostrar_alertas(self, activas):
+        """Muestra u oculta el aviso de stock bajo sobre la ventana principal"""
+        if not activas:
+            if self.aviso_alertas.winfo_manager():
+                self.aviso_alertas.pack_forget()
+                self.root.geometry(f"600x{ALTO_VENTANA}")
+            return
+        texto = "Stock bajo: " + ", ".join(
+            f"{alerta.producto} ({alerta.cantidad}, mínimo {alerta.umbral})" for alerta in activas)
+        self.aviso_alertas.config(text=texto, wraplength=580)
+        if not self.aviso_alertas.winfo_manager():
+            self.aviso_alertas.pack(side=tk.TOP, fill=tk.X, before=self.titulo)
+            self.root.geometry(f"600x{ALTO_VENTANA + ALTO_AVISO}")
+    
+    def mostrar_estado(self, pendientes):
+        """Actualiza el indicador de ocupado según las operaciones en cola"""
+        if pendientes:
+            self.etiqueta_estado.config(text=f"Procesando... ({pendientes} en cola)")
+            self.root.config(cursor="watch")
+        else:
+            self.etiqueta_estado.config(text="Listo")
+            self.root.config(cursor="")
+    
+    def ejecutar(self, funcion, al_terminar=None, al_fallar=None, botones=()):
+        """Encola una operación de almacenamiento deshabilitando los botones mientras está en curso"""
+        for boton in botones:
+            boton.config(state=tk.DISABLED)
+        
+        def reactivar():
+            for boton in botones:
+                if boton.winfo_exists():
+                    boton.config(state=tk.NORMAL)
+        
+        def terminar(resultado):
+            reactivar()
+            if al_terminar:
+                al_terminar(resultado)
+        
+        def fallar(e):
+            reactivar()
+            if al_fallar:
+                al_fallar(e)
+            else:
+                messagebox.showerror("Error", f"Error en el archivo de datos: {str(e)}")
+        
+        self.trabajador.encolar(funcion, terminar, fallar)
+    
     def ventana_registrar_trabajo(self):
         """Ventana para registrar un nuevo trabajo"""
         ventana = tk.Toplevel(self.root)
         ventana.title("Registrar Trabajo")
-        ventana.geometry("500x450")
+        ventana.geometry("600x450")
         ventana.resizable(False, False)
         
         # Título
@@ -109,6 +406,13 @@ class InterfazGrafica:
         tk.Label(frame, text="Cliente:", font=("Arial", 10)).grid(row=0, column=0, sticky="w", pady=10)
         entry_cliente = tk.Entry(frame, width=40, font=("Arial", 10))
         entry_cliente.grid(row=0, column=1, pady=10)
+        tk.Button(
+            frame,
+            text="Historial",
+            command=lambda: self.ventana_trabajos_cliente(entry_cliente.get().strip()),
+            font=("Arial", 9)
+        ).grid(row=0, column=2, padx=(8, 0))
+        self.autocompletar_clientes(entry_cliente)
         
         # Campo Tipo de Trabajo
         tk.Label(frame, text="Tipo de Trabajo:", font=("Arial", 10)).grid(row=1, column=0, sticky="w", pady=10)
@@ -137,18 +441,17 @@ class InterfazGrafica:
                 messagebox.showerror("Error", "Todos los campos son obligatorios")
                 return
             
-            # Validar fecha
+            # Mismas reglas que usa registrar() al guardar
             try:
-                datetime.strptime(fecha, "%d-%m-%Y")
-            except:
-                messagebox.showerror("Error", "Formato de fecha inválido. Use dd-mm-yyyy")
+                validar_cliente(cliente)
+                validar_trabajo(trabajo)
+                validar_fecha(fecha)
+            except DatosInvalidos as e:
+                messagebox.showerror("Error", str(e))
                 return
             
-            # Procesar según el tipo de trabajo
-            if trabajo == "corte eléctrico en vinil adhesivo":
-                self.procesar_corte_vinil(cliente, trabajo, fecha, ventana)
-            elif trabajo == "sublimado":
-                self.procesar_sublimado(cliente, trabajo, fecha, ventana)
+            # Los materiales a descontar salen de la lista de materiales del trabajo
+            self.procesar_materiales(cliente, trabajo, fecha, ventana)
         
         tk.Button(
             ventana,
@@ -162,195 +465,172 @@ class InterfazGrafica:
             cursor="hand2"
         ).pack(pady=20)
     
-    def procesar_corte_vinil(self, cliente, trabajo, fecha, ventana_padre):
-        """Procesa el descuento de vinil"""
-        ventana = tk.Toplevel(ventana_padre)
-        ventana.title("Cantidad de Vinil")
-        ventana.geometry("400x200")
+    def autocompletar_clientes(self, entry):
+        """Muestra debajo del campo los clientes ya registrados que empiezan con lo escrito"""
+        lista = tk.Listbox(entry.master, height=5, font=("Arial", 10), activestyle="none")
         
-        tk.Label(
-            ventana,
-            text="Ingrese la cantidad de hojas de vinil:",
-            font=("Arial", 12)
-        ).pack(pady=20)
+        def ocultar(evento=None):
+            lista.place_forget()
         
-        entry_cantidad = tk.Entry(ventana, width=20, font=("Arial", 12))
-        entry_cantidad.pack(pady=10)
-        entry_cantidad.focus()
+        def elegir(evento=None):
+            seleccion = lista.curselection()
+            if seleccion:
+                entry.delete(0, tk.END)
+                entry.insert(0, lista.get(seleccion[0]))
+            ocultar()
+            entry.focus_set()
+            entry.icursor(tk.END)
         
-        def confirmar():
-            try:
-                cantidad = float(entry_cantidad.get())
-                
-                if cantidad <= 0:
-                    messagebox.showerror("Error", "La cantidad debe ser mayor a cero")
-                    return
-                
-                # Verificar y descontar
-                wb = load_workbook(ARCHIVO_EXCEL)
-                ws = wb[HOJA_INVENTARIO]
-                
-                vinil_disponible = 0
-                fila_vinil = None
-                
-                for row in range(2, ws.max_row + 1):
-                    producto = ws.cell(row, 1).value
-                    if producto and producto.lower() == "vinil":
-                        vinil_disponible = ws.cell(row, 2).value or 0
-                        fila_vinil = row
-                        break
-                
-                if fila_vinil is None:
-                    messagebox.showerror("Error", "El producto vinil no está en el inventario")
-                    return
-                
-                if vinil_disponible < cantidad:
-                    messagebox.showerror(
-                        "Error",
-                        f"Materiales insuficientes\nDisponible: {vinil_disponible}\nSolicitado: {cantidad}"
-                    )
-                    return
-                
-                # Descontar
-                nueva_cantidad = vinil_disponible - cantidad
-                ws.cell(fila_vinil, 2, nueva_cantidad)
-                
-                # Guardar trabajo
-                ws_trabajos = wb[HOJA_TRABAJOS]
-                ws_trabajos.append([cliente, trabajo, fecha])
-                
-                wb.save(ARCHIVO_EXCEL)
-                
-                messagebox.showinfo(
-                    "Éxito",
-                    f"Trabajo registrado exitosamente\n\nMateriales descontados:\nVinil: {cantidad} hojas\nVinil restante: {nueva_cantidad}"
-                )
-                
-                ventana.destroy()
-                ventana_padre.destroy()
-                
-            except ValueError:
-                messagebox.showerror("Error", "Ingrese un número válido")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al procesar: {str(e)}")
+        def mostrar(sugerencias, texto):
+            # Si el texto cambió mientras se buscaba, la respuesta ya no sirve
+            if entry.get().strip() != texto:
+                return
+            if not sugerencias or sugerencias == [texto]:
+                ocultar()
+                return
+            lista.delete(0, tk.END)
+            for nombre in sugerencias:
+                lista.insert(tk.END, nombre)
+            lista.config(height=min(len(sugerencias), 5))
+            lista.place(in_=entry, relx=0, rely=1, relwidth=1)
+            lista.lift()
         
-        tk.Button(
-            ventana,
-            text="Confirmar",
-            command=confirmar,
-            width=15,
-            font=("Arial", 11),
-            bg="#4CAF50",
-            fg="white",
-            cursor="hand2"
-        ).pack(pady=10)
+        def al_escribir(evento):
+            if evento.keysym in ("Down", "Escape", "Return", "Tab"):
+                return
+            texto = entry.get().strip()
+            if not texto:
+                ocultar()
+                return
+            # La búsqueda usa el índice en memoria; va al hilo de almacenamiento
+            # solo porque la primera vez puede tener que leer el archivo
+            self.trabajador.encolar(
+                lambda: obtener_conexion().sugerir_clientes(texto),
+                lambda sugerencias: mostrar(sugerencias, texto),
+                lambda e: ocultar()
+            )
+        
+        def bajar(evento):
+            if lista.winfo_ismapped():
+                lista.focus_set()
+                lista.selection_clear(0, tk.END)
+                lista.selection_set(0)
+                lista.activate(0)
+        
+        def al_salir(evento):
+            # Al hacer clic en la lista el campo pierde el foco: se espera a ver a dónde fue
+            entry.after(150, lambda: None if entry.focus_get() is lista else ocultar())
+        
+        entry.bind("<KeyRelease>", al_escribir)
+        entry.bind("<Down>", bajar)
+        entry.bind("<Escape>", ocultar)
+        entry.bind("<FocusOut>", al_salir)
+        lista.bind("<Return>", elegir)
+        lista.bind("<ButtonRelease-1>", elegir)
+        lista.bind("<Escape>", lambda evento: (ocultar(), entry.focus_set()))
     
-    def procesar_sublimado(self, cliente, trabajo, fecha, ventana_padre):
-        """Procesa el descuento de materiales para sublimado"""
-        ventana = tk.Toplevel(ventana_padre)
-        ventana.title("Sublimado - Seleccionar Producto")
-        ventana.geometry("400x300")
+    def ventana_trabajos_cliente(self, cliente):
+        """Ventana con los trabajos registrados de un cliente"""
+        if not cliente:
+            messagebox.showerror("Error", "Escriba el nombre del cliente")
+            return
         
-        tk.Label(
-            ventana,
-            text="Seleccione el producto para sublimado:",
-            font=("Arial", 12, "bold")
-        ).pack(pady=20)
+        ventana = tk.Toplevel(self.root)
+        ventana.title(f"Trabajos de {cliente}")
+        ventana.geometry("600x350")
         
-        productos_sublimado = ["playera", "taza", "vidrio"]
+        tree = ttk.Treeview(ventana, columns=("Trabajo", "Fecha"), show="headings", height=10)
+        tree.heading("Trabajo", text="Trabajo")
+        tree.heading("Fecha", text="Fecha de Entrega")
+        tree.column("Trabajo", width=380)
+        tree.column("Fecha", width=150, anchor="center")
+        tree.pack(padx=20, pady=20, fill="both", expand=True)
         
-        combo_producto = ttk.Combobox(
-            ventana,
-            values=[p.capitalize() for p in productos_sublimado],
-            width=20,
-            font=("Arial", 11),
-            state="readonly"
-        )
-        combo_producto.pack(pady=10)
-        combo_producto.current(0)
+        etiqueta_total = tk.Label(ventana, text="Cargando...", font=("Arial", 12, "bold"))
+        etiqueta_total.pack(pady=(0, 15))
+        
+        def al_terminar(trabajos):
+            for _, trabajo, fecha in trabajos:
+                tree.insert("", tk.END, values=(trabajo.capitalize() if trabajo else "", fecha or ""))
+            if trabajos:
+                etiqueta_total.config(text=f"Trabajos de {trabajos[-1][0]}: {len(trabajos)}")
+            else:
+                etiqueta_total.config(text=f"{cliente} no tiene trabajos registrados")
         
-        tk.Label(ventana, text="Cantidad:", font=("Arial", 12)).pack(pady=10)
+        def al_fallar(e):
+            messagebox.showerror("Error", f"Error al buscar los trabajos del cliente: {str(e)}")
+        
+        self.ejecutar(medido("trabajos_de_cliente")(lambda: obtener_conexion().trabajos_de_cliente(cliente)),
+                      al_terminar, al_fallar)
+    
+    def procesar_materiales(self, cliente, trabajo, fecha, ventana_padre):
+        """Pide la cantidad (y el producto, si el trabajo lo requiere) y descuenta los materiales"""
+        regla = LISTA_MATERIALES.regla(trabajo)
+        
+        ventana = tk.Toplevel(ventana_padre)
+        ventana.title(f"{trabajo.capitalize()} - Materiales")
+        ventana.geometry("400x300" if regla.piezas else "400x200")
+        
+        combo_producto = None
+        if regla.piezas:
+            tk.Label(
+                ventana,
+                text=f"Seleccione el producto para {trabajo}:",
+                font=("Arial", 12, "bold")
+            ).pack(pady=20)
+            
+            combo_producto = ttk.Combobox(
+                ventana,
+                values=[p.capitalize() for p in regla.piezas],
+                width=20,
+                font=("Arial", 11),
+                state="readonly"
+            )
+            combo_producto.pack(pady=10)
+            combo_producto.current(0)
+            
+            tk.Label(ventana, text="Cantidad:", font=("Arial", 12)).pack(pady=10)
+        else:
+            tk.Label(
+                ventana,
+                text=f"Ingrese la cantidad de {regla.unidad}:",
+                font=("Arial", 12)
+            ).pack(pady=20)
         
         entry_cantidad = tk.Entry(ventana, width=20, font=("Arial", 12))
         entry_cantidad.pack(pady=10)
+        entry_cantidad.focus()
         
         def confirmar():
+            pieza = combo_producto.get().lower() if combo_producto else None
             try:
-                producto_elegido = combo_producto.get().lower()
                 cantidad = float(entry_cantidad.get())
-                
-                if cantidad <= 0:
-                    messagebox.showerror("Error", "La cantidad debe ser mayor a cero")
-                    return
-                
-                # Verificar y descontar
-                wb = load_workbook(ARCHIVO_EXCEL)
-                ws = wb[HOJA_INVENTARIO]
-                
-                producto_disponible = 0
-                papel_disponible = 0
-                fila_producto = None
-                fila_papel = None
-                
-                for row in range(2, ws.max_row + 1):
-                    producto = ws.cell(row, 1).value
-                    if producto:
-                        if producto.lower() == producto_elegido:
-                            producto_disponible = ws.cell(row, 2).value or 0
-                            fila_producto = row
-                        elif producto.lower() == "papel impresión":
-                            papel_disponible = ws.cell(row, 2).value or 0
-                            fila_papel = row
-                
-                if fila_producto is None:
-                    messagebox.showerror("Error", f"El producto {producto_elegido} no está en el inventario")
-                    return
-                
-                if fila_papel is None:
-                    messagebox.showerror("Error", "El papel impresión no está en el inventario")
-                    return
-                
-                if producto_disponible < cantidad:
-                    messagebox.showerror(
-                        "Error",
-                        f"Materiales insuficientes\n{producto_elegido.capitalize()} disponible: {producto_disponible}\nSolicitado: {cantidad}"
-                    )
-                    return
-                
-                if papel_disponible < cantidad:
-                    messagebox.showerror(
-                        "Error",
-                        f"Materiales insuficientes\nPapel impresión disponible: {papel_disponible}\nSolicitado: {cantidad}"
-                    )
-                    return
-                
-                # Descontar
-                nueva_cantidad_producto = producto_disponible - cantidad
-                nueva_cantidad_papel = papel_disponible - cantidad
-                
-                ws.cell(fila_producto, 2, nueva_cantidad_producto)
-                ws.cell(fila_papel, 2, nueva_cantidad_papel)
-                
-                # Guardar trabajo
-                ws_trabajos = wb[HOJA_TRABAJOS]
-                ws_trabajos.append([cliente, trabajo, fecha])
-                
-                wb.save(ARCHIVO_EXCEL)
-                
+            except ValueError:
+                messagebox.showerror("Error", "Ingrese un número válido")
+                return
+            
+            if cantidad <= 0:
+                messagebox.showerror("Error", "La cantidad debe ser mayor a cero")
+                return
+            
+            def al_terminar(resultado):
+                detalle = "\n".join(
+                    f"{material.capitalize()}: {solicitado} (restante: {resultado.restantes[material]})"
+                    for material, solicitado in resultado.consumos.items()
+                )
                 messagebox.showinfo(
                     "Éxito",
-                    f"Trabajo registrado exitosamente\n\nMateriales descontados:\n{producto_elegido.capitalize()}: {cantidad} unidades (restante: {nueva_cantidad_producto})\nPapel impresión: {cantidad} hojas (restante: {nueva_cantidad_papel})"
+                    f"Trabajo registrado exitosamente\n\nMateriales descontados:\n{detalle}"
                 )
                 
                 ventana.destroy()
                 ventana_padre.destroy()
-                
-            except ValueError:
-                messagebox.showerror("Error", "Ingrese un número válido")
-            except Exception as e:
-                messagebox.showerror("Error", f"Error al procesar: {str(e)}")
+            
+            # Descontar y guardar el trabajo en el hilo de almacenamiento, en una sola transacción
+            self.ejecutar(lambda: registrar(cliente, trabajo, fecha, cantidad, pieza),
+                          al_terminar, self.error_al_registrar, botones=[boton_confirmar])
         
-        tk.Button(
+        boton_confirmar = tk.Button(
             ventana,
             text="Confirmar",
             command=confirmar,
@@ -359,7 +639,24 @@ class InterfazGrafica:
             bg="#4CAF50",
             fg="white",
             cursor="hand2"
-        ).pack(pady=20)
+        )
+        boton_confirmar.pack(pady=10)
+    
+    def error_al_registrar(self, e):
+        """Informa por qué no se pudo registrar un trabajo"""
+        if isinstance(e, ConflictoConcurrencia):
+            # Otra estación cambió el inventario mientras se guardaba
+            messagebox.showerror("Error", f"Otra estación modificó el inventario, el trabajo no se guardó\n\n{e}")
+        elif isinstance(e, StockInsuficiente):
+            messagebox.showerror(
+                "Error",
+                f"Materiales insuficientes\n{e.producto.capitalize()} disponible: {e.disponible}\nSolicitado: {e.solicitado}"
+            )
+        elif isinstance(e, ValueError):
+            # DatosInvalidos o MaterialNoEncontrado
+            messagebox.showerror("Error", str(e))
+        else:
+            messagebox.showerror("Error", f"Error al procesar: {str(e)}")
     
     def ventana_agregar_inventario(self):
         """Ventana para agregar productos al inventario"""
@@ -400,42 +697,41 @@ class InterfazGrafica:
             
             try:
                 cantidad = float(entry_cantidad.get())
-                
-                if cantidad <= 0:
-                    messagebox.showerror("Error", "La cantidad debe ser mayor a cero")
-                    return
-                
-                wb = load_workbook(ARCHIVO_EXCEL)
-                ws = wb[HOJA_INVENTARIO]
-                
-                producto_encontrado = False
-                for row in range(2, ws.max_row + 1):
-                    if ws.cell(row, 1).value and ws.cell(row, 1).value.lower() == producto:
-                        cantidad_actual = ws.cell(row, 2).value or 0
-                        ws.cell(row, 2, cantidad_actual + cantidad)
-                        producto_encontrado = True
-                        messagebox.showinfo(
-                            "Éxito",
-                            f"Producto actualizado\n\n{producto.capitalize()}\nCantidad agregada: {cantidad}\nNueva cantidad: {cantidad_actual + cantidad}"
-                        )
-                        break
-                
-                if not producto_encontrado:
-                    ws.append([producto, cantidad])
+            except ValueError:
+                messagebox.showerror("Error", "La cantidad debe ser un número válido")
+                return
+            
+            if cantidad <= 0:
+                messagebox.showerror("Error", "La cantidad debe ser mayor a cero")
+                return
+            
+            @medido("agregar")
+            def sumar():
+                conexion = obtener_conexion()
+                existia = conexion.obtener_cantidad(producto) is not None
+                return existia, conexion.sumar_cantidad(producto, cantidad)
+            
+            def al_terminar(resultado):
+                existia, nueva_cantidad = resultado
+                if existia:
+                    messagebox.showinfo(
+                        "Éxito",
+                        f"Producto actualizado\n\n{producto.capitalize()}\nCantidad agregada: {cantidad}\nNueva cantidad: {nueva_cantidad}"
+                    )
+                else:
                     messagebox.showinfo(
                         "Éxito",
                         f"Producto agregado\n\n{producto.capitalize()}\nCantidad: {cantidad}"
                     )
                 
-                wb.save(ARCHIVO_EXCEL)
                 ventana.destroy()
-                
-            except ValueError:
-                messagebox.showerror("Error", "La cantidad debe ser un número válido")
-            except Exception as e:
+            
+            def al_fallar(e):
                 messagebox.showerror("Error", f"Error al agregar: {str(e)}")
+            
+            self.ejecutar(sumar, al_terminar, al_fallar, botones=[boton_agregar])
         
-        tk.Button(
+        boton_agregar = tk.Button(
             ventana,
             text="Agregar",
             command=agregar,
@@ -445,13 +741,14 @@ class InterfazGrafica:
             bg="#4CAF50",
             fg="white",
             cursor="hand2"
-        ).pack(pady=20)
+        )
+        boton_agregar.pack(pady=20)
     
     def ventana_mostrar_almacen(self):
         """Ventana para mostrar el inventario completo"""
         ventana = tk.Toplevel(self.root)
         ventana.title("Inventario Completo")
-        ventana.geometry("600x400")
+        ventana.geometry("600x440")
         
         tk.Label(
             ventana,
@@ -459,53 +756,42 @@ class InterfazGrafica:
             font=("Arial", 16, "bold")
         ).pack(pady=20)
         
-        # Frame con scrollbar
-        frame = tk.Frame(ventana)
-        frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        scrollbar = tk.Scrollbar(frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        def formatear(fila):
+            producto, cantidad = fila
+            return (producto.capitalize() if producto else "", cantidad if cantidad is not None else "")
         
-        # Treeview para mostrar datos
-        tree = ttk.Treeview(
-            frame,
-            columns=("Producto", "Cantidad"),
-            show="headings",
-            yscrollcommand=scrollbar.set,
-            height=12
+        # Solo se leen las filas visibles; el total sale de la dimensión de la hoja
+        conexion = obtener_conexion()
+        tabla = TablaVirtual(
+            ventana,
+            self.trabajador,
+            [("Producto", "Producto", 300, "w"), ("Cantidad", "Cantidad", 200, "center")],
+            conexion.leer_pagina_inventario,
+            formatear
         )
         
-        tree.heading("Producto", text="Producto")
-        tree.heading("Cantidad", text="Cantidad")
+        etiqueta_total = tk.Label(ventana, text="Cargando...", font=("Arial", 12, "bold"))
+        etiqueta_total.pack(pady=(10, 0))
+        etiqueta_categorias = tk.Label(ventana, text="", font=("Arial", 9))
+        etiqueta_categorias.pack(pady=(0, 10))
         
-        tree.column("Producto", width=300, anchor="w")
-        tree.column("Cantidad", width=200, anchor="center")
+        @medido("mostrar")
+        def contar():
+            # Los totales se mantienen con cada cambio: no se recorre el inventario
+            return conexion.contar_inventario(), conexion.totales_inventario()
         
-        scrollbar.config(command=tree.yview)
-        tree.pack(fill=tk.BOTH, expand=True)
+        def al_terminar(resultado):
+            total_filas, totales = resultado
+            tabla.fijar_total(total_filas)
+            etiqueta_total.config(
+                text=f"Productos: {totales['productos']}    Total de unidades: {totales['unidades']}")
+            etiqueta_categorias.config(text="    ".join(
+                f"{categoria.capitalize()}: {datos['unidades']}" for categoria, datos in totales["categorias"].items()))
         
-        try:
-            wb = load_workbook(ARCHIVO_EXCEL)
-            ws = wb[HOJA_INVENTARIO]
-            
-            total_unidades = 0
-            
-            for row in range(2, ws.max_row + 1):
-                producto = ws.cell(row, 1).value
-                cantidad = ws.cell(row, 2).value or 0
-                
-                if producto:
-                    tree.insert("", tk.END, values=(producto.capitalize(), cantidad))
-                    total_unidades += cantidad
-            
-            tk.Label(
-                ventana,
-                text=f"Total de unidades: {total_unidades}",
-                font=("Arial", 12, "bold")
-            ).pack(pady=10)
-            
-        except Exception as e:
+        def al_fallar(e):
             messagebox.showerror("Error", f"Error al cargar inventario: {str(e)}")
+        
+        self.ejecutar(contar, al_terminar, al_fallar)
     
     def ventana_buscar_producto(self):
         """Ventana para buscar un producto específico"""
@@ -532,27 +818,38 @@ class InterfazGrafica:
                 messagebox.showerror("Error", "Debe ingresar un nombre de producto")
                 return
             
-            try:
-                wb = load_workbook(ARCHIVO_EXCEL)
-                ws = wb[HOJA_INVENTARIO]
-                
-                for row in range(2, ws.max_row + 1):
-                    prod = ws.cell(row, 1).value
-                    if prod and prod.lower() == producto:
-                        cantidad = ws.cell(row, 2).value or 0
-                        messagebox.showinfo(
-                            "Producto Encontrado",
-                            f"Producto: {prod.capitalize()}\nCantidad en stock: {cantidad} unidades"
-                        )
-                        return
-                
-                messagebox.showwarning(
-                    "No Encontrado",
-                    f"El producto '{producto}' no se encuentra en el almacén"
-                )
+            @medido("buscar")
+            def consultar():
+                conexion = obtener_conexion()
+                cantidad = conexion.obtener_cantidad(producto)
+                if cantidad is not None:
+                    return producto, cantidad, []
+                parecidos = conexion.buscar_parecidos(producto)
+                # Un nombre que solo difiere en acentos o espacios cuenta como encontrado
+                if parecidos and parecidos[0][2] == 1:
+                    return parecidos[0][0], parecidos[0][1], []
+                return producto, None, parecidos
+            
+            def al_terminar(resultado):
+                nombre, cantidad, parecidos = resultado
+                if cantidad is not None:
+                    messagebox.showinfo(
+                        "Producto Encontrado",
+                        f"Producto: {nombre.capitalize()}\nCantidad en stock: {cantidad} unidades"
+                    )
+                    return
                 
-            except Exception as e:
+                mensaje = f"El producto '{producto}' no se encuentra en el almacén"
+                if parecidos:
+                    mensaje += "\n\n¿Quiso decir?\n" + "\n".join(
+                        f"{parecido.capitalize()}: {cantidad_parecido} unidades"
+                        for parecido, cantidad_parecido, _ in parecidos)
+                messagebox.showwarning("No Encontrado", mensaje)
+            
+            def al_fallar(e):
                 messagebox.showerror("Error", f"Error al buscar: {str(e)}")
+            
+            self.ejecutar(consultar, al_terminar, al_fallar)
         
         tk.Button(
             ventana,
@@ -578,59 +875,290 @@ class InterfazGrafica:
             font=("Arial", 16, "bold")
         ).pack(pady=20)
         
-        frame = tk.Frame(ventana)
-        frame.pack(fill=tk.BOTH, expand=True, padx=20, pady=10)
-        
-        scrollbar = tk.Scrollbar(frame)
-        scrollbar.pack(side=tk.RIGHT, fill=tk.Y)
+        def formatear(fila):
+            cliente, trabajo, fecha = fila
+            return (cliente or "", trabajo.capitalize() if trabajo else "", fecha or "")
         
-        tree = ttk.Treeview(
-            frame,
-            columns=("Cliente", "Trabajo", "Fecha"),
-            show="headings",
-            yscrollcommand=scrollbar.set,
-            height=12
+        # Solo se leen las filas visibles; el total sale de la dimensión de la hoja
+        conexion = obtener_conexion()
+        tabla = TablaVirtual(
+            ventana,
+            self.trabajador,
+            [("Cliente", "Cliente", 200, "w"), ("Trabajo", "Trabajo", 350, "w"), ("Fecha", "Fecha de Entrega", 150, "center")],
+            conexion.leer_pagina_trabajos,
+            formatear
         )
         
+        etiqueta_total = tk.Label(ventana, text="Cargando...", font=("Arial", 12, "bold"))
+        etiqueta_total.pack(pady=10)
+        
+        def al_terminar(total_trabajos):
+            tabla.fijar_total(total_trabajos)
+            etiqueta_total.config(text=f"Total de trabajos: {total_trabajos}")
+        
+        def al_fallar(e):
+            messagebox.showerror("Error", f"Error al cargar trabajos: {str(e)}")
+        
+        self.ejecutar(medido("ver_trabajos")(conexion.contar_trabajos), al_terminar, al_fallar)
+    
+    def ventana_entregas(self):
+        """Ventana para consultar los trabajos vencidos, las próximas entregas o un rango de fechas"""
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Entregas")
+        ventana.geometry("800x480")
+        
+        tk.Label(
+            ventana,
+            text="ENTREGAS",
+            font=("Arial", 16, "bold")
+        ).pack(pady=15)
+        
+        frame_consulta = tk.Frame(ventana)
+        frame_consulta.pack(pady=5)
+        
+        tk.Label(frame_consulta, text="Desde:", font=("Arial", 10)).grid(row=0, column=0, padx=5)
+        entry_desde = tk.Entry(frame_consulta, width=12, font=("Arial", 10))
+        entry_desde.grid(row=0, column=1, padx=5)
+        tk.Label(frame_consulta, text="Hasta:", font=("Arial", 10)).grid(row=0, column=2, padx=5)
+        entry_hasta = tk.Entry(frame_consulta, width=12, font=("Arial", 10))
+        entry_hasta.grid(row=0, column=3, padx=5)
+        tk.Label(frame_consulta, text="Próximas:", font=("Arial", 10)).grid(row=0, column=4, padx=5)
+        entry_cantidad = tk.Entry(frame_consulta, width=5, font=("Arial", 10))
+        entry_cantidad.insert(0, "10")
+        entry_cantidad.grid(row=0, column=5, padx=5)
+        
+        tree = ttk.Treeview(ventana, columns=("Cliente", "Trabajo", "Fecha"), show="headings", height=12)
         tree.heading("Cliente", text="Cliente")
         tree.heading("Trabajo", text="Trabajo")
         tree.heading("Fecha", text="Fecha de Entrega")
-        
-        tree.column("Cliente", width=200, anchor="w")
-        tree.column("Trabajo", width=350, anchor="w")
+        tree.column("Cliente", width=200)
+        tree.column("Trabajo", width=350)
         tree.column("Fecha", width=150, anchor="center")
         
-        scrollbar.config(command=tree.yview)
-        tree.pack(fill=tk.BOTH, expand=True)
+        etiqueta_total = tk.Label(ventana, text="", font=("Arial", 12, "bold"))
         
-        try:
-            wb = load_workbook(ARCHIVO_EXCEL)
-            ws = wb[HOJA_TRABAJOS]
-            
-            total_trabajos = 0
+        def consultar(titulo, consulta):
+            def al_terminar(trabajos):
+                tree.delete(*tree.get_children())
+                for cliente, trabajo, fecha in trabajos:
+                    tree.insert("", tk.END, values=(cliente or "", trabajo.capitalize() if trabajo else "", fecha or ""))
+                etiqueta_total.config(text=f"{titulo}: {len(trabajos)}")
             
-            for row in range(2, ws.max_row + 1):
-                cliente = ws.cell(row, 1).value
-                trabajo = ws.cell(row, 2).value
-                fecha = ws.cell(row, 3).value
-                
-                if cliente:
-                    tree.insert("", tk.END, values=(cliente, trabajo.capitalize() if trabajo else "", fecha))
-                    total_trabajos += 1
-            
-            tk.Label(
-                ventana,
-                text=f"Total de trabajos: {total_trabajos}",
-                font=("Arial", 12, "bold")
-            ).pack(pady=10)
+            def al_fallar(e):
+                messagebox.showerror("Error", f"Error al consultar entregas: {str(e)}")
             
-        except Exception as e:
-            messagebox.showerror("Error", f"Error al cargar trabajos: {str(e)}")
+            self.ejecutar(medido("consultar_entregas")(consulta), al_terminar, al_fallar, botones=botones)
+        
+        def vencidas():
+            hoy = datetime.now().date()
+            # Los meses archivados se leen al recorrer el resultado: se recorre aquí, fuera de la ventana
+            consultar("Trabajos vencidos", lambda: tuple(obtener_conexion().trabajos_vencidos(hoy)))
+        
+        def proximas():
+            texto = entry_cantidad.get().strip()
+            if not texto.isdigit() or int(texto) <= 0:
+                messagebox.showerror("Error", "La cantidad de próximas entregas debe ser un número entero mayor a cero")
+                return
+            hoy = datetime.now().date()
+            consultar("Próximas entregas", lambda: obtener_conexion().proximas_entregas(hoy, int(texto)))
+        
+        def entre_fechas():
+            try:
+                desde = validar_fecha(entry_desde.get().strip())
+                hasta = validar_fecha(entry_hasta.get().strip())
+            except DatosInvalidos as e:
+                messagebox.showerror("Error", f"Fecha no válida: {e}")
+                return
+            if hasta < desde:
+                messagebox.showerror("Error", "La fecha final no puede ser anterior a la inicial")
+                return
+            consultar("Entregas en el rango", lambda: obtener_conexion().trabajos_entre(desde, hasta))
+        
+        frame_botones = tk.Frame(ventana)
+        frame_botones.pack(pady=10)
+        botones = []
+        for texto, comando in (("Entre fechas", entre_fechas), ("Próximas", proximas), ("Vencidas", vencidas)):
+            boton = tk.Button(frame_botones, text=texto, command=comando, width=14,
+                              bg="#4CAF50", fg="white", font=("Arial", 10))
+            boton.pack(side="left", padx=5)
+            botones.append(boton)
+        tk.Button(frame_botones, text="Pronóstico de materiales", command=self.ventana_pronostico, width=22,
+                  bg="#2196F3", fg="white", font=("Arial", 10)).pack(side="left", padx=5)
+        
+        tree.pack(padx=20, fill="both", expand=True)
+        etiqueta_total.pack(pady=10)
+        vencidas()
+    
+    def ventana_pronostico(self):
+        """Ventana con el stock proyectado de cada material y la fecha en que se agotaría"""
+        from Pronóstico import SEMANAS_HISTORIAL, pronosticar
+        
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Pronóstico de Materiales")
+        ventana.geometry("860x360")
+        
+        tk.Label(
+            ventana,
+            text="PRONÓSTICO DE MATERIALES",
+            font=("Arial", 16, "bold")
+        ).pack(pady=15)
+        tk.Label(
+            ventana,
+            text=f"Según el consumo de las últimas {SEMANAS_HISTORIAL} semanas; "
+                 "los trabajos ya registrados están descontados del stock",
+            font=("Arial", 9)
+        ).pack()
+        
+        columnas = ("Material", "Stock", "Semana", "Registrado", "Dias7", "Dias28", "Agota")
+        tree = ttk.Treeview(ventana, columns=columnas, show="headings", height=8)
+        for columna, titulo, ancho in zip(columnas, ("Material", "Stock", "Por semana", "Registrado", "En 7 días",
+                                                     "En 28 días", "Se agota"), (150, 80, 100, 100, 100, 100, 180)):
+            tree.heading(columna, text=titulo)
+            tree.column(columna, width=ancho, anchor="w" if columna == "Material" else "center")
+        tree.pack(padx=20, pady=10, fill="both", expand=True)
+        # Los materiales que se agotan dentro de 4 semanas se marcan en rojo
+        tree.tag_configure("agotado", foreground="#f44336")
+        
+        def al_terminar(pronostico):
+            limite = pronostico.desde + timedelta(days=28)
+            for producto, stock in pronostico.stock.items():
+                proyectado = pronostico.proyectado[producto]
+                agotamiento = pronostico.agotamiento[producto]
+                tree.insert("", tk.END, tags=("agotado",) if agotamiento and agotamiento <= limite else (), values=(
+                    producto.capitalize(), stock, pronostico.demanda_semanal[producto],
+                    pronostico.registrado[producto], f"{proyectado[6]:.1f}", f"{proyectado[27]:.1f}",
+                    agotamiento.strftime("%d-%m-%Y") if agotamiento else f"Más de {pronostico.dias} días"))
+        
+        def al_fallar(e):
+            messagebox.showerror("Error", f"Error al calcular el pronóstico: {str(e)}")
+        
+        self.ejecutar(pronosticar, al_terminar, al_fallar)
+    
+    def verificar_totales(self):
+        """Recuenta el inventario y lo compara con los totales que se mantienen con cada cambio"""
+        def al_terminar(resultado):
+            coinciden, mantenidos, recontados = resultado
+            if coinciden:
+                messagebox.showinfo(
+                    "Totales del inventario",
+                    f"Los totales coinciden con el inventario\n\n"
+                    f"Productos: {recontados['productos']}\nUnidades: {recontados['unidades']}")
+            else:
+                messagebox.showwarning(
+                    "Totales del inventario",
+                    f"Los totales no coincidían y se recalcularon\n\n"
+                    f"Antes: {mantenidos['productos']} productos, {mantenidos['unidades']} unidades\n"
+                    f"Ahora: {recontados['productos']} productos, {recontados['unidades']} unidades")
+        
+        def al_fallar(e):
+            messagebox.showerror("Error", f"Error al verificar los totales: {str(e)}")
+        
+        self.ejecutar(lambda: obtener_conexion().verificar_totales(), al_terminar, al_fallar)
+    
+    def ventana_metricas(self):
+        """Ventana de depuración con los tiempos de las operaciones medidos en esta sesión"""
+        ventana = tk.Toplevel(self.root)
+        ventana.title("Métricas de rendimiento")
+        ventana.geometry("760x420")
+        
+        texto = tk.Text(ventana, font=("Courier", 9), wrap="none")
+        texto.pack(fill="both", expand=True, padx=10, pady=10)
+        
+        def actualizar():
+            texto.config(state="normal")
+            texto.delete("1.0", tk.END)
+            texto.insert(tk.END, formatear_resumen())
+            texto.config(state="disabled")
+        
+        def reiniciar():
+            METRICAS.reiniciar()
+            actualizar()
+        
+        botones = tk.Frame(ventana)
+        botones.pack(pady=(0, 10))
+        tk.Button(botones, text="Actualizar", command=actualizar, width=12).pack(side="left", padx=5)
+        tk.Button(botones, text="Reiniciar", command=reiniciar, width=12).pack(side="left", padx=5)
+        actualizar()
+    
+    def importar_reabastecimiento(self):
+        """Agrega al inventario la entrega de un proveedor desde un archivo CSV o JSONL"""
+        ruta = filedialog.askopenfilename(
+            title="Importar reabastecimiento",
+            filetypes=[("Archivos de entrega", "*.csv *.jsonl"), ("Todos los archivos", "*.*")]
+        )
+        if not ruta:
+            return
+        
+        def al_fallar(e):
+            messagebox.showerror("Error", f"Error al importar: {str(e)}")
+        
+        self.ejecutar(lambda: importar_reabastecimiento(ruta, PRODUCTOS_VALIDOS), self.informar_reabastecimiento, al_fallar)
+    
+    def informar_reabastecimiento(self, resultado):
+        """Muestra el resultado de importar un archivo de reabastecimiento"""
+        reporte, cantidades = resultado
+        aplicadas = sum(aceptado for _, aceptado, _ in reporte)
+        mensaje = f"Líneas aplicadas: {aplicadas} de {len(reporte)}\n"
+        for producto, cantidad in cantidades.items():
+            mensaje += f"\n{producto.capitalize()}: nueva cantidad {cantidad}"
+        rechazadas = [f"Línea {linea}: {detalle}" for linea, aceptado, detalle in reporte if not aceptado]
+        if rechazadas:
+            # Solo las primeras para que el mensaje quepa en pantalla
+            mensaje += "\n\nLíneas rechazadas:\n" + "\n".join(rechazadas[:10])
+            if len(rechazadas) > 10:
+                mensaje += f"\n... y {len(rechazadas) - 10} más"
+        messagebox.showinfo("Reabastecimiento", mensaje)
+    
+    def exportar_excel(self):
+        """Exporta el inventario y los trabajos a un archivo Excel elegido por el usuario"""
+        ruta_sugerida = ruta_exportacion()
+        ruta = filedialog.asksaveasfilename(
+            title="Exportar a Excel",
+            initialdir=os.path.dirname(ruta_sugerida),
+            initialfile=os.path.basename(ruta_sugerida),
+            defaultextension=".xlsx",
+            filetypes=[("Libro de Excel", "*.xlsx")]
+        )
+        if not ruta:
+            return
+        
+        def al_terminar(ruta):
+            messagebox.showinfo("Éxito", f"Datos exportados exitosamente en:\n{ruta}")
+        
+        def al_fallar(e):
+            messagebox.showerror("Error", f"Error al exportar: {str(e)}")
+        
+        self.ejecutar(lambda: exportar_excel(ruta), al_terminar, al_fallar)
+    
+    def archivar_trabajos(self):
+        """Pasa al archivo histórico los trabajos de meses cerrados para que el archivo de datos no crezca"""
+        if not messagebox.askyesno(
+                "Archivar trabajos",
+                f"Los trabajos con entrega anterior a los últimos {MESES_VIVOS} meses pasarán al "
+                "archivo histórico.\nSeguirán apareciendo en el historial de cada cliente y en las "
+                "consultas por fechas.\n\n¿Continuar?"):
+            return
+        
+        def al_terminar(archivados):
+            if not archivados:
+                messagebox.showinfo("Archivar trabajos", "No hay trabajos de meses cerrados para archivar")
+                return
+            mensaje = "\n".join(f"{mes}: {cantidad} trabajos" for mes, cantidad in archivados)
+            messagebox.showinfo("Archivar trabajos", f"Trabajos archivados por mes:\n\n{mensaje}")
+        
+        def al_fallar(e):
+            messagebox.showerror("Error", f"Error al archivar: {str(e)}")
+        
+        self.ejecutar(lambda: obtener_conexion().archivar_trabajos(MESES_VIVOS), al_terminar, al_fallar)
     
     def salir(self):
         """Cierra la aplicación"""
         if messagebox.askokcancel("Salir", "¿Está seguro que desea salir?"):
-            self.root.quit()
+            # El guardado final queda detrás de las operaciones que siguen en cola
+            def al_fallar(e):
+                messagebox.showerror("Error", f"Error al guardar los cambios: {str(e)}")
+            
+            self.ejecutar(lambda: obtener_conexion().flush(), lambda _: self.root.quit(), al_fallar)
 
 
 def main():
@@ -638,6 +1166,7 @@ def main():
     root = tk.Tk()
     app = InterfazGrafica(root)
     root.mainloop()
+    app.trabajador.detener()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,142 @@
+"""Lista de materiales: qué consume del inventario cada tipo de trabajo
+
+Un tipo de trabajo nuevo solo necesita una entrada en MATERIALES_POR_TRABAJO:
+
+    "nombre del trabajo": {
+        "piezas": ["playera", "taza"],    # opcional: producto que elige el cliente
+        "unidad": "piezas",               # cómo se pide la cantidad
+        "materiales": [(PIEZA, 1), ("papel impresión", 1)],
+    }
+
+Cada material lleva las unidades que consume por cada pieza del trabajo;
+PIEZA representa el producto elegido entre "piezas".
+"""
+from ConexiónExcel import StockInsuficiente, normalizar
+
+PIEZA = "{pieza}"
+
+
+class MaterialNoEncontrado(ValueError):
+    """Un material que consume el trabajo no está en el inventario"""
+
+    def __init__(self, material):
+        super().__init__(f"El producto {material} no se encuentra en el inventario")
+        self.material = material
+
+
+MATERIALES_POR_TRABAJO = {
+    "corte eléctrico en vinil adhesivo": {
+        "unidad": "hojas de vinil",
+        "materiales": [("vinil", 1)],
+    },
+    "sublimado": {
+        "piezas": ["playera", "taza", "vidrio"],
+        "unidad": "piezas",
+        "materiales": [(PIEZA, 1), ("papel impresión", 1)],
+    },
+}
+
+
+class ReglaMateriales:
+    """Materiales de un tipo de trabajo, preparados para calcular consumos sin recorrer la tabla"""
+
+    def __init__(self, trabajo, materiales, piezas=(), unidad="unidades"):
+        self.trabajo = trabajo
+        self.piezas = tuple(normalizar(pieza) for pieza in piezas)
+        self.unidad = unidad
+        # Los materiales fijos se agrupan por nombre; los de PIEZA se suman aparte
+        fijos = {}
+        for material, unidades in materiales:
+            if material != PIEZA:
+                fijos[normalizar(material)] = fijos.get(normalizar(material), 0) + unidades
+        self._fijos = tuple(fijos.items())
+        self._por_pieza = sum(unidades for material, unidades in materiales if material == PIEZA)
+
+    def consumos(self, cantidad, pieza=None):
+        """Retorna {material: unidades} que consume el trabajo para la cantidad de piezas pedida"""
+        consumos = {}
+        if self.piezas:
+            pieza = normalizar(pieza or "")
+            if pieza not in self.piezas:
+                raise ValueError(f"Producto '{pieza}' no válido para {self.trabajo}. Productos permitidos: {', '.join(self.piezas)}")
+            if self._por_pieza:
+                consumos[pieza] = self._por_pieza * cantidad
+        for material, unidades in self._fijos:
+            consumos[material] = consumos.get(material, 0) + unidades * cantidad
+        return consumos
+
+    @property
+    def materiales(self):
+        """Todos los productos que puede consumir el trabajo, incluidas las piezas a elegir"""
+        return tuple(dict.fromkeys(self.piezas + tuple(material for material, _ in self._fijos)))
+
+    def consumo_promedio(self, cantidad=1):
+        """Retorna {material: unidades} esperadas sin saber qué pieza se elige
+
+        La pieza se reparte en partes iguales entre las permitidas (para
+        pronosticar la demanda, no para descontar).
+        """
+        consumos = {material: unidades * cantidad for material, unidades in self._fijos}
+        if self.piezas and self._por_pieza:
+            for pieza in self.piezas:
+                consumos[pieza] = consumos.get(pieza, 0) + self._por_pieza * cantidad / len(self.piezas)
+        return consumos
+
+
+class ListaMateriales:
+    """Tabla tipo de trabajo -> ReglaMateriales, construida una sola vez"""
+
+    def __init__(self, datos=MATERIALES_POR_TRABAJO):
+        self._reglas = {
+            normalizar(trabajo): ReglaMateriales(
+                normalizar(trabajo), definicion["materiales"],
+                definicion.get("piezas", ()), definicion.get("unidad", "unidades"))
+            for trabajo, definicion in datos.items()
+        }
+
+    @property
+    def trabajos(self):
+        return list(self._reglas)
+
+    @property
+    def materiales(self):
+        """Todos los productos que consume algún trabajo, en el orden de la lista"""
+        return list(dict.fromkeys(material for regla in self._reglas.values() for material in regla.materiales))
+
+    def regla(self, trabajo):
+        """Retorna la regla de un tipo de trabajo"""
+        try:
+            return self._reglas[normalizar(trabajo)]
+        except KeyError:
+            raise ValueError(f"El trabajo '{trabajo}' no es válido. Trabajos permitidos: {', '.join(self._reglas)}")
+
+
+LISTA_MATERIALES = ListaMateriales()
+
+
+def verificar_materiales(conexion, consumos):
+    """Retorna [(material, disponible, solicitado)] de los materiales que no alcanzan
+
+    disponible es None cuando el material no está en el inventario.
+    """
+    faltantes = []
+    for material, solicitado in consumos.items():
+        disponible = conexion.obtener_cantidad(material)
+        if disponible is None or disponible < solicitado:
+            faltantes.append((material, disponible, solicitado))
+    return faltantes
+
+
+def descontar_materiales(conexion, consumos):
+    """Verifica y descuenta todos los materiales en una sola transacción; retorna {material: restante}
+
+    Si alguno no alcanza no se descuenta ninguno.
+    """
+    with conexion.transaccion():
+        faltantes = verificar_materiales(conexion, consumos)
+        if faltantes:
+            material, disponible, solicitado = faltantes[0]
+            if disponible is None:
+                raise MaterialNoEncontrado(material)
+            raise StockInsuficiente(material, disponible, solicitado)
+        return {material: conexion.sumar_cantidad(material, -cantidad) for material, cantidad in consumos.items()}
@@ -0,0 +1,271 @@
+"""Métricas de rendimiento: tiempos, filas leídas y bytes escritos por operación
+
+Están apagadas por defecto; con ellas apagadas cada punto medido solo
+revisa una bandera. Se activan con variables de entorno:
+
+    ARTMARKET_METRICAS=1                   activa las métricas
+    ARTMARKET_UMBRAL_LENTO_MS=500          operaciones más lentas que esto van al registro
+    ARTMARKET_REGISTRO_LENTAS=ruta.jsonl   registro de operaciones lentas (una línea JSON cada una);
+                                           por defecto, operaciones_lentas.jsonl junto al archivo de datos
+
+Uso en el código:
+
+    with medir("excel.recorrer_hoja") as medicion:
+        ...
+        medicion.sumar(filas=cantidad)
+
+    @medido("registrar")
+    def registrar(...): ...
+
+resumen() retorna lo acumulado en el proceso y volcar() lo imprime; el menú,
+la interfaz gráfica (Archivo > Métricas de rendimiento) y el servicio HTTP
+(GET /metricas) lo muestran.
+"""
+import json
+import os
+import threading
+import time
+from bisect import bisect_left
+from datetime import datetime
+from functools import wraps
+
+UMBRAL_LENTO_MS = 500.0
+NOMBRE_LENTAS = "operaciones_lentas.jsonl"
+# En el escritorio, como el archivo de datos por defecto; ubicar_registro_lentas() lo pasa
+# a la carpeta del archivo de datos configurado
+ARCHIVO_LENTAS = os.path.join(os.path.expanduser("~"), "Desktop", NOMBRE_LENTAS)
+
+# Límites superiores (ms) de los grupos del histograma; el último grupo no tiene límite
+LIMITES_MS = (1, 2, 5, 10, 20, 50, 100, 200, 500, 1000, 2000, 5000, 10000, 30000)
+
+
+class Histograma:
+    """Duraciones de una operación agrupadas por rangos, más filas y bytes acumulados"""
+
+    def __init__(self):
+        self.grupos = [0] * (len(LIMITES_MS) + 1)
+        self.llamadas = 0
+        self.errores = 0
+        self.total_ms = 0.0
+        self.max_ms = 0.0
+        self.filas = 0
+        self.bytes = 0
+
+    def registrar(self, duracion_ms, filas, bytes_escritos, error):
+        self.grupos[bisect_left(LIMITES_MS, duracion_ms)] += 1
+        self.llamadas += 1
+        self.errores += error
+        self.total_ms += duracion_ms
+        self.max_ms = max(self.max_ms, duracion_ms)
+        self.filas += filas
+        self.bytes += bytes_escritos
+
+    def percentil(self, porcentaje):
+        """Límite superior del grupo donde cae el percentil (aproximado al rango del histograma)"""
+        objetivo = porcentaje / 100 * self.llamadas
+        acumulado = 0
+        for i, cantidad in enumerate(self.grupos):
+            acumulado += cantidad
+            if cantidad and acumulado >= objetivo:
+                return min(LIMITES_MS[i], self.max_ms) if i < len(LIMITES_MS) else self.max_ms
+        return self.max_ms
+
+    def resumen(self):
+        return {
+            "llamadas": self.llamadas,
+            "errores": self.errores,
+            "total_ms": round(self.total_ms, 3),
+            "media_ms": round(self.total_ms / self.llamadas, 3) if self.llamadas else 0.0,
+            "p50_ms": self.percentil(50),
+            "p90_ms": self.percentil(90),
+            "p99_ms": self.percentil(99),
+            "max_ms": round(self.max_ms, 3),
+            "filas": self.filas,
+            "bytes": self.bytes,
+        }
+
+
+class Medicion:
+    """Mide una operación desde que entra al with hasta que sale"""
+
+    def __init__(self, registro, nombre):
+        self._registro = registro
+        self.nombre = nombre
+        self.filas = 0
+        self.bytes = 0
+
+    def sumar(self, filas=0, bytes_escritos=0):
+        """Suma filas leídas o bytes escritos a la operación"""
+        self.filas += filas
+        self.bytes += bytes_escritos
+
+    def __enter__(self):
+        self._inicio = time.perf_counter()
+        return self
+
+    def __exit__(self, tipo, excepcion, traza):
+        duracion_ms = (time.perf_counter() - self._inicio) * 1000
+        self._registro.registrar(self.nombre, duracion_ms, self.filas, self.bytes, tipo is not None)
+
+
+class MedicionNula:
+    """Medición que no hace nada, para cuando las métricas están apagadas"""
+
+    def sumar(self, filas=0, bytes_escritos=0):
+        pass
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, tipo, excepcion, traza):
+        pass
+
+
+MEDICION_NULA = MedicionNula()
+
+
+class RegistroMetricas:
+    """Histogramas y contadores del proceso, compartidos por todos los hilos"""
+
+    def __init__(self, activadas=False, umbral_lento_ms=UMBRAL_LENTO_MS, archivo_lentas=ARCHIVO_LENTAS):
+        self.activadas = activadas
+        self.umbral_lento_ms = umbral_lento_ms
+        self.archivo_lentas = archivo_lentas
+        self._histogramas = {}
+        self._contadores = {}
+        self._candado = threading.Lock()
+        self._inicio = time.time()
+
+    def registrar(self, nombre, duracion_ms, filas=0, bytes_escritos=0, error=False):
+        with self._candado:
+            histograma = self._histogramas.get(nombre)
+            if histograma is None:
+                histograma = self._histogramas[nombre] = Histograma()
+            histograma.registrar(duracion_ms, filas, bytes_escritos, error)
+        if duracion_ms >= self.umbral_lento_ms:
+            self._anotar_lenta(nombre, duracion_ms, filas, bytes_escritos, error)
+
+    def _anotar_lenta(self, nombre, duracion_ms, filas, bytes_escritos, error):
+        linea = json.dumps({
+            "fecha": datetime.now().isoformat(timespec="milliseconds"),
+            "operacion": nombre,
+            "ms": round(duracion_ms, 3),
+            "filas": filas,
+            "bytes": bytes_escritos,
+            "error": error,
+            "hilo": threading.current_thread().name,
+            "pid": os.getpid(),
+        }, ensure_ascii=False)
+        try:
+            with self._candado, open(self.archivo_lentas, "a", encoding="utf-8") as archivo:
+                archivo.write(linea + "\n")
+        except OSError as e:
+            # El registro de lentas nunca debe hacer fallar la operación medida
+            print(f"No se pudo escribir el registro de operaciones lentas: {e}")
+
+    def contar(self, nombre, cantidad=1):
+        with self._candado:
+            self._contadores[nombre] = self._contadores.get(nombre, 0) + cantidad
+
+    def resumen(self):
+        """Retorna un diccionario con todo lo medido desde el inicio (o el último reinicio)"""
+        with self._candado:
+            return {
+                "activadas": self.activadas,
+                "desde": datetime.fromtimestamp(self._inicio).isoformat(timespec="seconds"),
+                "umbral_lento_ms": self.umbral_lento_ms,
+                "operaciones": {nombre: histograma.resumen()
+                                for nombre, histograma in sorted(self._histogramas.items())},
+                "contadores": dict(sorted(self._contadores.items())),
+            }
+
+    def reiniciar(self):
+        with self._candado:
+            self._histogramas.clear()
+            self._contadores.clear()
+            self._inicio = time.time()
+
+
+def _leer_entorno():
+    activadas = os.environ.get("ARTMARKET_METRICAS", "").lower().strip() in ("1", "si", "sí", "true")
+    try:
+        umbral = float(os.environ.get("ARTMARKET_UMBRAL_LENTO_MS") or UMBRAL_LENTO_MS)
+    except ValueError:
+        umbral = UMBRAL_LENTO_MS
+    return RegistroMetricas(activadas, umbral, os.environ.get("ARTMARKET_REGISTRO_LENTAS") or ARCHIVO_LENTAS)
+
+
+METRICAS = _leer_entorno()
+
+
+def configurar(activadas=None, umbral_lento_ms=None, archivo_lentas=None):
+    """Cambia la configuración de las métricas mientras el programa corre"""
+    if activadas is not None:
+        METRICAS.activadas = activadas
+    if umbral_lento_ms is not None:
+        METRICAS.umbral_lento_ms = umbral_lento_ms
+    if archivo_lentas is not None:
+        METRICAS.archivo_lentas = archivo_lentas
+
+
+def ubicar_registro_lentas(carpeta):
+    """Pone el registro de operaciones lentas en carpeta, salvo que ARTMARKET_REGISTRO_LENTAS indique otro"""
+    if not os.environ.get("ARTMARKET_REGISTRO_LENTAS"):
+        configurar(archivo_lentas=os.path.join(carpeta, NOMBRE_LENTAS))
+
+
+def medir(nombre):
+    """Retorna el with que mide una operación (uno que no hace nada si están apagadas)"""
+    if not METRICAS.activadas:
+        return MEDICION_NULA
+    return Medicion(METRICAS, nombre)
+
+
+def medido(nombre):
+    """Decorador que mide cada llamada a la función"""
+    def decorador(funcion):
+        @wraps(funcion)
+        def envoltura(*args, **kwargs):
+            if not METRICAS.activadas:
+                return funcion(*args, **kwargs)
+            with Medicion(METRICAS, nombre):
+                return funcion(*args, **kwargs)
+        return envoltura
+    return decorador
+
+
+def contar(nombre, cantidad=1):
+    """Suma a un contador simple"""
+    if METRICAS.activadas:
+        METRICAS.contar(nombre, cantidad)
+
+
+def resumen():
+    return METRICAS.resumen()
+
+
+def formatear_resumen(datos=None):
+    """Retorna el resumen como una tabla de texto"""
+    datos = datos or resumen()
+    if not datos["activadas"]:
+        return "Las métricas están desactivadas (active ARTMARKET_METRICAS=1 antes de iniciar el programa)"
+    lineas = [f"Métricas desde {datos['desde']} (umbral de operación lenta: {datos['umbral_lento_ms']} ms)", ""]
+    if not datos["operaciones"]:
+        lineas.append("Todavía no hay operaciones medidas")
+    else:
+        lineas.append(f"{'Operación':<28}{'Llamadas':>9}{'Media ms':>10}{'p90 ms':>9}{'Máx ms':>10}{'Filas':>10}{'Bytes':>12}")
+        for nombre, datos_operacion in datos["operaciones"].items():
+            lineas.append(
+                f"{nombre:<28}{datos_operacion['llamadas']:>9}{datos_operacion['media_ms']:>10.1f}"
+                f"{datos_operacion['p90_ms']:>9.1f}{datos_operacion['max_ms']:>10.1f}"
+                f"{datos_operacion['filas']:>10}{datos_operacion['bytes']:>12}")
+    if datos["contadores"]:
+        lineas.append("")
+        for nombre, valor in datos["contadores"].items():
+            lineas.append(f"{nombre}: {valor}")
+    return "\n".join(lineas)
+
+
+def volcar():
+    """Imprime el resumen de las métricas"""
+    print(formatear_resumen())
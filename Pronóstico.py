@@ -0,0 +1,163 @@
+"""Pronóstico del stock de materiales para los próximos días
+
+Los materiales de un trabajo se descuentan al registrarlo: el stock actual
+ya tiene restados los trabajos registrados, aunque su entrega sea futura.
+Cada fila de Trabajos guarda la cantidad y la pieza que consumió, y con eso
+el pronóstico estima cuánto dura el stock con los trabajos que todavía no
+llegan:
+
+1. Suma lo que consumieron los trabajos entregados en las últimas
+   SEMANAS_HISTORIAL semanas (incluye los meses archivados) por producto y
+   día de la semana: es la demanda esperada de cada día (matriz productos x 7).
+2. Suma lo que ya consumieron los trabajos registrados con entrega dentro
+   del período, por producto y día. Esa parte de la demanda de cada día ya
+   está descontada del stock: solo falta lo que supere lo ya registrado.
+3. La demanda que falta de cada día se acumula y se resta al stock: el
+   resultado es el stock proyectado de cada producto al final de cada día,
+   y el primer día en que queda negativo es la fecha de agotamiento.
+
+Los trabajos registrados antes de guardar la cantidad cuentan como
+unidades_por_trabajo piezas, repartidas en partes iguales entre las piezas
+permitidas.
+
+NumPy es opcional: con NumPy el paso 3 es una suma acumulada sobre la
+matriz productos x días; sin NumPy se hace lo mismo con listas. NumPy se
+importa recién al proyectar para no demorar el inicio del programa.
+"""
+from collections import namedtuple
+from datetime import date, timedelta
+from itertools import accumulate
+
+from Almacenamiento import obtener_conexion
+from Materiales import LISTA_MATERIALES
+from Métricas import medido
+from Índices import ordinal_fecha
+
+DIAS_PRONOSTICO = 365
+SEMANAS_HISTORIAL = 8
+# Piezas que se suponen para los trabajos sin cantidad guardada
+UNIDADES_POR_TRABAJO = 1
+# Decimales del stock proyectado (la demanda esperada no es entera)
+DECIMALES_PRONOSTICO = 6
+
+# proyectado: {producto: stock al final de cada día, desde "desde"}
+# agotamiento: {producto: primer día con stock negativo, o None si alcanza todo el período}
+# demanda_semanal: {producto: unidades esperadas por semana}
+# registrado: {producto: unidades ya descontadas por trabajos con entrega dentro del período}
+Pronostico = namedtuple("Pronostico", ["desde", "dias", "stock", "demanda_semanal", "registrado",
+                                       "proyectado", "agotamiento"])
+
+
+def consumo_de_trabajo(trabajo, cantidad, pieza, unidades_por_trabajo=UNIDADES_POR_TRABAJO):
+    """Retorna {material: unidades} que consumió una fila de Trabajos ({} si el trabajo no es válido)"""
+    try:
+        regla = LISTA_MATERIALES.regla(trabajo or "")
+    except ValueError:
+        return {}
+    if not isinstance(cantidad, (int, float)) or cantidad <= 0:
+        return regla.consumo_promedio(unidades_por_trabajo)
+    try:
+        return regla.consumos(cantidad, pieza)
+    except ValueError:
+        # Pieza que ya no está entre las permitidas
+        return regla.consumo_promedio(cantidad)
+
+
+def demanda_por_dia_semana(consumos, productos, semanas=SEMANAS_HISTORIAL,
+                           unidades_por_trabajo=UNIDADES_POR_TRABAJO):
+    """Retorna {producto: [unidades por día, de lunes a domingo]} a partir de (trabajo, fecha, cantidad, pieza)"""
+    demanda = {producto: [0.0] * 7 for producto in productos}
+    for trabajo, fecha, cantidad, pieza in consumos:
+        ordinal = ordinal_fecha(fecha)
+        if ordinal is None:
+            continue
+        dia = date.fromordinal(ordinal).weekday()
+        for material, unidades in consumo_de_trabajo(trabajo, cantidad, pieza, unidades_por_trabajo).items():
+            if material in demanda:
+                demanda[material][dia] += unidades / semanas
+    return demanda
+
+
+def registrado_por_dia(consumos, productos, desde, dias=DIAS_PRONOSTICO, unidades_por_trabajo=UNIDADES_POR_TRABAJO):
+    """Retorna {producto: {día del período: unidades}} de los trabajos ya registrados con entrega en el período"""
+    registrado = {producto: {} for producto in productos}
+    inicio = desde.toordinal()
+    for trabajo, fecha, cantidad, pieza in consumos:
+        ordinal = ordinal_fecha(fecha)
+        if ordinal is None or not 0 <= ordinal - inicio < dias:
+            continue
+        for material, unidades in consumo_de_trabajo(trabajo, cantidad, pieza, unidades_por_trabajo).items():
+            if material in registrado:
+                por_dia = registrado[material]
+                por_dia[ordinal - inicio] = por_dia.get(ordinal - inicio, 0) + unidades
+    return registrado
+
+
+def proyectar(stock, demanda_semana, desde, dias=DIAS_PRONOSTICO, registrado=None):
+    """Retorna (proyectado, agotamiento) para stock {producto: cantidad} y demanda {producto: [7 días]}
+
+    registrado {producto: {día: unidades}} es la demanda ya descontada del
+    stock en cada día; solo se resta lo que la demanda esperada la supere.
+    proyectado[producto][i] es el stock al final del día desde + i.
+    """
+    productos = list(stock)
+    registrado = registrado or {}
+    try:
+        import numpy
+    except ImportError:
+        numpy = None
+    if numpy is not None:
+        # Día de la semana de cada día del período; la demanda diaria es una columna de la matriz
+        dias_semana = (desde.weekday() + numpy.arange(dias)) % 7
+        semana = numpy.array([demanda_semana[producto] for producto in productos], dtype=float).reshape(len(productos), 7)
+        diaria = semana[:, dias_semana]
+        for i, producto in enumerate(productos):
+            for dia, unidades in registrado.get(producto, {}).items():
+                diaria[i, dia] -= unidades
+        iniciales = numpy.array([stock[producto] for producto in productos], dtype=float)
+        proyectado = numpy.round(iniciales[:, None] - numpy.cumsum(numpy.maximum(diaria, 0), axis=1),
+                                 DECIMALES_PRONOSTICO)
+        negativos = proyectado < 0
+        primeros = negativos.argmax(axis=1)
+        agotados = negativos.any(axis=1)
+        return ({producto: proyectado[i] for i, producto in enumerate(productos)},
+                {producto: desde + timedelta(days=int(primeros[i])) if agotados[i] else None
+                 for i, producto in enumerate(productos)})
+
+    proyectado = {}
+    agotamiento = {}
+    inicio_semana = desde.weekday()
+    for producto in productos:
+        semana = demanda_semana[producto]
+        ya_registrado = registrado.get(producto, {})
+        diaria = (max(semana[(inicio_semana + dia) % 7] - ya_registrado.get(dia, 0), 0) for dia in range(dias))
+        valores = [round(stock[producto] - acumulada, DECIMALES_PRONOSTICO) for acumulada in accumulate(diaria)]
+        proyectado[producto] = valores
+        primero = next((dia for dia, valor in enumerate(valores) if valor < 0), None)
+        agotamiento[producto] = None if primero is None else desde + timedelta(days=primero)
+    return proyectado, agotamiento
+
+
+@medido("pronosticar")
+def pronosticar(conexion=None, dias=DIAS_PRONOSTICO, hoy=None, semanas=SEMANAS_HISTORIAL,
+                unidades_por_trabajo=UNIDADES_POR_TRABAJO):
+    """Pronostica el stock de cada material de la lista de materiales desde hoy"""
+    conexion = conexion or obtener_conexion()
+    hoy = hoy or date.today()
+    productos = LISTA_MATERIALES.materiales
+    stock = {producto: conexion.obtener_cantidad(producto) or 0 for producto in productos}
+
+    recientes = conexion.consumos_entre(hoy - timedelta(weeks=semanas), hoy - timedelta(days=1))
+    demanda_semana = demanda_por_dia_semana(recientes, productos, semanas, unidades_por_trabajo)
+    futuros = conexion.consumos_entre(hoy, hoy + timedelta(days=dias - 1))
+    registrado = registrado_por_dia(futuros, productos, hoy, dias, unidades_por_trabajo)
+    proyectado, agotamiento = proyectar(stock, demanda_semana, hoy, dias, registrado)
+    return Pronostico(
+        desde=hoy,
+        dias=dias,
+        stock=stock,
+        demanda_semanal={producto: round(sum(demanda_semana[producto]), 2) for producto in productos},
+        registrado={producto: round(sum(registrado[producto].values()), 2) for producto in productos},
+        proyectado=proyectado,
+        agotamiento=agotamiento,
+    )
@@ -0,0 +1,111 @@
+"""Registro de trabajos sin interacción
+
+registrar() valida los datos, descuenta los materiales del trabajo y guarda
+la fila en Trabajos en una sola transacción. No pide datos ni imprime nada:
+retorna un Resultado o lanza un error con tipo, para poder usarlo desde el
+menú, la interfaz gráfica, scripts o pruebas de carga.
+
+Para registrar muchos trabajos seguidos conviene agruparlos en una
+transacción externa (with conexion.transaccion(): ...): el diario se
+escribe una sola vez para todo el grupo.
+"""
+from collections import namedtuple
+from datetime import datetime
+
+from Almacenamiento import obtener_conexion
+from ConexiónExcel import normalizar
+from Materiales import LISTA_MATERIALES, descontar_materiales
+from Métricas import medido
+
+# Resultado de un registro: consumos y restantes son {material: cantidad}
+Resultado = namedtuple("Resultado", ["cliente", "trabajo", "fecha", "consumos", "restantes"])
+
+
+class DatosInvalidos(ValueError):
+    """Un dato del trabajo no cumple las reglas; campo indica cuál"""
+
+    def __init__(self, campo, mensaje):
+        super().__init__(mensaje)
+        self.campo = campo
+
+
+def validar_cliente(valor):
+    """Retorna el cliente si es un texto no vacío"""
+    if not isinstance(valor, str):
+        raise DatosInvalidos("cliente", "El cliente debe ser un texto")
+    if len(valor.strip()) == 0:
+        raise DatosInvalidos("cliente", "El cliente no puede estar vacío")
+    return valor
+
+
+def validar_trabajo(valor):
+    """Retorna el tipo de trabajo en minúsculas si está en la lista de materiales"""
+    if not isinstance(valor, str):
+        raise DatosInvalidos("trabajo", "El trabajo pendiente debe ser un texto")
+    valor_minuscula = valor.lower().strip()
+    if len(valor_minuscula) == 0:
+        raise DatosInvalidos("trabajo", "El trabajo pendiente no puede estar vacío")
+    if valor_minuscula not in LISTA_MATERIALES.trabajos:
+        raise DatosInvalidos("trabajo", f"El trabajo '{valor}' no es válido. Trabajos permitidos: {', '.join(LISTA_MATERIALES.trabajos)}")
+    return valor_minuscula
+
+
+def validar_fecha(valor):
+    """Retorna la fecha (datetime) de un texto con formato dd-mm-yyyy"""
+    if not isinstance(valor, str):
+        raise DatosInvalidos("fecha", "La fecha debe ser un texto")
+    if valor.count('-') != 2:
+        raise DatosInvalidos("fecha", "La fecha debe tener el formato dd-mm-yyyy")
+    partes = valor.split('-')
+    if len(partes[0]) != 2 or len(partes[1]) != 2 or len(partes[2]) != 4:
+        raise DatosInvalidos("fecha", "El formato debe ser dd-mm-yyyy (ejemplo: 25-12-2024)")
+    try:
+        return datetime.strptime(valor, "%d-%m-%Y")
+    except ValueError as e:
+        raise DatosInvalidos("fecha", str(e))
+
+
+def validar_cantidad(valor):
+    """Retorna la cantidad como número si es mayor a cero"""
+    try:
+        cantidad = float(valor)
+    except (TypeError, ValueError):
+        raise DatosInvalidos("cantidad", f"La cantidad '{valor}' debe ser un número válido")
+    if cantidad <= 0:
+        raise DatosInvalidos("cantidad", "La cantidad debe ser mayor a cero")
+    return cantidad
+
+
+def calcular_consumos(trabajo, cantidad, pieza=None):
+    """Retorna {material: unidades} que consume un trabajo ya validado"""
+    regla = LISTA_MATERIALES.regla(trabajo)
+    try:
+        consumos = regla.consumos(cantidad, pieza)
+    except ValueError as e:
+        raise DatosInvalidos("pieza", str(e))
+    if not regla.piezas and pieza and pieza.lower().strip() not in consumos:
+        raise DatosInvalidos("pieza", f"El trabajo {trabajo} no usa el producto '{pieza}'")
+    return consumos
+
+
+@medido("registrar")
+def registrar(cliente, trabajo, fecha, cantidad, pieza=None, conexion=None):
+    """Registra un trabajo y descuenta sus materiales en una sola transacción
+
+    Lanza DatosInvalidos, MaterialNoEncontrado, StockInsuficiente o
+    ConflictoConcurrencia; si falla no se guarda ningún cambio.
+    """
+    cliente = validar_cliente(cliente)
+    trabajo = validar_trabajo(trabajo)
+    fecha = validar_fecha(fecha).strftime("%d-%m-%Y")
+    cantidad = validar_cantidad(cantidad)
+    consumos = calcular_consumos(trabajo, cantidad, pieza)
+    # La fila guarda la cantidad y la pieza para pronosticar el consumo de materiales
+    cantidad = int(cantidad) if cantidad.is_integer() else cantidad
+    pieza = normalizar(pieza) if pieza and LISTA_MATERIALES.regla(trabajo).piezas else None
+
+    conexion = conexion or obtener_conexion()
+    with conexion.transaccion():
+        restantes = descontar_materiales(conexion, consumos)
+        conexion.agregar_trabajo(cliente, trabajo, fecha, cantidad, pieza)
+    return Resultado(cliente, trabajo, fecha, consumos, restantes)
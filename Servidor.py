@@ -0,0 +1,353 @@
+"""Servicio local HTTP/JSON para el inventario y los trabajos
+
+Un solo proceso es dueño del archivo de datos y las estaciones de la tienda
+le hacen pedidos por HTTP en lugar de abrir el archivo cada una. Uso:
+
+    python Servidor.py [--host 127.0.0.1] [--puerto 8765]
+
+    GET  /inventario                 lista de productos y cantidades
+    GET  /inventario/<producto>      stock de un producto (404 si no existe)
+    GET  /trabajos?inicio=0&cantidad=100
+    GET  /metricas                   tiempos de las operaciones (con ARTMARKET_METRICAS=1)
+    POST /inventario                 {"producto": "taza", "cantidad": 5} o {"lineas": [...]}
+    POST /trabajos                   {"cliente", "trabajo", "fecha", "cantidad", "pieza"}
+
+El stock se guarda en memoria con un candado por producto: dos pedidos
+sobre productos distintos no se esperan entre sí. Los cambios se pasan a
+un único hilo escritor, que agrupa los pedidos que llegan juntos en una
+sola transacción del almacenamiento.
+"""
+import argparse
+import json
+import queue
+import threading
+from concurrent.futures import Future
+from contextlib import contextmanager
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+
+from Almacenamiento import ConflictoConcurrencia, StockInsuficiente, obtener_conexion
+from Clases import Inventario
+from ConexiónExcel import normalizar
+from Materiales import MaterialNoEncontrado
+from Métricas import medido, medir, resumen
+from Registro import (DatosInvalidos, calcular_consumos, registrar, validar_cantidad, validar_cliente,
+                      validar_fecha, validar_trabajo)
+
+HOST = "127.0.0.1"
+PUERTO = 8765
+
+# Pedidos que el escritor guarda como máximo en una misma transacción
+MAX_LOTE = 500
+
+# Filas de Trabajos por página si el pedido no indica cantidad
+FILAS_POR_PAGINA = 100
+
+
+class CandadosPorProducto:
+    """Un candado por producto, creado la primera vez que se usa"""
+
+    def __init__(self):
+        self._candados = {}
+        self._candado = threading.Lock()
+
+    @contextmanager
+    def tomar(self, productos):
+        """Toma los candados de varios productos a la vez"""
+        with self._candado:
+            candados = [self._candados.setdefault(producto, threading.Lock())
+                        for producto in sorted(set(productos))]
+        # Siempre en orden alfabético: dos pedidos con productos en común no se bloquean mutuamente
+        for candado in candados:
+            candado.acquire()
+        try:
+            yield
+        finally:
+            for candado in reversed(candados):
+                candado.release()
+
+
+class ServicioInventario:
+    """Estado del inventario en memoria con un único hilo escritor hacia el almacenamiento"""
+
+    def __init__(self, conexion=None, max_lote=MAX_LOTE):
+        self.conexion = conexion or obtener_conexion()
+        self.max_lote = max_lote
+        self.candados = CandadosPorProducto()
+        self._stock = {}
+        # Futuro de cada pedido en cola -> {producto: cambio} que ya está en _stock pero no en el almacenamiento
+        self._reservas = {}
+        self._candado_reservas = threading.Lock()
+        self._recargar()
+        self._cola = queue.Queue()
+        self._escritor = threading.Thread(target=self._escribir, name="escritor", daemon=True)
+        self._escritor.start()
+
+    def _recargar(self):
+        """Vuelve a leer el stock del almacenamiento, conservando lo reservado por los pedidos en cola"""
+        stock = {}
+        for producto, cantidad in self.conexion.iterar_inventario():
+            if producto:
+                # Con productos repetidos vale la primera fila, como en el índice del Excel
+                stock.setdefault(normalizar(producto), cantidad or 0)
+        with self.candados.tomar(set(stock) | set(self._stock)), self._candado_reservas:
+            for cambios in self._reservas.values():
+                for producto, cambio in cambios.items():
+                    stock[producto] = stock.get(producto, 0) + cambio
+            self._stock = stock
+
+    def _reservar(self, cambios):
+        """Aplica los cambios al stock en memoria hasta que el escritor los guarde; retorna el futuro del pedido
+
+        Se llama con los candados de los productos tomados.
+        """
+        futuro = Future()
+        with self._candado_reservas:
+            for producto, cambio in cambios.items():
+                self._stock[producto] = self._stock.get(producto, 0) + cambio
+            self._reservas[futuro] = cambios
+        return futuro
+
+    def _liberar(self, futuros):
+        """Olvida las reservas de pedidos ya guardados o descartados"""
+        with self._candado_reservas:
+            for futuro in futuros:
+                self._reservas.pop(futuro, None)
+
+    # Lecturas
+
+    def consultar(self, producto):
+        """Retorna la cantidad en stock de un producto, o None si no está en el inventario"""
+        return self._stock.get(normalizar(producto))
+
+    def listar(self):
+        """Retorna [(producto, cantidad)] del inventario"""
+        return list(self._stock.items())
+
+    def trabajos(self, inicio, cantidad):
+        """Retorna (total, filas) de una página de Trabajos"""
+        return self.conexion.contar_trabajos(), self.conexion.leer_pagina_trabajos(inicio, cantidad)
+
+    # Escrituras
+
+    @medido("servidor.reabastecer")
+    def reabastecer(self, lineas):
+        """Suma las cantidades {producto: cantidad} al stock y retorna las nuevas cantidades"""
+        totales = {}
+        for producto, cantidad in lineas:
+            nombre = normalizar(producto)
+            if nombre not in Inventario.PRODUCTOS_VALIDOS:
+                raise DatosInvalidos("producto", f"El producto '{producto}' no es válido. Productos permitidos: {', '.join(Inventario.PRODUCTOS_VALIDOS)}")
+            totales[nombre] = totales.get(nombre, 0) + validar_cantidad(cantidad)
+
+        with self.candados.tomar(totales):
+            futuro = self._reservar(totales)
+        return self._encolar("reabastecer", totales, futuro).result()
+
+    @medido("servidor.registrar")
+    def registrar(self, cliente, trabajo, fecha, cantidad, pieza=None):
+        """Registra un trabajo descontando sus materiales; retorna el Resultado de registrar()"""
+        validar_cliente(cliente)
+        trabajo = validar_trabajo(trabajo)
+        validar_fecha(fecha)
+        consumos = calcular_consumos(trabajo, validar_cantidad(cantidad), pieza)
+
+        # El stock se reserva en memoria bajo el candado de cada material; el
+        # escritor lo guarda después sin bloquear pedidos de otros productos
+        with self.candados.tomar(consumos):
+            for material, solicitado in consumos.items():
+                disponible = self._stock.get(material)
+                if disponible is None:
+                    raise MaterialNoEncontrado(material)
+                if disponible < solicitado:
+                    raise StockInsuficiente(material, disponible, solicitado)
+            futuro = self._reservar({material: -solicitado for material, solicitado in consumos.items()})
+        return self._encolar("registrar", (cliente, trabajo, fecha, cantidad, pieza), futuro).result()
+
+    def _encolar(self, operacion, datos, futuro):
+        self._cola.put((operacion, datos, futuro))
+        return futuro
+
+    def _escribir(self):
+        while True:
+            pedido = self._cola.get()
+            if pedido is None:
+                return
+            # Los pedidos que esperan en la cola se guardan en la misma transacción
+            lote = [pedido]
+            while len(lote) < self.max_lote:
+                try:
+                    siguiente = self._cola.get_nowait()
+                except queue.Empty:
+                    break
+                if siguiente is None:
+                    self._cola.put(None)
+                    break
+                lote.append(siguiente)
+            with medir("servidor.guardar_lote") as medicion:
+                self._guardar_lote(lote)
+                medicion.sumar(filas=len(lote))
+
+    def _guardar_lote(self, lote):
+        respuestas = []
+        try:
+            with self.conexion.transaccion():
+                for operacion, datos, futuro in lote:
+                    try:
+                        # Cada pedido en su propio punto de retorno: si falla solo se deshace ese
+                        with self.conexion.transaccion():
+                            respuestas.append((futuro, self._aplicar(operacion, datos), None))
+                    except Exception as e:
+                        self._compensar(futuro)
+                        respuestas.append((futuro, None, e))
+        except Exception as e:
+            # No se guardó nada del lote (por ejemplo, otra estación cambió el archivo): se
+            # relee el stock y solo quedan aplicadas las reservas de los pedidos que siguen en cola
+            self._liberar(futuro for _, _, futuro in lote)
+            self._recargar()
+            for _, _, futuro in lote:
+                futuro.set_exception(e)
+            return
+        self._liberar(futuro for _, _, futuro in lote)
+
+        for futuro, resultado, error in respuestas:
+            if error is None:
+                futuro.set_result(resultado)
+            else:
+                futuro.set_exception(error)
+
+    def _aplicar(self, operacion, datos):
+        if operacion == "reabastecer":
+            return {producto: self.conexion.sumar_cantidad(producto, cantidad) for producto, cantidad in datos.items()}
+        cliente, trabajo, fecha, cantidad, pieza = datos
+        return registrar(cliente, trabajo, fecha, cantidad, pieza, self.conexion)
+
+    def _compensar(self, futuro):
+        """Devuelve al stock en memoria lo reservado por un pedido que no se pudo guardar"""
+        cambios = self._reservas.get(futuro, {})
+        with self.candados.tomar(cambios), self._candado_reservas:
+            for producto, cambio in cambios.items():
+                self._stock[producto] = self._stock.get(producto, 0) - cambio
+            self._reservas.pop(futuro, None)
+
+    def cerrar(self):
+        """Guarda los pedidos pendientes y cierra el almacenamiento"""
+        self._cola.put(None)
+        self._escritor.join()
+        self.conexion.cerrar()
+
+
+class ManejadorPeticiones(BaseHTTPRequestHandler):
+    """Traduce los pedidos HTTP a llamadas al ServicioInventario"""
+
+    @property
+    def servicio(self):
+        return self.server.servicio
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        partes = [unquote(parte) for parte in url.path.strip("/").split("/") if parte]
+        try:
+            if partes == ["inventario"]:
+                productos = [{"producto": producto, "cantidad": cantidad} for producto, cantidad in self.servicio.listar()]
+                self._responder(200, {"total": len(productos), "productos": productos})
+            elif len(partes) == 2 and partes[0] == "inventario":
+                cantidad = self.servicio.consultar(partes[1])
+                if cantidad is None:
+                    self._responder(404, {"error": f"El producto {partes[1]} no está en el almacén"})
+                else:
+                    self._responder(200, {"producto": normalizar(partes[1]), "cantidad": cantidad})
+            elif partes == ["metricas"]:
+                self._responder(200, resumen())
+            elif partes == ["trabajos"]:
+                parametros = parse_qs(url.query)
+                inicio = int(parametros.get("inicio", ["0"])[0])
+                cantidad = int(parametros.get("cantidad", [str(FILAS_POR_PAGINA)])[0])
+                total, filas = self.servicio.trabajos(max(inicio, 0), max(cantidad, 0))
+                trabajos = [{"cliente": cliente, "trabajo": trabajo, "fecha": fecha} for cliente, trabajo, fecha in filas]
+                self._responder(200, {"total": total, "inicio": inicio, "trabajos": trabajos})
+            else:
+                self._responder(404, {"error": "Ruta no encontrada"})
+        except ValueError as e:
+            self._responder(400, {"error": str(e)})
+        except Exception as e:
+            self._responder(500, {"error": str(e)})
+
+    def do_POST(self):
+        partes = [parte for parte in urlparse(self.path).path.strip("/").split("/") if parte]
+        try:
+            datos = self._leer_json()
+            if partes == ["inventario"]:
+                lineas = datos.get("lineas", [datos])
+                if not isinstance(lineas, list) or not all(isinstance(linea, dict) for linea in lineas):
+                    raise DatosInvalidos("lineas", 'lineas debe ser una lista de objetos {"producto", "cantidad"}')
+                cantidades = self.servicio.reabastecer((linea.get("producto", ""), linea.get("cantidad")) for linea in lineas)
+                self._responder(200, {"cantidades": cantidades})
+            elif partes == ["trabajos"]:
+                resultado = self.servicio.registrar(
+                    datos.get("cliente"), datos.get("trabajo"), datos.get("fecha"),
+                    datos.get("cantidad"), datos.get("pieza"))
+                self._responder(201, resultado._asdict())
+            else:
+                self._responder(404, {"error": "Ruta no encontrada"})
+        except DatosInvalidos as e:
+            self._responder(400, {"error": str(e), "campo": e.campo})
+        except MaterialNoEncontrado as e:
+            self._responder(404, {"error": str(e), "material": e.material})
+        except StockInsuficiente as e:
+            self._responder(409, {"error": str(e), "material": e.producto,
+                                  "disponible": e.disponible, "solicitado": e.solicitado})
+        except ConflictoConcurrencia as e:
+            self._responder(409, {"error": str(e)})
+        except ValueError as e:
+            self._responder(400, {"error": str(e)})
+        except Exception as e:
+            self._responder(500, {"error": str(e)})
+
+    def _leer_json(self):
+        longitud = int(self.headers.get("Content-Length") or 0)
+        try:
+            datos = json.loads(self.rfile.read(longitud) or b"{}")
+        except ValueError:
+            raise ValueError("El cuerpo del pedido no es un JSON válido")
+        if not isinstance(datos, dict):
+            raise ValueError("El cuerpo del pedido debe ser un objeto JSON")
+        return datos
+
+    def _responder(self, estado, datos):
+        cuerpo = json.dumps(datos, ensure_ascii=False).encode("utf-8")
+        self.send_response(estado)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(cuerpo)))
+        self.end_headers()
+        self.wfile.write(cuerpo)
+
+
+def crear_servidor(host=HOST, puerto=PUERTO, servicio=None):
+    """Crea el servidor HTTP (puerto 0 elige uno libre); se inicia con serve_forever()"""
+    servidor = ThreadingHTTPServer((host, puerto), ManejadorPeticiones)
+    servidor.daemon_threads = True
+    servidor.servicio = servicio or ServicioInventario()
+    return servidor
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Servicio local HTTP/JSON del inventario")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--puerto", type=int, default=PUERTO)
+    argumentos = parser.parse_args()
+
+    obtener_conexion().inicializar()
+    servidor = crear_servidor(argumentos.host, argumentos.puerto)
+    print(f"Servicio de inventario en http://{argumentos.host}:{servidor.server_address[1]} (Ctrl+C para salir)")
+    try:
+        servidor.serve_forever()
+    except KeyboardInterrupt:
+        print("\nCerrando el servicio...")
+    finally:
+        servidor.server_close()
+        servidor.servicio.cerrar()
+
+
+if __name__ == "__main__":
+    main()
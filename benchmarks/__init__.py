@@ -0,0 +1 @@
+"""Mediciones de rendimiento del sistema (se ejecutan con python -m benchmarks.<nombre>)"""
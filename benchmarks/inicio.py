@@ -0,0 +1,88 @@
+"""Tiempo de arranque: importar Clases y responder una consulta de stock
+
+Cada repetición se mide en un proceso nuevo, porque lo que importa es el
+arranque en frío del programa. Uso:
+
+    python -m benchmarks.inicio [--trabajos 10000] [--repeticiones 5] [--motor excel]
+"""
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Código que corre cada proceso medido: imprime los milisegundos de cada etapa
+MEDICION = """
+import time
+inicio = time.perf_counter()
+import Clases
+importado = time.perf_counter()
+import sys
+openpyxl_al_importar = "openpyxl" in sys.modules
+cantidad = Clases.obtener_conexion().obtener_cantidad("vinil")
+consultado = time.perf_counter()
+print((importado - inicio) * 1000, (consultado - importado) * 1000, openpyxl_al_importar, cantidad)
+"""
+
+
+def crear_datos(carpeta, motor, trabajos):
+    """Crea un archivo de datos con el inventario básico y la cantidad de trabajos pedida"""
+    sys.path.insert(0, RAIZ)
+    from Almacenamiento import crear_conexion
+
+    archivo = os.path.join(carpeta, "base_datos.xlsx" if motor == "excel" else "base_datos.sqlite3")
+    conexion = crear_conexion(motor, archivo)
+    conexion.inicializar()
+    with conexion.transaccion():
+        for producto in ("playera", "taza", "papel sublimado", "vidrio", "papel impresión", "vinil"):
+            conexion.agregar_producto(producto, 100)
+        for i in range(trabajos):
+            conexion.agregar_trabajo(f"Cliente {i}", "sublimado", "01-01-2026")
+    conexion.cerrar()
+    return archivo
+
+
+def medir(archivo, motor, repeticiones):
+    """Ejecuta la medición en procesos nuevos y retorna los tiempos de cada uno"""
+    entorno = dict(os.environ, ARTMARKET_MOTOR=motor, ARTMARKET_ARCHIVO=archivo)
+    resultados = []
+    for _ in range(repeticiones):
+        salida = subprocess.run([sys.executable, "-c", MEDICION], cwd=RAIZ, env=entorno,
+                                capture_output=True, text=True, check=True).stdout.split()
+        resultados.append({
+            "importar_ms": float(salida[0]),
+            "consulta_ms": float(salida[1]),
+            "openpyxl_al_importar": salida[2] == "True",
+        })
+    return resultados
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide el arranque de Clases y la primera consulta de stock")
+    parser.add_argument("--trabajos", type=int, default=10000)
+    parser.add_argument("--repeticiones", type=int, default=5)
+    parser.add_argument("--motor", choices=["excel", "sqlite"], default="excel")
+    argumentos = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as carpeta:
+        archivo = crear_datos(carpeta, argumentos.motor, argumentos.trabajos)
+        resultados = medir(archivo, argumentos.motor, argumentos.repeticiones)
+
+    reporte = {
+        "motor": argumentos.motor,
+        "trabajos": argumentos.trabajos,
+        "repeticiones": argumentos.repeticiones,
+        "importar_ms_mediana": statistics.median(r["importar_ms"] for r in resultados),
+        "consulta_ms_mediana": statistics.median(r["consulta_ms"] for r in resultados),
+        "openpyxl_al_importar": any(r["openpyxl_al_importar"] for r in resultados),
+        "mediciones": resultados,
+    }
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
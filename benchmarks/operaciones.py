@@ -0,0 +1,248 @@
+"""Latencia y memoria de las operaciones principales con archivos sintéticos
+
+Genera un archivo de datos por cada tamaño pedido (N productos en Inventario
+y N trabajos en Trabajos) y mide cada operación en un proceso nuevo, sobre
+una copia del archivo, para que las escrituras de una no afecten a las
+demás y el pico de memoria sea solo de esa operación. Uso:
+
+    python -m benchmarks.operaciones [--filas 1000 10000 100000] [--repeticiones 10]
+                                     [--motor excel] [--operaciones mostrar_almacen ...]
+
+Cada operación se repite en dos series:
+
+    frio        antes de cada repetición se descarta la copia en memoria
+                (conexion.invalidar()), como al abrir el programa
+    caliente    la copia en memoria queda de la repetición anterior
+
+y en cada repetición, después de la operación, se mide aparte el flush()
+que guarda en el archivo lo que la escritura diferida dejó pendiente
+(guardado_ms). Así las escrituras no quedan medidas solo hasta el diario.
+
+Imprime un JSON con percentiles de latencia (ms) de la operación y del
+guardado en frío y en caliente, el pico de memoria del proceso y el tamaño
+del archivo.
+"""
+import argparse
+import contextlib
+import json
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+RAIZ = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+PRODUCTOS_BASE = ("playera", "taza", "papel sublimado", "vidrio", "papel impresión", "vinil")
+
+# Filas que lee la ventana de trabajos al abrirse: las visibles más el margen de precarga
+FILAS_VENTANA = 12 + 100
+
+
+def _mostrar_almacen():
+    from Clases import Mostrar_almacen
+    Mostrar_almacen()
+
+
+def _buscar_en_almacen():
+    from Clases import Buscar_en_almacen
+    Buscar_en_almacen("vinil")
+
+
+def _guardar_trabajo():
+    from Clases import Trabajo
+    Trabajo("Cliente de prueba", "sublimado", "01-01-2026").guardar_en_excel()
+
+
+def _guardar_inventario():
+    from Clases import Inventario
+    Inventario("vinil", 1)
+
+
+def _ventana_ver_trabajos():
+    # Lo que pide al almacenamiento ventana_ver_trabajos: el total y la primera página
+    from Almacenamiento import obtener_conexion
+    conexion = obtener_conexion()
+    conexion.contar_trabajos()
+    conexion.leer_pagina_trabajos(0, FILAS_VENTANA)
+
+
+def _desplazar_trabajos():
+    # Saltar a la mitad de la tabla de trabajos
+    from Almacenamiento import obtener_conexion
+    conexion = obtener_conexion()
+    conexion.leer_pagina_trabajos(conexion.contar_trabajos() // 2, FILAS_VENTANA)
+
+
+OPERACIONES = {
+    "mostrar_almacen": _mostrar_almacen,
+    "buscar_en_almacen": _buscar_en_almacen,
+    "guardar_trabajo": _guardar_trabajo,
+    "guardar_inventario": _guardar_inventario,
+    "ventana_ver_trabajos": _ventana_ver_trabajos,
+    "desplazar_trabajos": _desplazar_trabajos,
+}
+
+# Código que corre cada proceso medido: imprime el JSON de medir_en_proceso()
+MEDICION = """
+import json, sys
+from benchmarks.operaciones import medir_en_proceso
+print(json.dumps(medir_en_proceso(sys.argv[1], int(sys.argv[2]))))
+"""
+
+
+def crear_datos(carpeta, motor, filas):
+    """Crea un archivo de datos con filas productos y filas trabajos"""
+    sys.path.insert(0, RAIZ)
+    from Almacenamiento import crear_conexion
+
+    archivo = os.path.join(carpeta, f"base_datos_{filas}" + (".xlsx" if motor == "excel" else ".sqlite3"))
+    conexion = crear_conexion(motor, archivo)
+    conexion.inicializar()
+    with conexion.transaccion():
+        for producto in PRODUCTOS_BASE:
+            conexion.agregar_producto(producto, 1000)
+        for i in range(max(filas - len(PRODUCTOS_BASE), 0)):
+            conexion.agregar_producto(f"material {i:06d}", i % 500)
+        trabajos = ("sublimado", "corte eléctrico en vinil adhesivo")
+        for i in range(filas):
+            conexion.agregar_trabajo(f"Cliente {i % 2000}", trabajos[i % 2], f"{i % 28 + 1:02d}-{i % 12 + 1:02d}-2026")
+    conexion.cerrar()
+    return archivo
+
+
+def tamano_archivo(archivo):
+    """Bytes del archivo de datos más su diario de cambios, si lo tiene"""
+    total = 0
+    for ruta in (archivo, os.path.splitext(archivo)[0] + ".diario"):
+        if os.path.exists(ruta):
+            total += os.path.getsize(ruta)
+    return total
+
+
+def memoria_pico_mb():
+    """Pico de memoria residente del proceso en MB, o None si el sistema no lo informa"""
+    # En Linux ru_maxrss conserva el pico del proceso padre al crear el hijo; VmHWM no
+    try:
+        with open("/proc/self/status", encoding="ascii") as estado:
+            for linea in estado:
+                if linea.startswith("VmHWM:"):
+                    return int(linea.split()[1]) / 1024
+    except OSError:
+        pass
+    try:
+        import resource
+    except ImportError:
+        return None
+    pico = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # macOS lo informa en bytes y el resto en KB
+    return pico / (1024 * 1024) if sys.platform == "darwin" else pico / 1024
+
+
+def _repetir(operacion, conexion, repeticiones, en_frio):
+    """Retorna (tiempos de la operación, tiempos del flush posterior) en ms"""
+    tiempos = []
+    guardados = []
+    for _ in range(repeticiones):
+        if en_frio:
+            conexion.invalidar()
+        inicio = time.perf_counter()
+        operacion()
+        tiempos.append((time.perf_counter() - inicio) * 1000)
+        inicio = time.perf_counter()
+        conexion.flush()
+        guardados.append((time.perf_counter() - inicio) * 1000)
+    return tiempos, guardados
+
+
+def medir_en_proceso(nombre, repeticiones):
+    """Ejecuta una operación varias veces en este proceso, en frío y en caliente; retorna tiempos y memoria"""
+    operacion = OPERACIONES[nombre]
+    # La importación no forma parte de la medición
+    import Clases
+    conexion = Clases.obtener_conexion()
+    memoria_base = memoria_pico_mb()
+
+    datos = {}
+    with open(os.devnull, "w", encoding="utf-8") as nulo:
+        salida, sys.stdout = sys.stdout, nulo
+        try:
+            for modo, en_frio in (("frio", True), ("caliente", False)):
+                datos[modo], datos[modo + "_guardado"] = _repetir(operacion, conexion, repeticiones, en_frio)
+        finally:
+            sys.stdout = salida
+
+    conexion.cerrar()
+    return {"tiempos_ms": datos, "memoria_base_mb": memoria_base, "memoria_pico_mb": memoria_pico_mb()}
+
+
+def percentil(valores, porcentaje):
+    """Percentil por rango más cercano de una lista ordenada"""
+    indice = max(int(round(porcentaje / 100 * len(valores) + 0.5)) - 1, 0)
+    return valores[min(indice, len(valores) - 1)]
+
+
+def resumir(tiempos):
+    """Resume la lista de tiempos de una operación"""
+    ordenados = sorted(tiempos)
+    return {
+        "primera_ms": tiempos[0],
+        "p50_ms": percentil(ordenados, 50),
+        "p90_ms": percentil(ordenados, 90),
+        "p99_ms": percentil(ordenados, 99),
+        "max_ms": ordenados[-1],
+        "media_ms": sum(ordenados) / len(ordenados),
+    }
+
+
+def medir(archivo, motor, nombre, repeticiones, carpeta):
+    """Mide una operación en un proceso nuevo sobre una copia del archivo"""
+    copia = os.path.join(carpeta, nombre + os.path.splitext(archivo)[1])
+    shutil.copyfile(archivo, copia)
+    entorno = dict(os.environ, ARTMARKET_MOTOR=motor, ARTMARKET_ARCHIVO=copia)
+    entorno["PYTHONPATH"] = os.pathsep.join(filter(None, [RAIZ, entorno.get("PYTHONPATH")]))
+    salida = subprocess.run([sys.executable, "-c", MEDICION, nombre, str(repeticiones)], cwd=RAIZ,
+                            env=entorno, capture_output=True, text=True, check=True).stdout
+    datos = json.loads(salida.strip().splitlines()[-1])
+
+    reporte = {modo: resumir(tiempos) for modo, tiempos in datos["tiempos_ms"].items()}
+    reporte["memoria_base_mb"] = datos["memoria_base_mb"]
+    reporte["memoria_pico_mb"] = datos["memoria_pico_mb"]
+    reporte["archivo_final_bytes"] = tamano_archivo(copia)
+    return reporte
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Mide las operaciones principales con archivos sintéticos")
+    parser.add_argument("--filas", type=int, nargs="+", default=[1000, 10000, 100000])
+    parser.add_argument("--repeticiones", type=int, default=10)
+    parser.add_argument("--motor", choices=["excel", "sqlite"], default="excel")
+    parser.add_argument("--operaciones", nargs="+", choices=list(OPERACIONES), default=list(OPERACIONES))
+    argumentos = parser.parse_args()
+
+    resultados = []
+    for filas in argumentos.filas:
+        with tempfile.TemporaryDirectory() as carpeta:
+            inicio = time.perf_counter()
+            # Los mensajes del programa van a stderr para que stdout sea solo el JSON
+            with contextlib.redirect_stdout(sys.stderr):
+                archivo = crear_datos(carpeta, argumentos.motor, filas)
+            print(f"Archivo de {filas} filas creado en {time.perf_counter() - inicio:.1f} s", file=sys.stderr)
+            tamano = tamano_archivo(archivo)
+            operaciones = {}
+            for nombre in argumentos.operaciones:
+                operaciones[nombre] = medir(archivo, argumentos.motor, nombre, argumentos.repeticiones, carpeta)
+            resultados.append({"filas": filas, "archivo_bytes": tamano, "operaciones": operaciones})
+
+    reporte = {
+        "motor": argumentos.motor,
+        "repeticiones": argumentos.repeticiones,
+        "python": sys.version.split()[0],
+        "resultados": resultados,
+    }
+    print(json.dumps(reporte, indent=2, ensure_ascii=False))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,27 @@
+import os
+import sys
+
+import pytest
+
+# Los módulos del programa están en la raíz del repositorio, no en un paquete
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ConexiónExcel import ConexionExcel  # noqa: E402
+
+
+@pytest.fixture
+def archivo_excel(tmp_path):
+    """Archivo de datos nuevo con vinil y taza en el Inventario"""
+    archivo = str(tmp_path / "base_datos.xlsx")
+    conexion = abrir(archivo)
+    conexion.inicializar()
+    with conexion.transaccion():
+        conexion.agregar_producto("vinil", 100)
+        conexion.agregar_producto("taza", 20)
+    conexion.flush()
+    return archivo
+
+
+def abrir(archivo):
+    """Conexión al Excel que solo compacta cuando la prueba llama a flush()"""
+    return ConexionExcel(archivo, retardo=3600, espera_maxima=3600, max_cambios=10 ** 6)
@@ -0,0 +1,53 @@
+import json
+
+from Alertas import MonitorStock
+
+
+def _monitor(tmp_path):
+    # Umbral 10 y margen 0.2: sale de la alerta con más de 12 unidades
+    return MonitorStock({"vinil": 10}, margen=0.2, archivo=str(tmp_path / "alertas.jsonl"))
+
+
+def test_alerta_al_llegar_al_umbral(tmp_path):
+    monitor = _monitor(tmp_path)
+    assert monitor.revisar({"vinil": 11}) == []
+    nuevas = monitor.revisar({"Vinil": 10})
+    assert [(alerta.tipo, alerta.producto, alerta.cantidad) for alerta in nuevas] == [("bajo", "vinil", 10)]
+    assert [alerta.producto for alerta in monitor.activas()] == ["vinil"]
+
+
+def test_alerta_se_rearma_solo_al_superar_umbral_mas_margen(tmp_path):
+    monitor = _monitor(tmp_path)
+    monitor.revisar({"vinil": 8})
+    # Sube, pero sin pasar de umbral + margen: sigue en alerta y no se repite
+    assert monitor.revisar({"vinil": 11}) == []
+    assert monitor.revisar({"vinil": 12}) == []
+    assert monitor.revisar({"vinil": 9}) == []
+    assert monitor.activas()[0].cantidad == 9
+
+    repuesto = monitor.revisar({"vinil": 13})
+    assert [alerta.tipo for alerta in repuesto] == ["repuesto"]
+    assert monitor.activas() == []
+    # Ya repuesto, una nueva baja vuelve a avisar
+    assert [alerta.tipo for alerta in monitor.revisar({"vinil": 10})] == ["bajo"]
+
+
+def test_alertas_se_anotan_y_se_entregan_a_los_suscriptores(tmp_path):
+    monitor = _monitor(tmp_path)
+    recibidas = []
+    monitor.suscribir(recibidas.append)
+    monitor.revisar({"vinil": 5})
+    monitor.revisar({"vinil": 50})
+    # Sin avisar (estado inicial) no se anota ni se entrega nada
+    monitor.revisar({"vinil": 5}, avisar=False)
+
+    assert [alerta.tipo for alerta in recibidas] == ["bajo", "repuesto"]
+    with open(monitor.archivo, encoding="utf-8") as archivo:
+        lineas = [json.loads(linea) for linea in archivo]
+    assert [(linea["tipo"], linea["cantidad"], linea["umbral"]) for linea in lineas] == [("bajo", 5, 10), ("repuesto", 50, 10)]
+
+
+def test_productos_sin_umbral_no_generan_alertas(tmp_path):
+    monitor = _monitor(tmp_path)
+    assert monitor.revisar({"taza": 0, "vinil": None}) == []
+    assert monitor.activas() == []
@@ -0,0 +1,125 @@
+import os
+from datetime import date
+
+import pytest
+
+from ConexiónExcel import HOJA_INVENTARIO, ConflictoConcurrencia, StockInsuficiente
+from conftest import abrir
+
+
+def test_dos_conexiones_suman_sobre_el_mismo_archivo(archivo_excel):
+    primera = abrir(archivo_excel)
+    segunda = abrir(archivo_excel)
+
+    with segunda.transaccion():
+        assert segunda.sumar_cantidad("vinil", -25) == 75
+        # La otra estación confirma mientras la transacción sigue abierta
+        assert primera.sumar_cantidad("vinil", -30) == 70
+        primera.sumar_cantidad("taza", 5)
+    # Al confirmar, el descuento se vuelve a aplicar sobre lo que hay en disco
+    assert segunda.obtener_cantidad("vinil") == 45
+    assert segunda.obtener_cantidad("taza") == 25
+
+    primera.flush()
+    segunda.flush()
+    nueva = abrir(archivo_excel)
+    assert nueva.obtener_cantidad("vinil") == 45
+    assert nueva.obtener_cantidad("taza") == 25
+
+
+def test_rebase_valida_el_stock_que_dejo_la_otra_conexion(archivo_excel):
+    primera = abrir(archivo_excel)
+    segunda = abrir(archivo_excel)
+
+    with pytest.raises(StockInsuficiente):
+        with segunda.transaccion():
+            # En su copia hay 20; cuando confirma, en disco ya quedan 5
+            segunda.sumar_cantidad("taza", -10)
+            primera.sumar_cantidad("taza", -15)
+    assert segunda.obtener_cantidad("taza") == 5
+    assert abrir(archivo_excel).obtener_cantidad("taza") == 5
+
+
+def test_rebase_rechaza_celdas_escritas_por_posicion(archivo_excel):
+    primera = abrir(archivo_excel)
+    segunda = abrir(archivo_excel)
+
+    with pytest.raises(ConflictoConcurrencia):
+        with segunda.transaccion():
+            segunda.escribir(HOJA_INVENTARIO, 2, 2, 1)
+            primera.sumar_cantidad("vinil", -1)
+    assert abrir(archivo_excel).obtener_cantidad("vinil") == 99
+
+
+def test_diario_se_reproduce_si_el_programa_se_corta_antes_de_compactar(archivo_excel):
+    conexion = abrir(archivo_excel)
+    conexion.sumar_cantidad("vinil", -10)
+    conexion.agregar_trabajo("Ana", "sublimado", "01-12-2026", 2, "taza")
+    # Corte: el diario tiene las transacciones y el Excel no
+    conexion._cancelar_temporizador()
+    assert os.path.getsize(conexion.diario) > 0
+
+    nueva = abrir(archivo_excel)
+    assert nueva.obtener_cantidad("vinil") == 90
+    assert nueva.contar_trabajos() == 1
+    assert nueva.leer_trabajos() == (("Ana", "sublimado", "01-12-2026"),)
+
+    # Al compactar, las transacciones pasan al Excel una sola vez
+    nueva.flush()
+    assert os.path.getsize(nueva.diario) == 0
+    otra = abrir(archivo_excel)
+    assert otra.obtener_cantidad("vinil") == 90
+    assert otra.contar_trabajos() == 1
+
+
+def test_diario_ignora_una_escritura_incompleta(archivo_excel):
+    conexion = abrir(archivo_excel)
+    conexion.sumar_cantidad("vinil", -10)
+    conexion._cancelar_temporizador()
+    # El programa se cortó en medio de la siguiente transacción
+    with open(conexion.diario, "ab") as diario:
+        diario.write(b'{"sec": 99, "ops": [["stock", "vinil", -50]')
+
+    nueva = abrir(archivo_excel)
+    assert nueva.obtener_cantidad("vinil") == 90
+    # La siguiente transacción reemplaza la línea incompleta
+    nueva.sumar_cantidad("vinil", -1)
+    assert abrir(archivo_excel).obtener_cantidad("vinil") == 89
+
+
+def test_transaccion_que_falla_deshace_el_trabajo_agregado(archivo_excel):
+    conexion = abrir(archivo_excel)
+    conexion.agregar_trabajo("Ana", "sublimado", "01-12-2026")
+
+    with pytest.raises(RuntimeError):
+        with conexion.transaccion():
+            conexion.agregar_trabajo("Beto", "sublimado", "02-12-2026")
+            conexion.sumar_cantidad("vinil", -5)
+            raise RuntimeError("falla a mitad de la transacción")
+
+    assert conexion.contar_trabajos() == 1
+    assert conexion.leer_trabajos() == (("Ana", "sublimado", "01-12-2026"),)
+    assert conexion.obtener_cantidad("vinil") == 100
+    assert conexion.trabajos_entre(date(2026, 12, 2), date(2026, 12, 2)) == ()
+
+    # La fila siguiente ocupa el lugar de la deshecha, también después de compactar
+    conexion.agregar_trabajo("Carla", "sublimado", "03-12-2026")
+    conexion.flush()
+    nueva = abrir(archivo_excel)
+    assert nueva.leer_trabajos() == (("Ana", "sublimado", "01-12-2026"), ("Carla", "sublimado", "03-12-2026"))
+
+
+def test_transaccion_anidada_que_falla_solo_deshace_lo_suyo(archivo_excel):
+    conexion = abrir(archivo_excel)
+    with conexion.transaccion():
+        conexion.agregar_trabajo("Ana", "sublimado", "01-12-2026")
+        with pytest.raises(StockInsuficiente):
+            with conexion.transaccion():
+                conexion.agregar_trabajo("Beto", "sublimado", "02-12-2026")
+                conexion.sumar_cantidad("taza", -50)
+        conexion.sumar_cantidad("taza", -5)
+
+    conexion.flush()
+    nueva = abrir(archivo_excel)
+    assert nueva.leer_trabajos() == (("Ana", "sublimado", "01-12-2026"),)
+    assert nueva.obtener_cantidad("taza") == 15
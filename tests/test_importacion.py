@@ -0,0 +1,26 @@
+from Importación import importar_reabastecimiento, leer_filas
+from conftest import abrir
+
+
+def test_reporte_de_reabastecimiento(archivo_excel, tmp_path):
+    ruta = tmp_path / "entrega.csv"
+    ruta.write_text("Producto;Cantidad\nvinil;10\nTaza;abc\nmadera;3\ntaza;-1\nvinil;5\n", encoding="utf-8")
+    conexion = abrir(archivo_excel)
+
+    reporte, cantidades = importar_reabastecimiento(str(ruta), ["vinil", "taza"], conexion)
+
+    assert [(linea, aceptada) for linea, aceptada, _ in reporte] == [
+        (2, True), (3, False), (4, False), (5, False), (6, True)]
+    assert "madera" in reporte[2][2]
+    # Las líneas del mismo producto se suman en un solo cambio
+    assert cantidades == {"vinil": 115}
+    assert abrir(archivo_excel).obtener_cantidad("vinil") == 115
+
+
+def test_jsonl_rechaza_lineas_dañadas_y_trata_null_como_vacio(tmp_path):
+    ruta = tmp_path / "trabajos.jsonl"
+    ruta.write_text('{"Cliente": "Ana", "fecha": null}\nno es json\n[1, 2]\n\n{"cliente": "Beto"}\n', encoding="utf-8")
+
+    filas = list(leer_filas(str(ruta), ["cliente", "fecha"]))
+
+    assert filas == [(1, {"cliente": "Ana", "fecha": ""}), (2, None), (3, None), (5, {"cliente": "Beto", "fecha": ""})]
@@ -0,0 +1,296 @@
+"""Índices y totales en memoria sobre los Trabajos y el Inventario
+
+Se construyen una vez a partir de las filas leídas y después se mantienen
+con cada cambio, para que las consultas no recorran la hoja.
+"""
+import unicodedata
+from array import array
+from bisect import bisect_left, bisect_right, insort
+from datetime import date, datetime
+from functools import lru_cache
+
+FORMATO_FECHA = "%d-%m-%Y"
+# Día que se anota para las fechas vacías o no válidas (date.toordinal empieza en 1)
+SIN_FECHA = 0
+
+# Categoría de cada producto para los totales del inventario; los demás van a CATEGORIA_OTROS
+CATEGORIAS_PRODUCTOS = {
+    "playera": "piezas para sublimar",
+    "taza": "piezas para sublimar",
+    "vidrio": "piezas para sublimar",
+    "papel sublimado": "papel",
+    "papel impresión": "papel",
+    "vinil": "vinil",
+}
+CATEGORIA_OTROS = "otros"
+
+# Decimales con que se comparan los totales mantenidos con un recuento
+DECIMALES_TOTALES = 6
+
+# Búsqueda aproximada: largo de los n-gramas y similitud mínima (0 a 1) para sugerir un nombre
+TAMANO_NGRAMA = 2
+SIMILITUD_MINIMA = 0.4
+
+
+@lru_cache(maxsize=4096)
+def _ordinal_de_texto(texto):
+    try:
+        return datetime.strptime(texto.strip(), FORMATO_FECHA).toordinal()
+    except ValueError:
+        return None
+
+
+def ordinal_fecha(valor):
+    """Retorna el número de día (date.toordinal) de una fecha dd-mm-yyyy o date, o None si no es válida"""
+    if isinstance(valor, (date, datetime)):
+        return valor.toordinal()
+    if isinstance(valor, str):
+        # Las fechas se repiten mucho entre trabajos: cada texto se interpreta una sola vez
+        return _ordinal_de_texto(valor)
+    return None
+
+
+def plegar(texto):
+    """Normaliza un texto para compararlo: minúsculas, sin acentos y con espacios simples"""
+    descompuesto = unicodedata.normalize("NFKD", str(texto).lower())
+    return " ".join("".join(c for c in descompuesto if not unicodedata.combining(c)).split())
+
+
+class IndiceFechas:
+    """Trabajos ordenados por fecha de entrega para consultas por rango con bisect
+
+    Se construye sobre las columnas de Trabajos (Columnas.ColumnasTrabajos) y
+    guarda dos arreglos paralelos: los días ordenados y la posición de cada
+    trabajo en las columnas. Los trabajos con la misma fecha quedan en el
+    orden en que se registraron.
+    """
+
+    def __init__(self, columnas):
+        self._columnas = columnas
+        ordinales = columnas.ordinales
+        # sorted es estable: a igual fecha se conserva el orden de registro
+        posiciones = sorted((posicion for posicion, ordinal in enumerate(ordinales) if ordinal != SIN_FECHA),
+                            key=ordinales.__getitem__)
+        self.sin_fecha = len(ordinales) - len(posiciones)
+        self._posiciones = array("I", posiciones)
+        self._ordinales = array("i", (ordinales[posicion] for posicion in posiciones))
+
+    def __len__(self):
+        return len(self._posiciones)
+
+    def agregar(self, posicion):
+        """Agrega el trabajo de esa posición en su lugar según la fecha de entrega"""
+        ordinal = self._columnas.ordinales[posicion]
+        if ordinal == SIN_FECHA:
+            self.sin_fecha += 1
+            return
+        lugar = bisect_right(self._ordinales, ordinal)
+        self._ordinales.insert(lugar, ordinal)
+        self._posiciones.insert(lugar, posicion)
+
+    def _filas(self, inicio, fin):
+        return tuple(self._columnas.fila(posicion) for posicion in self._posiciones[inicio:fin])
+
+    def entre(self, desde, hasta):
+        """Trabajos con entrega entre desde y hasta, ambas inclusive"""
+        return self._filas(bisect_left(self._ordinales, ordinal_fecha(desde)),
+                           bisect_right(self._ordinales, ordinal_fecha(hasta)))
+
+    def consumos_entre(self, desde, hasta):
+        """(trabajo, fecha, cantidad, pieza) de los trabajos con entrega entre desde y hasta"""
+        inicio = bisect_left(self._ordinales, ordinal_fecha(desde))
+        fin = bisect_right(self._ordinales, ordinal_fecha(hasta))
+        return tuple(self._columnas.consumo(posicion) for posicion in self._posiciones[inicio:fin])
+
+    def antes_de(self, fecha):
+        """Trabajos con entrega anterior a la fecha"""
+        return self._filas(0, bisect_left(self._ordinales, ordinal_fecha(fecha)))
+
+    def proximos(self, desde, cantidad):
+        """Los primeros trabajos con entrega desde la fecha indicada (inclusive)"""
+        inicio = bisect_left(self._ordinales, ordinal_fecha(desde))
+        return self._filas(inicio, inicio + cantidad)
+
+
+class IndiceClientes:
+    """Nombres de clientes ordenados para autocompletar por prefijo, con los trabajos de cada uno
+
+    Los nombres se comparan plegados (sin mayúsculas, acentos ni espacios de
+    más): "José  Pérez" y "jose perez" son el mismo cliente. Se construye sobre
+    las columnas de Trabajos y cada nombre distinto se pliega una sola vez.
+    """
+
+    def __init__(self, columnas):
+        self._columnas = columnas
+        # clave -> posiciones de sus trabajos
+        self._trabajos = {}
+        # clave -> código del nombre tal como se escribió la última vez
+        self._nombres = {}
+        # código de cliente en las columnas -> clave plegada (None si está vacío)
+        self._claves_por_codigo = []
+        for posicion in range(len(columnas)):
+            self._anotar(posicion)
+        self._claves = sorted(self._trabajos)
+
+    def __len__(self):
+        return len(self._claves)
+
+    def _clave(self, codigo):
+        valores = self._columnas.clientes.valores
+        while len(self._claves_por_codigo) <= codigo:
+            nombre = valores[len(self._claves_por_codigo)]
+            vacio = not nombre or not str(nombre).strip()
+            self._claves_por_codigo.append(None if vacio else plegar(nombre))
+        return self._claves_por_codigo[codigo]
+
+    def _anotar(self, posicion):
+        """Anota el trabajo de su cliente; retorna la clave si el cliente es nuevo"""
+        codigo = self._columnas.clientes.codigos[posicion]
+        clave = self._clave(codigo)
+        if clave is None:
+            return None
+        self._nombres[clave] = codigo
+        trabajos = self._trabajos.get(clave)
+        if trabajos is None:
+            self._trabajos[clave] = array("I", (posicion,))
+            return clave
+        trabajos.append(posicion)
+        return None
+
+    def agregar(self, posicion):
+        """Agrega el trabajo de esa posición a su cliente (nuevo o ya conocido)"""
+        clave = self._anotar(posicion)
+        if clave is not None:
+            insort(self._claves, clave)
+
+    def sugerir(self, prefijo, cantidad=10):
+        """Retorna hasta cantidad nombres de clientes que empiezan con el prefijo, en orden alfabético"""
+        prefijo = plegar(prefijo)
+        valores = self._columnas.clientes.valores
+        sugerencias = []
+        for posicion in range(bisect_left(self._claves, prefijo), len(self._claves)):
+            clave = self._claves[posicion]
+            if not clave.startswith(prefijo) or len(sugerencias) >= cantidad:
+                break
+            sugerencias.append(str(valores[self._nombres[clave]]).strip())
+        return sugerencias
+
+    def trabajos_de(self, cliente):
+        """Retorna los trabajos (cliente, trabajo, fecha) de un cliente en el orden en que se registraron"""
+        return tuple(self._columnas.fila(posicion) for posicion in self._trabajos.get(plegar(cliente), ()))
+
+
+def ngramas(texto, tamano=TAMANO_NGRAMA):
+    """Retorna el conjunto de n-gramas de un texto ya plegado, con un espacio de relleno a cada lado"""
+    relleno = f" {texto} "
+    return {relleno[i:i + tamano] for i in range(max(len(relleno) - tamano + 1, 1))}
+
+
+class IndiceNgramas:
+    """Nombres indexados por n-gramas para encontrar los parecidos a un texto con errores
+
+    La similitud es el coeficiente de Dice entre los n-gramas del texto y los
+    del nombre, ambos plegados: "papel impresion" encuentra "papel impresión"
+    con similitud 1 y "playeras" encuentra "playera".
+    """
+
+    def __init__(self, nombres=()):
+        self._nombres = []
+        self._tamanos = []
+        self._plegados = set()
+        # n-grama -> posiciones de los nombres que lo contienen
+        self._posiciones = {}
+        for nombre in nombres:
+            self.agregar(nombre)
+
+    def __len__(self):
+        return len(self._nombres)
+
+    def agregar(self, nombre):
+        """Agrega un nombre al índice (los repetidos después de plegar se ignoran)"""
+        plegado = plegar(nombre)
+        if not plegado or plegado in self._plegados:
+            return
+        posicion = len(self._nombres)
+        gramas = ngramas(plegado)
+        self._nombres.append(nombre)
+        self._tamanos.append(len(gramas))
+        self._plegados.add(plegado)
+        for grama in gramas:
+            self._posiciones.setdefault(grama, []).append(posicion)
+
+    def buscar(self, texto, cantidad=5, minimo=SIMILITUD_MINIMA):
+        """Retorna hasta cantidad pares (nombre, similitud) ordenados del más parecido al menos parecido"""
+        gramas = ngramas(plegar(texto))
+        comunes = {}
+        for grama in gramas:
+            for posicion in self._posiciones.get(grama, ()):
+                comunes[posicion] = comunes.get(posicion, 0) + 1
+        resultados = []
+        for posicion, cantidad_comunes in comunes.items():
+            similitud = 2 * cantidad_comunes / (len(gramas) + self._tamanos[posicion])
+            if similitud >= minimo:
+                resultados.append((self._nombres[posicion], round(similitud, 3)))
+        resultados.sort(key=lambda resultado: (-resultado[1], resultado[0]))
+        return resultados[:cantidad]
+
+
+def categoria_producto(producto):
+    """Retorna la categoría de un producto para los totales del inventario"""
+    return CATEGORIAS_PRODUCTOS.get(str(producto).lower().strip(), CATEGORIA_OTROS)
+
+
+class TotalesInventario:
+    """Productos distintos y unidades en stock, en total y por categoría
+
+    Se calculan una vez recorriendo el Inventario y después se actualizan con
+    la diferencia de cada cambio de stock, sin volver a recorrerlo.
+    """
+
+    def __init__(self, filas=()):
+        # categoría -> [productos, unidades]
+        self.categorias = {}
+        vistos = set()
+        for producto, cantidad in filas:
+            if not producto:
+                continue
+            nombre = str(producto).lower().strip()
+            if nombre in vistos:
+                # Una fila repetida suma sus unidades pero no es otro producto
+                self.sumar(nombre, cantidad or 0)
+            else:
+                vistos.add(nombre)
+                self.agregar_producto(nombre, cantidad or 0)
+
+    def agregar_producto(self, producto, cantidad):
+        categoria = self.categorias.setdefault(categoria_producto(producto), [0, 0])
+        categoria[0] += 1
+        categoria[1] += cantidad
+
+    def sumar(self, producto, delta):
+        self.categorias.setdefault(categoria_producto(producto), [0, 0])[1] += delta
+
+    def resumen(self):
+        return resumir_totales(self.categorias)
+
+
+def resumir_totales(categorias):
+    """Arma el resumen de los totales a partir de {categoría: (productos, unidades)}
+
+    Retorna {"productos", "unidades", "categorias": {categoría: {"productos", "unidades"}}}
+    con las unidades redondeadas, para poder comparar dos resúmenes con ==.
+    """
+    productos_totales = 0
+    unidades_totales = 0
+    resumen_categorias = {}
+    for categoria, (productos, unidades) in sorted(categorias.items()):
+        productos_totales += productos
+        unidades_totales += unidades
+        if productos:
+            resumen_categorias[categoria] = {"productos": productos,
+                                             "unidades": round(unidades, DECIMALES_TOTALES)}
+    return {
+        "productos": productos_totales,
+        "unidades": round(unidades_totales, DECIMALES_TOTALES),
+        "categorias": resumen_categorias,
+    }